@@ -46,6 +46,7 @@ const reviewProvider_1 = require("./reviewProvider");
 const penterCodeLensProvider_1 = require("./penterCodeLensProvider");
 const penterDecorationProvider_1 = require("./penterDecorationProvider");
 const shadowDiffDecorationProvider_1 = require("./shadowDiffDecorationProvider");
+const ignoreEngine_1 = require("./ignoreEngine");
 // InlineReviewDecorationProvider removed - functionality merged into PenterCodeLensProvider
 function activate(context) {
     console.log('AI Coder Helper is now active!');
@@ -186,6 +187,8 @@ function activate(context) {
         }
         if (!fs.existsSync(shadowBase))
             fs.mkdirSync(shadowBase, { recursive: true });
+        // .gitignore / .coderignore of the source project, plus editor folders that never belong in shadow
+        const ignore = new ignoreEngine_1.IgnoreMatcher(projectSourcePath, [...ignoreEngine_1.DEFAULT_PATTERNS, 'shadow/', '.vscode/']);
         try {
             // If specific files provided, only copy those.
             // Else clear shadow and full copy.
@@ -198,22 +201,7 @@ function activate(context) {
                         continue;
                     const destPath = path.join(shadowBase, relative);
                     if (fs.statSync(srcPath).isDirectory()) {
-                        const copyDir = (s, d) => {
-                            if (!fs.existsSync(d))
-                                fs.mkdirSync(d, { recursive: true });
-                            const entries = fs.readdirSync(s, { withFileTypes: true });
-                            for (const entry of entries) {
-                                if (['.git', 'file', 'shadow', '__pycache__', '.vscode', 'node_modules'].includes(entry.name))
-                                    continue;
-                                const sp = path.join(s, entry.name);
-                                const dp = path.join(d, entry.name);
-                                if (entry.isDirectory())
-                                    copyDir(sp, dp);
-                                else
-                                    fs.copyFileSync(sp, dp);
-                            }
-                        };
-                        copyDir(srcPath, destPath);
+                        ignore.copyTree(srcPath, destPath);
                     }
                     else {
                         const dir = path.dirname(destPath);
@@ -230,22 +218,7 @@ function activate(context) {
                 vscode.window.showInformationMessage(`Full Sync: ${projectName} -> Shadow`);
                 fs.rmSync(shadowBase, { recursive: true, force: true });
                 fs.mkdirSync(shadowBase, { recursive: true });
-                const copyRecursive = (src, dest) => {
-                    if (!fs.existsSync(dest))
-                        fs.mkdirSync(dest, { recursive: true });
-                    const entries = fs.readdirSync(src, { withFileTypes: true });
-                    for (const entry of entries) {
-                        if (['.git', 'file', 'shadow', '__pycache__', '.vscode', 'node_modules'].includes(entry.name))
-                            continue;
-                        const sp = path.join(src, entry.name);
-                        const dp = path.join(dest, entry.name);
-                        if (entry.isDirectory())
-                            copyRecursive(sp, dp);
-                        else
-                            fs.copyFileSync(sp, dp);
-                    }
-                };
-                copyRecursive(projectSourcePath, shadowBase);
+                ignore.copyTree(projectSourcePath, shadowBase);
                 vscode.window.showInformationMessage("Full Sync Complete.");
             }
             vscode.commands.executeCommand('aiCoder.refreshShadow');
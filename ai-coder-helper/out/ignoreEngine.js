@@ -0,0 +1,274 @@
+"use strict";
+var __createBinding = (this && this.__createBinding) || (Object.create ? (function(o, m, k, k2) {
+    if (k2 === undefined) k2 = k;
+    var desc = Object.getOwnPropertyDescriptor(m, k);
+    if (!desc || ("get" in desc ? !m.__esModule : desc.writable || desc.configurable)) {
+      desc = { enumerable: true, get: function() { return m[k]; } };
+    }
+    Object.defineProperty(o, k2, desc);
+}) : (function(o, m, k, k2) {
+    if (k2 === undefined) k2 = k;
+    o[k2] = m[k];
+}));
+var __setModuleDefault = (this && this.__setModuleDefault) || (Object.create ? (function(o, v) {
+    Object.defineProperty(o, "default", { enumerable: true, value: v });
+}) : function(o, v) {
+    o["default"] = v;
+});
+var __importStar = (this && this.__importStar) || (function () {
+    var ownKeys = function(o) {
+        ownKeys = Object.getOwnPropertyNames || function (o) {
+            var ar = [];
+            for (var k in o) if (Object.prototype.hasOwnProperty.call(o, k)) ar[ar.length] = k;
+            return ar;
+        };
+        return ownKeys(o);
+    };
+    return function (mod) {
+        if (mod && mod.__esModule) return mod;
+        var result = {};
+        if (mod != null) for (var k = ownKeys(mod), i = 0; i < k.length; i++) if (k[i] !== "default") __createBinding(result, mod, k[i]);
+        __setModuleDefault(result, mod);
+        return result;
+    };
+})();
+Object.defineProperty(exports, "__esModule", { value: true });
+exports.IgnoreMatcher = exports.PatternSet = exports.DEFAULT_PATTERNS = exports.CODERIGNORE = exports.GITIGNORE = void 0;
+exports.parsePattern = parsePattern;
+const fs = __importStar(require("fs"));
+const path = __importStar(require("path"));
+/**
+ * Ignore engine (same rules as ignore.py on the Python side).
+ *
+ * Precedence, lowest to highest: built-in defaults, .gitignore files from the
+ * root down to the entry's directory (deeper wins), <root>/.coderignore.
+ * Consecutive patterns of one file with the same (negate, dirOnly) are compiled
+ * into a single RegExp. Callers prune ignored directories before descending.
+ */
+exports.GITIGNORE = '.gitignore';
+exports.CODERIGNORE = '.coderignore';
+exports.DEFAULT_PATTERNS = ['.git/', '__pycache__/', 'node_modules/', '/file/'];
+function escapeRegex(ch) {
+    return ch.replace(/[.*+?^${}()|[\]\\\/]/g, '\\$&');
+}
+function globToRegex(glob) {
+    let out = '';
+    let i = 0;
+    const n = glob.length;
+    while (i < n) {
+        const c = glob[i];
+        if (c === '*') {
+            if (glob.startsWith('**', i)) {
+                const j = i + 2;
+                if (j < n && glob[j] === '/') {
+                    out += '(?:.*/)?';
+                    i = j + 1;
+                }
+                else {
+                    out += '.*';
+                    i = j;
+                }
+                continue;
+            }
+            out += '[^/]*';
+        }
+        else if (c === '?') {
+            out += '[^/]';
+        }
+        else if (c === '[') {
+            let j = i + 1;
+            if (j < n && (glob[j] === '!' || glob[j] === '^'))
+                j++;
+            if (j < n && glob[j] === ']')
+                j++;
+            j = glob.indexOf(']', j);
+            if (j < 0) {
+                out += escapeRegex(c);
+            }
+            else {
+                let body = glob.substring(i + 1, j);
+                if (body[0] === '!' || body[0] === '^')
+                    body = '^' + body.substring(1);
+                out += '[' + body.replace(/\\/g, '\\\\') + ']';
+                i = j + 1;
+                continue;
+            }
+        }
+        else if (c === '\\' && i + 1 < n) {
+            out += escapeRegex(glob[i + 1]);
+            i += 2;
+            continue;
+        }
+        else {
+            out += escapeRegex(c);
+        }
+        i++;
+    }
+    return out;
+}
+function parsePattern(line) {
+    line = line.replace(/[\r\n]+$/, '');
+    let stripped = line.replace(/ +$/, '');
+    if (stripped.endsWith('\\') && stripped.length < line.length)
+        stripped += ' ';
+    line = stripped;
+    if (!line || line.startsWith('#'))
+        return null;
+    let negate = false;
+    if (line.startsWith('!')) {
+        negate = true;
+        line = line.substring(1);
+    }
+    else if (line.startsWith('\\!') || line.startsWith('\\#')) {
+        line = line.substring(1);
+    }
+    const dirOnly = line.endsWith('/');
+    line = line.replace(/\/+$/, '');
+    if (!line)
+        return null;
+    const anchored = line.includes('/');
+    let regex = globToRegex(line.replace(/^\/+/, ''));
+    if (!anchored)
+        regex = '(?:.*/)?' + regex;
+    return { regex, negate, dirOnly };
+}
+class PatternSet {
+    constructor(lines, base = '') {
+        this.base = base;
+        this.runs = [];
+        this.depth = base ? base.split('/').length : 0;
+        const groups = [];
+        for (const line of lines) {
+            const parsed = parsePattern(line);
+            if (!parsed)
+                continue;
+            const last = groups[groups.length - 1];
+            if (last && last.negate === parsed.negate && last.dirOnly === parsed.dirOnly) {
+                last.regexes.push(parsed.regex);
+            }
+            else {
+                groups.push({ negate: parsed.negate, dirOnly: parsed.dirOnly, regexes: [parsed.regex] });
+            }
+        }
+        // Evaluated last-to-first: the last matching pattern decides
+        for (const g of groups.reverse()) {
+            this.runs.push({
+                negate: g.negate,
+                dirOnly: g.dirOnly,
+                regex: new RegExp('^(?:' + g.regexes.map(r => '(?:' + r + ')').join('|') + ')$')
+            });
+        }
+    }
+    get empty() {
+        return this.runs.length === 0;
+    }
+    /** true (ignored) / false (re-included by "!") / undefined (no pattern matched) */
+    match(relPath, isDir) {
+        for (const run of this.runs) {
+            if (run.dirOnly && !isDir)
+                continue;
+            if (run.regex.test(relPath))
+                return !run.negate;
+        }
+        return undefined;
+    }
+}
+exports.PatternSet = PatternSet;
+function readLines(file) {
+    try {
+        return fs.readFileSync(file, 'utf8').split('\n');
+    }
+    catch {
+        return undefined;
+    }
+}
+class IgnoreMatcher {
+    constructor(root, defaults = exports.DEFAULT_PATTERNS) {
+        this.sets = new Map();
+        this.chains = new Map();
+        this.root = path.normalize(root);
+        this.defaults = new PatternSet(defaults);
+        this.coderignore = new PatternSet(readLines(path.join(this.root, exports.CODERIGNORE)) || []);
+    }
+    dirSet(relDir) {
+        let set = this.sets.get(relDir);
+        if (set === undefined) {
+            const lines = readLines(path.join(this.root, relDir, exports.GITIGNORE));
+            set = lines ? new PatternSet(lines, relDir) : null;
+            if (set && set.empty)
+                set = null;
+            this.sets.set(relDir, set);
+        }
+        return set;
+    }
+    /** Pattern sets that apply inside relDir, highest precedence first */
+    chain(relDir) {
+        let chain = this.chains.get(relDir);
+        if (!chain) {
+            let head;
+            let rest;
+            if (relDir) {
+                const slash = relDir.lastIndexOf('/');
+                const parent = this.chain(slash >= 0 ? relDir.substring(0, slash) : '');
+                head = parent.slice(0, 1);
+                rest = parent.slice(1);
+            }
+            else {
+                head = [this.coderignore];
+                rest = [this.defaults];
+            }
+            const own = this.dirSet(relDir);
+            chain = own ? [...head, own, ...rest] : [...head, ...rest];
+            this.chains.set(relDir, chain);
+        }
+        return chain;
+    }
+    /**
+     * Whether an entry is ignored. Only the last component is tested;
+     * ancestors are expected to have been pruned by the caller.
+     */
+    ignored(rel, isDir) {
+        rel = rel.replace(/\\/g, '/').replace(/^\/+|\/+$/g, '');
+        if (!rel)
+            return false;
+        const slash = rel.lastIndexOf('/');
+        const relDir = slash >= 0 ? rel.substring(0, slash) : '';
+        for (const set of this.chain(relDir)) {
+            const p = set.depth ? rel.split('/').slice(set.depth).join('/') : rel;
+            const result = set.match(p, isDir);
+            if (result !== undefined)
+                return result;
+        }
+        return false;
+    }
+    /** Same as ignored(), but also checks every ancestor directory */
+    isPathIgnored(rel, isDir) {
+        const comps = rel.replace(/\\/g, '/').split('/').filter(c => c);
+        for (let i = 1; i < comps.length; i++) {
+            if (this.ignored(comps.slice(0, i).join('/'), true))
+                return true;
+        }
+        return this.ignored(comps.join('/'), isDir);
+    }
+    /**
+     * Recursively copy src (inside root) to dest, skipping ignored entries
+     * and never descending into ignored directories.
+     */
+    copyTree(src, dest) {
+        const relDir = path.relative(this.root, src).split(path.sep).join('/');
+        if (!fs.existsSync(dest))
+            fs.mkdirSync(dest, { recursive: true });
+        for (const entry of fs.readdirSync(src, { withFileTypes: true })) {
+            const rel = relDir ? relDir + '/' + entry.name : entry.name;
+            if (this.ignored(rel, entry.isDirectory()))
+                continue;
+            const sp = path.join(src, entry.name);
+            const dp = path.join(dest, entry.name);
+            if (entry.isDirectory())
+                this.copyTree(sp, dp);
+            else
+                fs.copyFileSync(sp, dp);
+        }
+    }
+}
+exports.IgnoreMatcher = IgnoreMatcher;
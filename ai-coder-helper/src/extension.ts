@@ -9,6 +9,7 @@ import { ReviewProvider, ReviewItem } from './reviewProvider';
 import { PenterCodeLensProvider } from './penterCodeLensProvider';
 import { PenterDecorationProvider } from './penterDecorationProvider';
 import { ShadowDiffDecorationProvider } from './shadowDiffDecorationProvider';
+import { IgnoreMatcher, DEFAULT_PATTERNS } from './ignoreEngine';
 // InlineReviewDecorationProvider removed - functionality merged into PenterCodeLensProvider
 
 export function activate(context: vscode.ExtensionContext) {
@@ -184,6 +185,9 @@ export function activate(context: vscode.ExtensionContext) {
             }
             if (!fs.existsSync(shadowBase)) fs.mkdirSync(shadowBase, { recursive: true });
 
+            // .gitignore / .coderignore of the source project, plus editor folders that never belong in shadow
+            const ignore = new IgnoreMatcher(projectSourcePath, [...DEFAULT_PATTERNS, 'shadow/', '.vscode/']);
+
             try {
                 // If specific files provided, only copy those.
                 // Else clear shadow and full copy.
@@ -197,18 +201,7 @@ export function activate(context: vscode.ExtensionContext) {
                         const destPath = path.join(shadowBase, relative);
 
                         if (fs.statSync(srcPath).isDirectory()) {
-                            const copyDir = (s: string, d: string) => {
-                                if (!fs.existsSync(d)) fs.mkdirSync(d, { recursive: true });
-                                const entries = fs.readdirSync(s, { withFileTypes: true });
-                                for (const entry of entries) {
-                                    if (['.git', 'file', 'shadow', '__pycache__', '.vscode', 'node_modules'].includes(entry.name)) continue;
-                                    const sp = path.join(s, entry.name);
-                                    const dp = path.join(d, entry.name);
-                                    if (entry.isDirectory()) copyDir(sp, dp);
-                                    else fs.copyFileSync(sp, dp);
-                                }
-                            };
-                            copyDir(srcPath, destPath);
+                            ignore.copyTree(srcPath, destPath);
                         } else {
                             const dir = path.dirname(destPath);
                             if (!fs.existsSync(dir)) fs.mkdirSync(dir, { recursive: true });
@@ -223,18 +216,7 @@ export function activate(context: vscode.ExtensionContext) {
                     fs.rmSync(shadowBase, { recursive: true, force: true });
                     fs.mkdirSync(shadowBase, { recursive: true });
 
-                    const copyRecursive = (src: string, dest: string) => {
-                        if (!fs.existsSync(dest)) fs.mkdirSync(dest, { recursive: true });
-                        const entries = fs.readdirSync(src, { withFileTypes: true });
-                        for (const entry of entries) {
-                            if (['.git', 'file', 'shadow', '__pycache__', '.vscode', 'node_modules'].includes(entry.name)) continue;
-                            const sp = path.join(src, entry.name);
-                            const dp = path.join(dest, entry.name);
-                            if (entry.isDirectory()) copyRecursive(sp, dp);
-                            else fs.copyFileSync(sp, dp);
-                        }
-                    };
-                    copyRecursive(projectSourcePath, shadowBase);
+                    ignore.copyTree(projectSourcePath, shadowBase);
                     vscode.window.showInformationMessage("Full Sync Complete.");
                 }
 
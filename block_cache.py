@@ -0,0 +1,276 @@
+"""
+Rendered Block Cache for AI Coder Helper
+
+Prompt generation line-numbers every selected file (chat_writer.file_block).
+BlockCache keeps those rendered bodies between "Generate Prompt" clicks, so
+only files that changed since the last generation are read again.
+
+    path + (size, mtime_ns)         one os.stat decides whether a file is unchanged
+    content hash (blake2b)          a file whose mtime changed but content did not
+                                    (touch, checkout), or a source / shadow pair
+                                    with the same content, shares one block
+    memory                          LRU of blocks, bounded by MEMORY_LIMIT characters
+    file/<project>/.coder-cache/    evicted blocks spill to <hash>.blk; index.json
+                                    keeps path -> (size, mtime_ns, hash) for the
+                                    next run
+
+Only the numbered body is cached; the "## rel" title is added by file_block.
+Files larger than ENTRY_LIMIT or not valid UTF-8 are not cached and are
+streamed as before.
+"""
+
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+from chat_writer import numbered_text
+
+# Script directory (coder-main)
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Folder under file/<project>/ (never listed as a coped project; coped project names
+# cannot start with ".", so it cannot clash with one)
+CACHE_DIR_NAME = ".coder-cache"
+
+INDEX_NAME = "index.json"
+BLOCK_SUFFIX = ".blk"
+
+# Characters of rendered blocks kept in memory
+MEMORY_LIMIT = 32 << 20
+
+# Bytes of spilled blocks kept on disk (oldest removed first)
+DISK_LIMIT = 256 << 20
+
+# Files larger than this (bytes) are streamed, not cached
+ENTRY_LIMIT = 4 << 20
+
+
+def _digest(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+class BlockCache:
+    """
+    Rendered (line-numbered) file bodies of one project.
+
+    Args:
+        cache_dir: 溢出用的資料夾（file/<project>/.coder-cache）
+        memory_limit: 記憶體中保留的字元數上限
+        disk_limit: 磁碟上保留的 bytes 上限
+    """
+
+    def __init__(self, cache_dir: str, memory_limit: int = MEMORY_LIMIT, disk_limit: int = DISK_LIMIT):
+        self.cache_dir = cache_dir
+        self.memory_limit = memory_limit
+        self.disk_limit = disk_limit
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._paths = {}                # abs path -> (size, mtime_ns, digest)
+        self._blocks = OrderedDict()    # digest -> rendered text (LRU, most recent last)
+        self._chars = 0
+        self._dirty = set()             # digests in memory but not on disk yet
+        self._index_dirty = False
+        self._load_index()
+
+    # ========================
+    # Lookup
+    # ========================
+
+    def render(self, path: str):
+        """
+        取得檔案加上行號後的內容（未變動時直接使用快取）
+
+        Args:
+            path: 檔案絕對路徑
+
+        Returns:
+            str；檔案過大、無法讀取或不是 UTF-8 時回傳 None（呼叫端改用串流讀取）
+        """
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        if st.st_size > ENTRY_LIMIT:
+            return None
+        key = (st.st_size, st.st_mtime_ns)
+
+        with self.lock:
+            known = self._paths.get(path)
+        if known is not None and known[:2] == key:
+            text = self._get(known[2])
+            if text is not None:
+                with self.lock:
+                    self.hits += 1
+                return text
+
+        try:
+            with open(path, "rb") as f:
+                data = f.read(ENTRY_LIMIT + 1)
+        except OSError:
+            return None
+        if len(data) > ENTRY_LIMIT:
+            return None
+        digest = _digest(data)
+
+        text = self._get(digest)
+        if text is not None:
+            with self.lock:
+                self.hits += 1
+                self._remember(path, key, digest)
+            return text
+
+        try:
+            text = numbered_text(data.decode("utf-8"))
+        except UnicodeDecodeError:
+            return None
+
+        with self.lock:
+            self.misses += 1
+            self._remember(path, key, digest)
+            if digest not in self._blocks:
+                self._put(digest, text)
+                self._dirty.add(digest)
+        return text
+
+    def _remember(self, path, key, digest):
+        if self._paths.get(path) != key + (digest,):
+            self._paths[path] = key + (digest,)
+            self._index_dirty = True
+
+    def _get(self, digest):
+        """記憶體或磁碟上的 block（呼叫時不可持有 lock：只有查詢記憶體時持有，讀檔在 lock 之外）"""
+        with self.lock:
+            text = self._blocks.get(digest)
+            if text is not None:
+                self._blocks.move_to_end(digest)
+                return text
+        block_path = self._block_path(digest)
+        try:
+            with open(block_path, "r", encoding="utf-8", newline="") as f:
+                text = f.read()
+        except OSError:
+            return None
+        try:
+            os.utime(block_path)   # recently used, kept by _prune_disk
+        except OSError:
+            pass
+        with self.lock:
+            if digest not in self._blocks:   # another loader thread may have read it meanwhile
+                self._put(digest, text)
+        return text
+
+    def _put(self, digest, text):
+        self._blocks[digest] = text
+        self._chars += len(text)
+        while self._chars > self.memory_limit and len(self._blocks) > 1:
+            old, old_text = self._blocks.popitem(last=False)
+            self._chars -= len(old_text)
+            if old in self._dirty:
+                self._dirty.discard(old)
+                self._spill(old, old_text)
+
+    # ========================
+    # Disk
+    # ========================
+
+    def _block_path(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, digest + BLOCK_SUFFIX)
+
+    def _spill(self, digest, text):
+        path = self._block_path(digest)
+        if os.path.exists(path):
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp = path + ".tmp"
+            with open(tmp, "w", encoding="utf-8", newline="") as f:
+                f.write(text)
+            os.replace(tmp, path)
+        except OSError:
+            pass
+
+    def _load_index(self):
+        try:
+            with open(os.path.join(self.cache_dir, INDEX_NAME), "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return
+        for path, (size, mtime_ns, digest) in entries.items():
+            self._paths[path] = (size, mtime_ns, digest)
+
+    def save(self) -> None:
+        """
+        將尚未寫入的 block 與 index.json 寫到 file/<project>/.coder-cache/（沒有變動時不寫入），
+        並把磁碟用量控制在 disk_limit 以內
+        """
+        with self.lock:
+            if not self._dirty and not self._index_dirty:
+                return
+            for digest in list(self._dirty):
+                self._spill(digest, self._blocks[digest])
+            self._dirty.clear()
+            on_disk = self._prune_disk()
+            # Only entries whose block is on disk are useful to the next run
+            entries = {path: list(value) for path, value in self._paths.items() if value[2] in on_disk}
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                index_path = os.path.join(self.cache_dir, INDEX_NAME)
+                with open(index_path + ".tmp", "w", encoding="utf-8") as f:
+                    json.dump(entries, f)
+                os.replace(index_path + ".tmp", index_path)
+            except OSError:
+                return
+            self._index_dirty = False
+
+    def _prune_disk(self) -> set:
+        """刪除最久沒用到的 block 直到低於 disk_limit；回傳仍在磁碟上的 digest"""
+        blocks = []
+        try:
+            with os.scandir(self.cache_dir) as it:
+                for entry in it:
+                    if entry.name.endswith(BLOCK_SUFFIX):
+                        st = entry.stat()
+                        blocks.append((st.st_mtime_ns, st.st_size, entry.name[:-len(BLOCK_SUFFIX)]))
+        except OSError:
+            return set()
+        total = sum(size for _, size, _ in blocks)
+        on_disk = {digest for _, _, digest in blocks}
+        for _, size, digest in sorted(blocks):
+            if total <= self.disk_limit:
+                break
+            try:
+                os.remove(self._block_path(digest))
+            except OSError:
+                continue
+            total -= size
+            on_disk.discard(digest)
+        return on_disk
+
+
+# ========================
+# Shared registry
+# ========================
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_block_cache(project_name: str) -> BlockCache:
+    """
+    取得專案共用的 BlockCache（第一次使用時從 file/<project>/.coder-cache/ 載入 index）
+
+    Args:
+        project_name: 專案名稱
+
+    Returns:
+        BlockCache
+    """
+    with _caches_lock:
+        cache = _caches.get(project_name)
+        if cache is None:
+            cache = _caches[project_name] = BlockCache(
+                os.path.join(SCRIPT_DIR, "file", project_name, CACHE_DIR_NAME))
+        return cache
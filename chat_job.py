@@ -0,0 +1,135 @@
+"""
+Background Prompt Generation for AI Coder Helper
+
+GenerateJob writes chat.txt on the global QThreadPool so the Enter window
+stays responsive.  The caller supplies a plan callable that runs on the
+worker and returns the section generators (see chat_writer) together with
+the files they will render; the job streams the sections through a
+ChatWriter and reports progress (files done, bytes written, ETA estimated
+from the bytes of the files read so far).
+
+Cancelling stops at the next text piece; ChatWriter then discards its
+temporary file, so the previous chat.txt stays intact.
+"""
+
+import os
+import time
+import traceback
+
+from PyQt6.QtCore import QObject, QRunnable, pyqtSignal
+
+from chat_writer import ChatWriter
+
+# Seconds between two progress signals
+PROGRESS_INTERVAL = 0.1
+
+# Fraction of the input bytes read before an ETA is reported
+ETA_MIN_FRACTION = 0.02
+
+
+class GenerateSignals(QObject):
+    progress = pyqtSignal(int, int, int, float)  # files done, files total, bytes written, ETA seconds (-1 unknown)
+    done = pyqtSignal(int)                       # characters written
+    failed = pyqtSignal(str)                     # error message
+    cancelled = pyqtSignal()
+
+
+class _Cancelled(Exception):
+    pass
+
+
+class GenerateJob(QRunnable):
+    """
+    Generate chat.txt on a worker thread.
+
+    Args:
+        chat_path: chat.txt 路徑
+        plan: plan(job) -> (sections, paths)，在 worker 執行緒呼叫；
+              sections 為 section generator 清單，paths 為會輸出的檔案
+              （檔案區塊需呼叫 job.file_done(path) 回報進度）
+        cache: block_cache.BlockCache，完成或取消後寫回磁碟；可為 None
+        after: after(chat_path)，chat.txt 寫入完成後在 worker 執行緒呼叫（例如分段輸出），
+               回傳值存於 job.result；可為 None
+    """
+
+    def __init__(self, chat_path: str, plan, cache=None, after=None):
+        super().__init__()
+        self.setAutoDelete(False)   # kept alive by the window until done
+        self.chat_path = chat_path
+        self.plan = plan
+        self.cache = cache
+        self.after = after
+        self.result = None
+        self.signals = GenerateSignals()
+        self.cancelled = False
+        self._writer = None
+        self._sizes = {}
+        self._files_done = 0
+        self._files_total = 0
+        self._bytes_done = 0
+        self._bytes_total = 0
+        self._start = 0.0
+        self._last = 0.0
+
+    def cancel(self):
+        self.cancelled = True
+
+    def file_done(self, path: str) -> None:
+        """檔案區塊輸出完成（由 section generator 在 worker 執行緒呼叫）"""
+        self._files_done += 1
+        self._bytes_done += self._sizes.get(path, 0)
+        now = time.perf_counter()
+        if now - self._last >= PROGRESS_INTERVAL:
+            self._last = now
+            self._emit_progress(now)
+
+    def _emit_progress(self, now: float) -> None:
+        elapsed = now - self._start
+        # Too early to extrapolate until ETA_MIN_FRACTION of the input was read
+        if self._bytes_total and self._bytes_done >= self._bytes_total * ETA_MIN_FRACTION:
+            eta = elapsed * (self._bytes_total - self._bytes_done) / self._bytes_done
+        elif not self._bytes_total and self._files_done and self._files_total:
+            eta = elapsed * (self._files_total - self._files_done) / self._files_done
+        else:
+            eta = -1.0
+        written = self._writer.bytes if self._writer is not None else 0
+        self.signals.progress.emit(self._files_done, self._files_total, written, eta)
+
+    def run(self):
+        try:
+            try:
+                sections, paths = self.plan(self)
+                for path in paths:
+                    try:
+                        self._sizes[path] = os.path.getsize(path)
+                    except OSError:
+                        pass
+                self._files_total = len(paths)
+                self._bytes_total = sum(self._sizes.values())
+                # ETA covers reading and writing only, not expanding the selection
+                self._start = self._last = time.perf_counter()
+                self._emit_progress(self._start)
+                with ChatWriter(self.chat_path) as writer:
+                    self._writer = writer
+                    for section in sections:
+                        try:
+                            for text in section:
+                                if self.cancelled:
+                                    raise _Cancelled()
+                                writer.write(text)
+                        finally:
+                            section.close()
+                    self._emit_progress(time.perf_counter())
+                if self.after is not None:
+                    self.result = self.after(self.chat_path)
+            finally:
+                self._writer = None
+                if self.cache is not None:
+                    self.cache.save()
+        except _Cancelled:
+            self.signals.cancelled.emit()
+        except Exception as e:
+            traceback.print_exc()
+            self.signals.failed.emit(str(e))
+        else:
+            self.signals.done.emit(writer.chars)
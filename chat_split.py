@@ -0,0 +1,339 @@
+"""
+Multi-part Export for AI Coder Helper (no Qt)
+
+Web chat UIs truncate or refuse very large pastes.  split_chat() cuts a
+generated chat.txt into chat.part01.txt, chat.part02.txt, ... each under a
+character (or estimated token) cap:
+
+    cuts            between sections, file blocks ("## rel") and diff blocks
+                    ("### rel"); a block larger than the cap is cut between
+                    lines, its code fence closed and reopened
+    structure       only what prompt_builder / chat_writer emit: the section
+                    headings (BODY_HEADINGS) and "## " / "### " block titles
+                    outside code blocks.  Code blocks end only at a fence at
+                    least as long as the one that opened them (see
+                    chat_writer.fence_for), so file and diff contents are
+                    never read as headings or fences
+    continuation    a part starting inside a section or block repeats its
+                    heading with "(continued)"
+    headers         "[Part k of M]": every part but the last asks the model
+                    to wait; the last part ends with the instructions
+                    (prompt.txt and the Task Description), so the model reads
+                    them after all the files
+
+chat.txt is read once, line by line; only the part being filled is held in
+memory (at most one cap), and the part headers are written when M is known.
+"""
+
+import os
+import glob
+
+from token_budget import estimate_tokens
+
+# Per-project "part_chars" / "part_tokens" fields (0: do not split)
+DEFAULT_PART_CHARS = 0
+
+# Headings that end the instructions (prompt.txt + Task Description) of chat.txt
+BODY_HEADINGS = ("# Repository Map", "# Source Files", "# Shadow Files", "# Diff Report")
+
+# Shortest run of backticks that opens or closes a code block
+FENCE_MIN = 3
+
+# Room kept in every part for its "[Part k of M]" header
+HEADER_RESERVE = 200
+
+# Smallest room (tokens; CHARS_PER_TOKEN chars each) left for files in a part after the instructions
+MIN_BODY = 100
+CHARS_PER_TOKEN = 4
+
+# Smallest room (tokens, as above) left for content in a part after its continuation headings
+MIN_CONTINUED = 25
+
+
+def part_path(chat_path: str, index: int) -> str:
+    """chat.txt -> chat.part01.txt"""
+    root, ext = os.path.splitext(chat_path)
+    return f"{root}.part{index:02d}{ext}"
+
+
+def part_paths(chat_path: str):
+    """已存在的分段檔（依序）"""
+    root, ext = os.path.splitext(chat_path)
+    return sorted(glob.glob(glob.escape(root) + ".part[0-9][0-9]*" + glob.escape(ext)))
+
+
+def clear_parts(chat_path: str) -> None:
+    for path in part_paths(chat_path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _header(index: int, count: int) -> str:
+    if index < count:
+        return (f"[Part {index} of {count}] This prompt is split into {count} parts. "
+                f"Do not answer yet: reply only \"Received part {index} of {count}\". "
+                f"The instructions are at the end of part {count}.\n\n")
+    return (f"[Part {count} of {count}] Last part. The files are in parts 1-{count}; "
+            f"the instructions follow at the end of this part.\n\n")
+
+
+def _fence_run(line: str) -> int:
+    """行只有 ``` 時回傳 backtick 數（最多 3 個空白縮排，可有行尾空白），否則回傳 0"""
+    text = line.rstrip()
+    stripped = text.lstrip(" ")
+    if len(text) - len(stripped) > 3 or len(stripped) < FENCE_MIN or stripped.strip("`"):
+        return 0
+    return len(stripped)
+
+
+class _Scanner:
+    """
+    Classifies the body lines of chat.txt, remembering the open code block.
+
+    Attributes:
+        fence: 目前所在 code block 的開頭 fence（含換行）；不在 code block 內時為 None
+    """
+
+    def __init__(self):
+        self.fence = None
+
+    def kind(self, line: str):
+        """"fence"、"section"、"block" 或 None（一般內容），不改變狀態"""
+        run = _fence_run(line)
+        if self.fence is not None:
+            return "fence" if run >= len(self.fence) - 1 else None
+        if run:
+            return "fence"
+        if line.startswith(BODY_HEADINGS):
+            return "section"
+        if line.startswith(("## ", "### ")):
+            return "block"
+        return None
+
+    def feed(self, line: str):
+        """kind(line)，並更新所在的 code block"""
+        kind = self.kind(line)
+        self.apply(line, kind)
+        return kind
+
+    def apply(self, line: str, kind) -> None:
+        """已知 kind 時更新所在的 code block（切開的長行只是內容，不重新判斷）"""
+        if kind == "fence":
+            self.fence = None if self.fence is not None else "`" * _fence_run(line) + "\n"
+
+
+class _Packer:
+    """
+    Fills parts line by line and tracks where a cut would land (section, block, fence).
+
+    Every part, with the continuation headings it starts with and the fence it
+    is closed with, stays within cap.
+    """
+
+    def __init__(self, chat_path, cap, measure, min_room):
+        self.chat_path = chat_path
+        self.cap = cap
+        self.measure = measure
+        self.min_room = min_room
+        self.paths = []
+        self.lines = []
+        self.size = 0
+        self.section = None      # "# ..." heading of the current section
+        self.block = None        # "## ..." / "### ..." title of the current block
+        self.scan = _Scanner()
+
+    def _preamble(self, kind, fresh: bool = False):
+        """續接段落開頭要補上的行："(continued)" 標題與重新開啟的 fence（fresh：假設下一行放在新的段落）"""
+        if not fresh and (self.lines or not self.paths):
+            return []
+        lines = []
+        if self.section and kind != "section":
+            lines.append(f"{self.section} (continued)\n")
+        if self.block and kind not in ("section", "block"):
+            lines.append(f"{self.block} (continued)\n")
+        if self.scan.fence is not None:
+            lines.append(self.scan.fence)
+        return lines
+
+    def _closing(self, line: str, kind) -> int:
+        """加入 line 之後，flush 時關閉 code block 的 fence 大小"""
+        if kind == "fence":
+            return 0 if self.scan.fence is not None else self.measure(line)
+        return self.measure(self.scan.fence) if self.scan.fence is not None else 0
+
+    def _append(self, line: str, kind) -> None:
+        for text in self._preamble(kind):
+            self._put(text)
+        self._put(line)
+        self.scan.apply(line, kind)
+        if kind == "section":
+            self.section, self.block = line.rstrip("\n"), None
+        elif kind == "block":
+            self.block = line.rstrip("\n")
+
+    def _put(self, text: str) -> None:
+        self.lines.append(text)
+        self.size += self.measure(text)
+
+    def _room(self, line: str, kind) -> int:
+        return (self.cap - self.size - sum(map(self.measure, self._preamble(kind)))
+                - self._closing(line, kind))
+
+    def _cut(self, line: str, room: int) -> int:
+        """line 中可以放進 room 的最長開頭（加上換行）的長度"""
+        lo, hi = 0, len(line) - 1
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if self.measure(line[:mid] + "\n") <= room:
+                lo = mid
+            else:
+                hi = mid - 1
+        return lo
+
+    def flush(self) -> None:
+        if not self.lines:
+            return
+        if self.scan.fence is not None:
+            self.lines.append(self.scan.fence)   # reopened by _append in the next part
+        path = part_path(self.chat_path, len(self.paths) + 1)
+        with open(path, "w", encoding="utf-8") as f:
+            f.writelines(self.lines)
+        self.paths.append(path)
+        self.lines = []
+        self.size = 0
+
+    def add_line(self, line: str) -> None:
+        kind = self.scan.kind(line)
+        while True:
+            room = self._room(line, kind)
+            if self.measure(line) <= room:
+                self._append(line, kind)
+                return
+            fresh = self.cap - sum(map(self.measure, self._preamble(kind, True))) - self._closing(line, kind)
+            if fresh < self.min_room:
+                # Every following part would hold little more than the "(continued)" headings
+                raise ValueError(f"part limit too small: continuing {(self.block or self.section or line)[:60]!r} "
+                                 f"leaves almost no room in a part")
+            if self.lines and (kind is not None or self.measure(line) <= fresh):
+                self.flush()   # fits in the next part
+                continue
+            # Longer than a whole part: only a content line can be cut, starting here
+            cut = self._cut(line, room) if kind is None else 0
+            if cut <= 0:
+                if self.lines:
+                    self.flush()
+                    continue
+                raise ValueError(f"part limit too small: {line[:60].rstrip()!r} and its continuation "
+                                 f"headings do not fit in one part")
+            self._append(line[:cut] + "\n", kind)
+            self.flush()
+            line = line[cut:]
+
+    def add_unit(self, unit) -> None:
+        size = sum(map(self.measure, unit))
+        if size > self.cap:
+            # Cut between lines anyway, but not right after its headings: they go with the first line
+            size = 0
+            for line in unit:
+                # A fence line also costs the fence that closes the part
+                size += self.measure(line) * (2 if _fence_run(line) else 1)
+                if not line.startswith("#") and not _fence_run(line):
+                    break
+        if self.lines and self.size + size > self.cap:
+            self.flush()   # keep the block whole
+        for line in unit:
+            self.add_line(line)
+
+
+def split_chat(chat_path: str, max_chars: int = 0, max_tokens: int = 0):
+    """
+    將 chat.txt 分段寫成 chat.partNN.txt（舊的分段檔會先刪除）
+
+    Args:
+        chat_path: chat.txt 路徑
+        max_chars: 每段的字元上限
+        max_tokens: 每段的估計 token 上限（優先於 max_chars）
+
+    Returns:
+        分段檔路徑清單；不需要分段（未設定上限或整份不超過上限）時回傳 []
+
+    Raises:
+        ValueError: 上限放不下指示（prompt.txt + Task Description）與分段標頭，或放不下續接的標題
+        OSError: 無法讀取 chat.txt 或寫入分段檔
+        兩者都不影響 chat.txt，也不會留下分段檔
+    """
+    clear_parts(chat_path)
+    cap = max_tokens or max_chars
+    if not cap:
+        return []
+    try:
+        return _split(chat_path, cap, estimate_tokens if max_tokens else len, bool(max_tokens))
+    except BaseException:
+        # Parts written before the failure have no headers / instructions: none are left
+        clear_parts(chat_path)
+        raise
+
+
+def _split(chat_path: str, cap: int, measure, tokens: bool):
+    with open(chat_path, "r", encoding="utf-8") as f:
+        # Instructions: prompt.txt and the Task Description, up to the first body heading
+        head = []
+        head_size = 0
+        seen_task = False
+        for line in f:
+            seen_task = seen_task or line.startswith("# Task Description")
+            if seen_task and line.startswith(BODY_HEADINGS):
+                break
+            head.append(line)
+            head_size += measure(line)
+        else:
+            return []   # nothing but instructions
+
+        # Every part keeps room for the instructions, which only the last part carries
+        body_cap = cap - head_size - HEADER_RESERVE - measure("\n")
+        min_body = MIN_BODY * (1 if tokens else CHARS_PER_TOKEN)
+        if body_cap < min_body:
+            total = head_size + measure(line) + sum(map(measure, f))
+            if total <= cap:
+                return []   # fits in one paste anyway
+            unit = "tokens" if tokens else "chars"
+            raise ValueError(f"part limit of {cap:,} {unit} is too small: every part keeps room for the instructions "
+                             f"(prompt.txt and the Task Description, ~{head_size:,} {unit}) and its header; "
+                             f"use at least {cap - body_cap + min_body:,} {unit}")
+        min_room = MIN_CONTINUED * (1 if tokens else CHARS_PER_TOKEN)
+        packer = _Packer(chat_path, body_cap, measure, min_room)
+        scan = _Scanner()
+        scan.feed(line)
+        unit = [line]
+        heading_only = True   # a section heading stays with its first block
+        for line in f:
+            kind = scan.feed(line)
+            if kind == "section" or (kind == "block" and not heading_only):
+                packer.add_unit(unit)
+                unit = []
+            if kind is not None and kind != "fence":
+                heading_only = kind == "section"
+            unit.append(line)
+        if unit:
+            packer.add_unit(unit)
+        packer.flush()
+
+    paths = packer.paths
+    count = len(paths)
+    if count == 1:
+        clear_parts(chat_path)
+        return []   # fits in one paste
+
+    # Headers need the part count: rewrite each part (one part in memory at a time)
+    for index, path in enumerate(paths, 1):
+        with open(path, "r", encoding="utf-8") as f:
+            body = f.read()
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(_header(index, count))
+            f.write(body)
+            if index == count:
+                f.write("\n")
+                f.writelines(head)
+    return paths
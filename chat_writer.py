@@ -0,0 +1,379 @@
+"""
+Streaming chat.txt Writer for AI Coder Helper
+
+Prompt generation (EnterWindow.generate_chat) is a pipeline of section
+generators (system prompt, task description, source / shadow file blocks,
+diff report).  Each section yields text pieces that go straight through a
+buffered ChatWriter into chat.txt, and file contents are line-numbered one
+chunk (about CHUNK_SIZE bytes of whole lines) at a time, so memory stays
+bounded no matter how large the selection is.
+
+Files of a section are read and rendered concurrently on a bounded thread
+pool (file_blocks) and written in their sorted order.
+
+chat.txt is written to a temporary file next to it and only replaces the
+previous chat.txt once every section has been written.
+"""
+
+import os
+import re
+from collections import deque
+from itertools import islice
+
+CHAT_NAME = "chat.txt"
+
+# Size of the write buffer in front of chat.txt
+BUFFER_SIZE = 1 << 20
+
+# Approximate bytes of source lines numbered per chunk
+CHUNK_SIZE = 1 << 16
+
+# Largest file read and numbered in one piece by a loader thread; larger files are streamed
+RENDER_LIMIT = 4 << 20
+
+# Loader threads of file_blocks (per project: "load_workers" field, see generate_chat)
+DEFAULT_WORKERS = 8
+
+READ_ERROR = "(Error reading file)"
+
+_MISSING = object()
+
+
+class ChatWriter:
+    """
+    Buffered writer of chat.txt (used as a context manager).
+
+    Args:
+        path: chat.txt 路徑
+        buffer_size: 寫入緩衝區大小（bytes）
+
+    Example:
+        with ChatWriter(path) as writer:
+            writer.write_all(section)
+        writer.chars  # characters written
+    """
+
+    def __init__(self, path: str, buffer_size: int = BUFFER_SIZE):
+        self.path = path
+        self.tmp_path = path + ".tmp"
+        self.buffer_size = buffer_size
+        self.chars = 0
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.tmp_path, "w", encoding="utf-8", buffering=self.buffer_size)
+        self.chars = 0
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._file.close()
+        self._file = None
+        if exc_type is None:
+            os.replace(self.tmp_path, self.path)
+        else:
+            # Keep the previous chat.txt
+            try:
+                os.remove(self.tmp_path)
+            except OSError:
+                pass
+        return False
+
+    def write(self, text: str) -> None:
+        self._file.write(text)
+        self.chars += len(text)
+
+    @property
+    def bytes(self) -> int:
+        """目前已寫入 chat.txt 的 bytes（會先清空緩衝區，不要每個片段都呼叫）"""
+        return self._file.tell()
+
+    def write_all(self, pieces) -> None:
+        """寫入一個 section generator 產生的所有片段"""
+        for text in pieces:
+            self.write(text)
+
+
+# ========================
+# Section helpers
+# ========================
+
+def numbered_lines(path: str, start: int = 1):
+    """
+    逐塊讀取檔案並加上行號（"   1 | ..."），每次產生一個 chunk 的文字
+
+    Args:
+        path: 檔案路徑
+        start: 第一行的行號
+
+    Yields:
+        str: 已加上行號的一段連續行
+    """
+    n = start
+    with open(path, "r", encoding="utf-8") as f:
+        while True:
+            lines = f.readlines(CHUNK_SIZE)
+            if not lines:
+                break
+            yield "".join([f"{i:4} | {line}" for i, line in enumerate(lines, n)])
+            n += len(lines)
+
+
+def numbered_text(text: str, start: int = 1) -> str:
+    """
+    與 numbered_lines 相同的輸出，但輸入是已解碼的整份內容（block_cache 使用）
+
+    Args:
+        text: 檔案內容（換行符號尚未轉換）
+        start: 第一行的行號
+
+    Returns:
+        已加上行號的內容
+    """
+    # Universal newlines, same as reading in text mode
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    lines = text.split("\n")
+    last = lines.pop()
+    out = [f"{i:4} | {line}\n" for i, line in enumerate(lines, start)]
+    if last:
+        out.append(f"{len(lines) + start:4} | {last}")
+    return "".join(out)
+
+
+def split_lines(text: str):
+    """與文字模式 readlines() 相同的切行（universal newlines，保留 "\n"）"""
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    lines = text.split("\n")
+    last = lines.pop()
+    lines = [line + "\n" for line in lines]
+    if last:
+        lines.append(last)
+    return lines
+
+
+def numbered_subset(lines, keep) -> str:
+    """
+    只輸出部分行，保留原本的行號；省略的連續行以一行說明取代
+
+    Args:
+        lines: split_lines() 的結果
+        keep: 要保留的行號（1 起算）
+
+    Returns:
+        已加上行號的內容
+    """
+    out = []
+    n = len(lines)
+    prev = 0
+    for i in sorted(k for k in set(keep) if 1 <= k <= n):
+        if i > prev + 1:
+            out.append(_omitted(prev + 1, i - 1))
+        line = lines[i - 1]
+        out.append(f"{i:4} | {line}" if line.endswith("\n") else f"{i:4} | {line}\n")
+        prev = i
+    if prev < n:
+        out.append(_omitted(prev + 1, n))
+    return "".join(out)
+
+
+def parse_numbered(body: str):
+    """
+    將已加上行號的內容（numbered_text / numbered_subset 的結果）拆回各行
+
+    Returns:
+        [(行號, 不含行號的內容)]；省略說明的行號為 None
+    """
+    entries = []
+    for text in body.split("\n"):
+        if not text:
+            continue
+        number, sep, code = text.partition(" | ")
+        number = number.strip()
+        if sep and number.isdigit():
+            entries.append((int(number), code + "\n"))
+        else:
+            entries.append((None, text + "\n"))
+    return entries
+
+
+def numbered_entries_subset(entries, keep, n: int) -> str:
+    """
+    與 numbered_subset 相同，但輸入是 parse_numbered 的結果（例如已 slicing / 壓縮的內容）：
+    省略的行與原有的省略說明合併為一行說明；原本就不在內容中的行（壓縮時省略的空行）不另外說明
+
+    Args:
+        entries: parse_numbered() 的結果
+        keep: 要保留的行號
+        n: 原檔案的行數
+
+    Returns:
+        已加上行號的內容
+    """
+    out = []
+    prev = 0
+    dropped = False
+    for i, code in entries:
+        if i is not None and i in keep:
+            if dropped:
+                out.append(_omitted(prev + 1, i - 1))
+            out.append(f"{i:4} | {code}")
+            prev = i
+            dropped = False
+        else:
+            dropped = True
+    if dropped:
+        last = max((i for i, _ in entries if i is not None), default=prev)
+        out.append(_omitted(prev + 1, max(n, last, prev + 1)))
+    return "".join(out)
+
+
+def _omitted(first: int, last: int) -> str:
+    lines = f"line {first}" if first == last else f"lines {first}-{last}"
+    return f"{'':4} ~ ({lines} omitted)\n"
+
+
+class Note(str):
+    """取代整個檔案區塊的說明（"## title\n(note)"，不含程式碼）"""
+
+
+class Verbatim(str):
+    """不加行號的原文內容（例如對 source 的差異），以 fence_for() 的 fence 包住"""
+
+
+# A line opening / closing a Markdown code block: up to 3 spaces, then 3 or more backticks
+_FENCE_RE = re.compile(r"^ {0,3}(`{3,})", re.M)
+
+
+def fence_for(text: str) -> str:
+    """
+    包住 text 的 fence："```"，或比 text 中任何行首的 ``` 都長（Markdown 規則：內容中的 ``` 不會結束區塊，
+    chat_split 也不會把內容當成標題或 fence）
+
+    Returns:
+        fence（不含換行）
+    """
+    longest = max((len(run) for run in _FENCE_RE.findall(text)), default=0)
+    return "`" * max(3, longest + 1)
+
+
+def render_file(path: str):
+    """
+    一次讀取並加上行號（載入執行緒使用；不使用快取時）
+
+    Returns:
+        str；檔案超過 RENDER_LIMIT、無法讀取或不是 UTF-8 時回傳 None（改用串流讀取）
+    """
+    try:
+        with open(path, "rb") as f:
+            data = f.read(RENDER_LIMIT + 1)
+        if len(data) > RENDER_LIMIT:
+            return None
+        return numbered_text(data.decode("utf-8"))
+    except (OSError, UnicodeDecodeError):
+        return None
+
+
+def _block(title: str, path: str, missing: str, body):
+    if body is _MISSING:
+        yield f"## {title}\n({missing})\n\n"
+        return
+    if isinstance(body, Note):
+        yield f"## {title}\n({body})\n\n"
+        return
+    if isinstance(body, Verbatim):
+        fence = fence_for(body)
+        yield f"## {title}\n{fence}\n{body}\n{fence}\n\n"
+        return
+    yield f"## {title}\n```\n"
+    if body is not None:
+        yield body
+    else:
+        # Not rendered at once (too large, unreadable, not UTF-8): stream it
+        try:
+            yield from numbered_lines(path)
+        except Exception:
+            yield READ_ERROR
+    yield "\n```\n\n"
+
+
+def file_block(title: str, path: str, missing: str, cache=None):
+    """
+    單一檔案區塊：標題、加上行號的內容（以 ``` 包住）
+
+    Args:
+        title: 區塊標題（"## " 之後的文字）
+        path: 檔案絕對路徑
+        missing: 檔案不存在時顯示的說明
+        cache: block_cache.BlockCache；None 表示直接串流讀取
+
+    Yields:
+        str: 區塊文字片段
+    """
+    if not os.path.exists(path):
+        body = _MISSING
+    else:
+        body = cache.render(path) if cache is not None else None
+    yield from _block(title, path, missing, body)
+
+
+def file_blocks(items, cache=None, workers: int = DEFAULT_WORKERS, done=None, bodies=None):
+    """
+    多個檔案區塊：由最多 workers 個執行緒同時讀取與加上行號，依 items 的順序輸出
+
+    只會預先載入 2 * workers 個檔案，記憶體用量不隨選取的檔案數增加。
+
+    Args:
+        items: [(title, path, missing)]，意義同 file_block
+        cache: block_cache.BlockCache 或 None
+        workers: 執行緒數量（1 表示在目前的執行緒依序讀取）
+        done: 每個區塊輸出後呼叫 done(path)（進度回報用），可為 None
+        bodies: {title: 內容或 Note}，已決定好的區塊（例如 token_budget 裁剪後的檔案）不再讀取
+
+    Yields:
+        str: 區塊文字片段
+    """
+    items = list(items)
+    bodies = bodies or {}
+    if workers <= 1 or len(items) <= 1:
+        for title, path, missing in items:
+            if title in bodies:
+                yield from _block(title, path, missing, bodies[title])
+            else:
+                yield from file_block(title, path, missing, cache)
+            if done is not None:
+                done(path)
+        return
+
+    # Imported here: the command line (cli.py) should not pay for it when it does not load files
+    from concurrent.futures import ThreadPoolExecutor
+
+    render = cache.render if cache is not None else render_file
+
+    def load(item):
+        title, path, _ = item
+        if title in bodies:
+            return bodies[title]
+        if not os.path.exists(path):
+            return _MISSING
+        return render(path)
+
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chat-load")
+    try:
+        pending = deque()
+        queue = iter(items)
+        for item in islice(queue, workers * 2):
+            pending.append((item, pool.submit(load, item)))
+        while pending:
+            (title, path, missing), future = pending.popleft()
+            item = next(queue, None)
+            if item is not None:
+                pending.append((item, pool.submit(load, item)))
+            try:
+                body = future.result()
+            except Exception:
+                body = None   # streamed below, which renders the read error
+            yield from _block(title, path, missing, body)
+            if done is not None:
+                done(path)
+    finally:
+        # Also reached when the consumer stops early: drop what was not started
+        pool.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,258 @@
+"""
+Command Line Interface for AI Coder Helper (no Qt)
+
+    python cli.py generate [-t TEXT | -f FILE] [-o PATH] [--model NAME] [--budget N]
+                           [--slice | --no-slice] [-s SYMBOL ...] [--no-dedupe]
+                           [--compact | --no-compact] [--map | --no-map]
+                           [--split CHARS | --split-tokens N]
+                           [--no-source] [--no-shadow] [--no-diff]
+    python cli.py diff [-o PATH] [--algorithm histogram|patience|myers]
+    python cli.py sync [PATH ...] [--all] [--dry-run]
+    python cli.py history [ENTRY] [-o PATH]
+    python cli.py status
+
+"python main.py <command> ..." runs the same commands without loading Qt.
+Every command works on the current project unless -p/--project is given.
+Modules are imported inside the commands so startup stays fast.
+"""
+
+import sys
+import argparse
+
+
+def _load(args):
+    """(project_name, data)；找不到專案時結束並回傳錯誤碼 2"""
+    from project_store import get_store
+
+    data = get_store().load_data()
+    name = args.project or data.get("current_project")
+    if not name or name not in data["projects"]:
+        sys.exit(f"error: no such project: {name}" if name else "error: no project selected (use -p)")
+    return name, data
+
+
+# ========================
+# Commands
+# ========================
+
+def cmd_generate(args) -> int:
+    from prompt_builder import generate, project_toggles, resolve_contexts
+
+    name, data = _load(args)
+    user_input = args.task or ""
+    if args.task_file:
+        with open(args.task_file, "r", encoding="utf-8") as f:
+            user_input = f.read()
+    toggles = project_toggles(data["projects"][name])
+    for key in ("source", "shadow", "diff"):
+        if getattr(args, f"no_{key}"):
+            toggles[key] = False
+    if args.model and args.budget is None:
+        from token_budget import MODEL_WINDOWS
+        if args.model not in MODEL_WINDOWS:
+            sys.exit(f"error: unknown model {args.model} (known: {', '.join(MODEL_WINDOWS)}); give --budget")
+    chat_path = args.output or resolve_contexts(name, data).chat_path
+    proj = data["projects"][name]
+    compactor = None
+    if args.compact if args.compact is not None else proj.get("compact"):
+        from compact import Compactor
+        compactor = Compactor()
+    chars = generate(name, data, user_input, toggles, chat_path, args.jobs, cache=not args.no_cache,
+                     model=args.model, budget=args.budget,
+                     slice_python=True if args.symbols else args.slice, symbols=args.symbols,
+                     dedupe=False if args.no_dedupe else None, compact=compactor or False,
+                     repo_map=args.map)
+    print(f"{chat_path}: {chars} chars")
+    if compactor is not None:
+        for line in compactor.report():
+            print(line, file=sys.stderr)
+
+    # Snapshot into file/<project>/.coder-history (see prompt_history.py)
+    from prompt_history import get_history, HISTORY_LIMIT
+    get_history(name).record(chat_path, user_input, proj.get("history_limit", HISTORY_LIMIT),
+                             model=args.model or proj.get("target_model"))
+
+    part_chars = (proj.get("part_chars") or 0) if args.split is None else args.split
+    part_tokens = (proj.get("part_tokens") or 0) if args.split_tokens is None else args.split_tokens
+    if part_chars or part_tokens or args.split is not None or args.split_tokens is not None:
+        from chat_split import split_chat
+        try:
+            parts = split_chat(chat_path, part_chars, part_tokens)
+        except ValueError as e:
+            print(f"error: not split: {e}", file=sys.stderr)
+            return 1
+        for path in parts:
+            print(path)
+        if parts:
+            print(f"Split into {len(parts)} parts; paste them in order.", file=sys.stderr)
+    return 0
+
+
+def cmd_diff(args) -> int:
+    from prompt_builder import resolve_contexts, collect_files, iter_diff_report
+    from selection_index import get_selection_index
+
+    if args.algorithm is not None:
+        from line_diff import ALGORITHMS
+        if args.algorithm not in ALGORITHMS:
+            sys.exit(f"error: unknown algorithm {args.algorithm} (known: {', '.join(ALGORITHMS)})")
+    name, data = _load(args)
+    ctx = resolve_contexts(name, data)
+    src_rels, coped_rels = collect_files(ctx, get_selection_index(name).sections)
+    common = sorted(set(src_rels) & set(coped_rels))
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        blocks = 0
+        for block in iter_diff_report(ctx.source_root, ctx.coped_root, common, algorithm=args.algorithm):
+            out.write(("\n" if blocks else "") + block)
+            blocks += 1
+        if blocks:
+            out.write("\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"{len(common)} common files, {blocks} changed", file=sys.stderr)
+    return 0
+
+
+def cmd_sync(args) -> int:
+    from shadow_sync import SHADOW_ROOT, shadow_files, sync_to_origin
+
+    name, data = _load(args)
+    if not args.paths and not args.all:
+        sys.exit("error: give shadow paths to sync, or --all")
+    rels = shadow_files(SHADOW_ROOT, None if args.all else args.paths)
+    copied = sync_to_origin(data["projects"][name]["path"], rels, SHADOW_ROOT, args.dry_run)
+    for _, dest in copied:
+        print(dest)
+    verb = "Would sync" if args.dry_run else "Synced"
+    print(f"{verb} {len(copied)} files to origin.", file=sys.stderr)
+    return 0
+
+
+def cmd_history(args) -> int:
+    import datetime
+    from prompt_history import get_history
+
+    name, _ = _load(args)
+    history = get_history(name)
+    if not args.entry:
+        for index, entry in enumerate(history.entries(), 1):
+            when = datetime.datetime.fromtimestamp(entry.get("time", 0)).strftime("%Y-%m-%d %H:%M:%S")
+            print(f"{index:3}  {entry['id']}  {when}  {entry.get('chars', 0):>10,} chars  {entry.get('task') or ''}")
+        return 0
+    entry_id = history.resolve(args.entry)
+    if entry_id is None:
+        sys.exit(f"error: no such history entry: {args.entry}")
+    if args.output:
+        chars = history.restore(entry_id, args.output)
+        print(f"{args.output}: {chars} chars", file=sys.stderr)
+    else:
+        for text in history.read_entry(entry_id):
+            sys.stdout.write(text)
+    return 0
+
+
+def cmd_status(args) -> int:
+    import os
+    from prompt_builder import resolve_contexts, project_toggles
+
+    name, data = _load(args)
+    proj = data["projects"][name]
+    ctx = resolve_contexts(name, data)
+    toggles = project_toggles(proj)
+    print(f"Project:        {name}")
+    print(f"Path:           {proj['path']}")
+    print(f"Source Context: {ctx.source_root} ({ctx.source_name})")
+    print(f"Coped Context:  {ctx.coped_root} ({ctx.coped_name})")
+    print("Toggles:        " + ", ".join(f"{k}={'on' if v else 'off'}" for k, v in toggles.items()))
+    if proj.get("target_model") or proj.get("token_budget"):
+        from token_budget import budget_for
+        budget = budget_for(proj.get("target_model"), proj.get("token_budget"))
+        print(f"Token Budget:   {budget:,}" + (f" ({proj['target_model']})" if proj.get("target_model") else "")
+              if budget else f"Token Budget:   (unknown model {proj.get('target_model')})")
+    sections = [("origin", proj.get("origin", {}))] + sorted(proj.get("coped", {}).items())
+    for section, info in sections:
+        rules = info.get("selected_files") or []
+        print(f"Selected [{section}]: {len(rules)} rules" + (f" ({', '.join(rules[:5])}{', ...' if len(rules) > 5 else ''})" if rules else ""))
+    try:
+        st = os.stat(ctx.chat_path)
+    except OSError:
+        print("chat.txt:       (not generated)")
+    else:
+        import datetime
+        mtime = datetime.datetime.fromtimestamp(st.st_mtime).strftime("%Y-%m-%d %H:%M:%S")
+        print(f"chat.txt:       {st.st_size:,} bytes, {mtime}")
+    from prompt_history import get_history
+    print(f"History:        {get_history(name).count()} prompts (python main.py history)")
+    return 0
+
+
+# ========================
+# Entry point
+# ========================
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="coder", description="AI Coder Helper (headless)")
+    parser.add_argument("-p", "--project", help="project name (default: current project)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("generate", help="write chat.txt")
+    p.add_argument("-t", "--task", help="task description")
+    p.add_argument("-f", "--task-file", help="read the task description from a file")
+    p.add_argument("-o", "--output", help="output path (default: <project>/chat.txt)")
+    p.add_argument("-j", "--jobs", type=int, help="files read concurrently (default: project load_workers or 8)")
+    p.add_argument("--model", help="target model; the prompt is trimmed to its window (default: project target_model)")
+    p.add_argument("--budget", type=int, help="token budget, overrides the model window (0: no limit)")
+    p.add_argument("--slice", action="store_true", default=None,
+                   help="Python files: keep only definitions named in the task or by -s (default: project slice_python)")
+    p.add_argument("--no-slice", dest="slice", action="store_false", help="send Python files whole")
+    p.add_argument("-s", "--symbol", dest="symbols", action="append",
+                   help="definition to keep, e.g. Login or Login.check (repeatable, implies --slice)")
+    p.add_argument("--no-dedupe", action="store_true",
+                   help="repeat shadow files that are also in Source in full (default: project dedupe_shadow)")
+    p.add_argument("--compact", action="store_true", default=None,
+                   help="leave out blank and comment-only lines, keeping line numbers (default: project compact)")
+    p.add_argument("--no-compact", dest="compact", action="store_false", help="send file contents as they are")
+    p.add_argument("--map", action="store_true", default=None,
+                   help="add a map of the whole source context: tree + top-level signatures (default: project repo_map)")
+    p.add_argument("--no-map", dest="map", action="store_false", help="leave out the repository map")
+    p.add_argument("--split", type=int, metavar="CHARS",
+                   help="also write chat.part01.txt ... of at most CHARS characters (default: project part_chars)")
+    p.add_argument("--split-tokens", type=int, metavar="N",
+                   help="like --split, capped at N estimated tokens (default: project part_tokens)")
+    p.add_argument("--no-source", action="store_true", help="leave out the source files")
+    p.add_argument("--no-shadow", action="store_true", help="leave out the shadow files")
+    p.add_argument("--no-diff", action="store_true", help="leave out the diff report")
+    p.add_argument("--no-cache", action="store_true", help="do not use the rendered block cache")
+    p.set_defaults(func=cmd_generate)
+
+    p = sub.add_parser("diff", help="print the Source -> Coped diff of the selected files")
+    p.add_argument("--algorithm", help="line diff algorithm: histogram, patience or myers, see line_diff.py "
+                                        "(default: histogram)")
+    p.add_argument("-o", "--output", help="write to a file instead of stdout")
+    p.set_defaults(func=cmd_diff)
+
+    p = sub.add_parser("sync", help="copy shadow files back to the origin project")
+    p.add_argument("paths", nargs="*", help="files or directories, relative to file/shadow")
+    p.add_argument("--all", action="store_true", help="sync every shadow file")
+    p.add_argument("-n", "--dry-run", action="store_true", help="only list what would be copied")
+    p.set_defaults(func=cmd_sync)
+
+    p = sub.add_parser("history", help="list generated prompts, or print / restore one")
+    p.add_argument("entry", nargs="?", help="1 = newest, 2 = the one before ..., or an entry id (prefix)")
+    p.add_argument("-o", "--output", help="write the prompt to a file instead of stdout")
+    p.set_defaults(func=cmd_history)
+
+    p = sub.add_parser("status", help="show the project, its contexts and selection")
+    p.set_defaults(func=cmd_status)
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
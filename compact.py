@@ -0,0 +1,213 @@
+"""
+Listing Compaction for AI Coder Helper (no Qt)
+
+Optional stage that leaves out what costs tokens but tells the model
+nothing: blank lines, comment-only lines (banners, license headers) and
+trailing whitespace.  Lines that are kept keep their original numbers, so
+the Penter ADD / REMOVE line references of prompt.txt still hold; a gap in
+the numbers is a left-out line.
+
+    Python          tokenize: comment-only lines and blank lines, never inside
+                    a multi-line string (whose lines also keep their trailing
+                    whitespace)
+    C-like          "//" lines and whole-line "/* ... */" blocks
+    hash / dash     "#" (shell, YAML, TOML ...) or "--" (SQL, Lua) lines
+    other           blank lines and trailing whitespace only
+
+Compactor.render() has the same contract as block_cache.BlockCache.render,
+so file_blocks reads and compacts files on its loader threads; the tokens
+saved per file are collected for the report shown after generation.
+"""
+
+import io
+import os
+import threading
+import tokenize
+from collections import OrderedDict
+
+from chat_writer import RENDER_LIMIT, split_lines, numbered_text
+from token_budget import estimate_tokens
+
+C_LIKE = frozenset((".c", ".h", ".cc", ".cpp", ".hpp", ".cs", ".java", ".js", ".jsx", ".ts", ".tsx",
+                    ".mjs", ".go", ".rs", ".swift", ".kt", ".kts", ".scala", ".dart", ".php",
+                    ".css", ".scss", ".less"))
+HASH_COMMENT = frozenset((".sh", ".bash", ".zsh", ".rb", ".pl", ".r", ".yaml", ".yml", ".toml",
+                          ".cfg", ".conf", ".ini", ".ps1", ".cmake", ".mk"))
+HASH_NAMES = frozenset(("makefile", "dockerfile", ".gitignore", ".coderignore", ".dockerignore"))
+DASH_COMMENT = frozenset((".sql", ".lua", ".hs"))
+PYTHON = frozenset((".py", ".pyw", ".pyi"))
+
+# Characters of compacted bodies kept in memory
+CACHE_CHARS = 16 << 20
+
+# Header line of the Task Description when compaction is on
+NOTE = ("Compacted listings: blank lines, comment-only lines and trailing whitespace are left out; "
+        "line numbers are the original ones (gaps are expected)")
+
+
+def _python_keep(text: str, lines):
+    """(kept line numbers, line numbers whose end is inside a string token)"""
+    drop = set()
+    protected = set()
+    in_string = set()
+    try:
+        for tok in tokenize.generate_tokens(io.StringIO(text).readline):
+            if tok.type == tokenize.COMMENT and lines[tok.start[0] - 1].lstrip().startswith("#"):
+                drop.add(tok.start[0])
+            elif tok.end[0] > tok.start[0] and tok.type not in (tokenize.NL, tokenize.NEWLINE):
+                # Multi-line strings (and f-string parts): keep every line as written
+                protected.update(range(tok.start[0], tok.end[0] + 1))
+                # Trailing whitespace of these lines is part of the string's value
+                in_string.update(range(tok.start[0], tok.end[0]))
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        return _prefix_keep(lines, "#"), set()
+    if lines and lines[0].startswith("#!"):
+        drop.discard(1)
+    keep = [i for i, line in enumerate(lines, 1)
+            if i in protected or (i not in drop and line.strip())]
+    return keep, in_string
+
+
+def _c_keep(lines):
+    keep = []
+    in_block = False
+    for i, line in enumerate(lines, 1):
+        stripped = line.strip()
+        if in_block:
+            if "*/" in stripped:
+                in_block = False
+                if stripped.split("*/", 1)[1].strip():
+                    keep.append(i)
+            continue
+        if not stripped or stripped.startswith("//"):
+            continue
+        if stripped.startswith("/*"):
+            if "*/" not in stripped[2:]:
+                in_block = True
+            elif stripped[2:].split("*/", 1)[1].strip():
+                keep.append(i)
+            continue
+        keep.append(i)
+    return keep
+
+
+def _prefix_keep(lines, prefix: str):
+    keep = []
+    for i, line in enumerate(lines, 1):
+        stripped = line.strip()
+        if stripped and (not stripped.startswith(prefix) or (i == 1 and stripped.startswith("#!"))):
+            keep.append(i)
+    return keep
+
+
+def compact_text(text: str, path: str):
+    """
+    壓縮後的內容
+
+    Args:
+        text: 檔案內容
+        path: 檔案路徑（由副檔名決定語言）
+
+    Returns:
+        (body, before, after)：加上原始行號的內容，壓縮前後的估計 token 數
+    """
+    lines = split_lines(text)
+    name = os.path.basename(path).lower()
+    ext = os.path.splitext(name)[1]
+    verbatim = set()
+    if ext in PYTHON:
+        keep, verbatim = _python_keep(text, lines)
+    elif ext in C_LIKE:
+        keep = _c_keep(lines)
+    elif ext in HASH_COMMENT or name in HASH_NAMES:
+        keep = _prefix_keep(lines, "#")
+    elif ext in DASH_COMMENT:
+        keep = _prefix_keep(lines, "--")
+    else:
+        keep = [i for i, line in enumerate(lines, 1) if line.strip()]
+    out = []
+    for i in keep:
+        line = lines[i - 1]
+        # Inside a string only the newline goes; everywhere else trailing whitespace too
+        line = line.rstrip("\n") if i in verbatim else line.rstrip()
+        out.append(f"{i:4} | {line}\n")
+    body = "".join(out)
+    if keep and keep[-1] == len(lines) and not lines[-1].endswith("\n"):
+        body = body[:-1]   # same as numbered_text: no newline added after the last line
+    # Measured on the numbered listing either way, so only what was left out counts as saved
+    return body, estimate_tokens(numbered_text(text)), estimate_tokens(body)
+
+
+class Compactor:
+    """
+    Renders compacted file bodies (same contract as BlockCache.render) and
+    records the tokens saved per file.
+
+    Attributes:
+        stats: {path: (before, after)}：本次產生中各檔案壓縮前後的估計 token 數
+    """
+
+    _cache = OrderedDict()   # (path, size, mtime_ns) -> (body, before, after), shared by all runs
+    _cache_chars = 0
+    _lock = threading.Lock()
+
+    def __init__(self):
+        self.stats = {}
+
+    def render(self, path: str):
+        """壓縮後加上行號的內容；過大、無法讀取或不是 UTF-8 時回傳 None（改用串流讀取完整內容）"""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        if st.st_size > RENDER_LIMIT:
+            return None
+        key = (path, st.st_size, st.st_mtime_ns)
+        cls = Compactor
+        with cls._lock:
+            hit = cls._cache.get(key)
+            if hit is not None:
+                cls._cache.move_to_end(key)
+        if hit is None:
+            try:
+                with open(path, "rb") as f:
+                    text = f.read(RENDER_LIMIT + 1).decode("utf-8")
+            except (OSError, UnicodeDecodeError):
+                return None
+            hit = compact_text(text, path)
+            with cls._lock:
+                cls._cache[key] = hit
+                cls._cache_chars += len(hit[0])
+                while cls._cache_chars > CACHE_CHARS and len(cls._cache) > 1:
+                    cls._cache_chars -= len(cls._cache.popitem(last=False)[1][0])
+        with cls._lock:
+            self.stats[path] = hit[1:]
+        return hit[0]
+
+    def report(self, base: str = None, limit: int = 10):
+        """
+        壓縮結果說明（依節省的 token 數排序）
+
+        Args:
+            base: 顯示路徑的基準目錄；None 表示所有檔案共同的上層目錄（路徑會以 context 資料夾名稱開頭）
+            limit: 最多列出幾個檔案
+
+        Returns:
+            說明行清單；沒有壓縮任何檔案時回傳 []
+        """
+        if not self.stats:
+            return []
+        before = sum(b for b, _ in self.stats.values())
+        after = sum(a for _, a in self.stats.values())
+        if base is None:
+            try:
+                base = os.path.dirname(os.path.commonpath(list(self.stats)))
+            except ValueError:
+                base = ""   # different drives: absolute paths
+        lines = [f"Compaction saved ~{before - after:,} of ~{before:,} tokens "
+                 f"({(before - after) * 100 // max(before, 1)}%) in {len(self.stats)} files"]
+        ranked = sorted(self.stats.items(), key=lambda item: (item[1][1] - item[1][0], item[0]))
+        for path, (b, a) in [item for item in ranked if item[1][1] < item[1][0]][:limit]:
+            shown = os.path.relpath(path, base) if base else path
+            lines.append(f"  {shown}: ~{b:,} -> ~{a:,} tokens (-{(b - a) * 100 // max(b, 1)}%)")
+        return lines
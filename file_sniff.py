@@ -0,0 +1,147 @@
+"""
+File Sniffing for AI Coder Helper (no Qt)
+
+Decides, before a selected file is read, whether it belongs in the prompt.
+Only the first SNIFF_SIZE bytes are looked at, through mmap, so a 300 MB
+data file costs no more than a small one:
+
+    too large       size over the project's max_file_size
+    binary          NUL byte
+    not UTF-8       invalid UTF-8
+    minified        a line longer than the project's max_line_length
+    generated       lock files, *.min.js, *_pb2.py ... (by name) or a
+                    "@generated" / "DO NOT EDIT" style marker in the first lines
+
+Excluded files are written as one line ("## rel" + kind, MIME type and
+size) instead of their content, and are left out of the diff report.
+
+What the head of a file contains is cached by (device, inode) together with
+the mtime, so unchanged files are not opened again; the thresholds are
+applied on every call.
+"""
+
+import os
+import mmap
+import codecs
+import fnmatch
+import mimetypes
+from collections import OrderedDict
+
+# Bytes read from the start of each file
+SNIFF_SIZE = 8 << 10
+
+# Generated-file markers are only looked for in the first lines (at most MARKER_SIZE bytes)
+MARKER_LINES = 5
+MARKER_SIZE = 1 << 10
+
+# Defaults of the per-project "max_file_size" (bytes, 0: no limit) and "max_line_length" fields
+DEFAULT_MAX_SIZE = 2 << 20
+DEFAULT_MAX_LINE = 2000
+
+# Heads kept in memory
+SNIFF_CACHE_SIZE = 16384
+
+GENERATED_NAMES = (
+    "*.min.js", "*.min.css", "*.map", "*_pb2.py", "*_pb2_grpc.py", "*.pb.go", "*.g.dart",
+    "package-lock.json", "yarn.lock", "pnpm-lock.yaml", "poetry.lock", "Pipfile.lock",
+    "Cargo.lock", "composer.lock", "go.sum",
+)
+
+GENERATED_MARKERS = (
+    b"@generated", b"do not edit", b"code generated by", b"auto-generated",
+    b"autogenerated", b"automatically generated", b"generated by the protocol buffer compiler",
+)
+
+_heads = OrderedDict()
+
+
+def format_size(size: int) -> str:
+    """12 B / 3.4 KB / 5.6 MB / 1.2 GB"""
+    if size < 1024:
+        return f"{size} B"
+    for unit in ("KB", "MB", "GB"):
+        size /= 1024
+        if size < 1024 or unit == "GB":
+            return f"{size:.1f} {unit}"
+
+
+def project_limits(proj: dict):
+    """(max_file_size, max_line_length)：專案設定或預設值"""
+    max_size = proj.get("max_file_size")
+    max_line = proj.get("max_line_length")
+    return (DEFAULT_MAX_SIZE if max_size is None else max_size,
+            DEFAULT_MAX_LINE if max_line is None else max_line)
+
+
+def _read_head(path: str, size: int):
+    """(has_nul, utf8_ok, longest_line, generated_marker) of the first SNIFF_SIZE bytes"""
+    if size == 0:
+        return False, True, 0, False
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            head = mm[:SNIFF_SIZE]
+    try:
+        # final=False: a character cut at the end of the head is not an error
+        codecs.getincrementaldecoder("utf-8")().decode(head, final=len(head) == size)
+        utf8_ok = True
+    except UnicodeDecodeError:
+        utf8_ok = False
+    longest = max(map(len, head.split(b"\n")))
+    top = b"\n".join(head[:MARKER_SIZE].split(b"\n")[:MARKER_LINES]).lower()
+    return b"\0" in head, utf8_ok, longest, any(marker in top for marker in GENERATED_MARKERS)
+
+
+def sniff(path: str, max_size: int = DEFAULT_MAX_SIZE, max_line: int = DEFAULT_MAX_LINE):
+    """
+    判斷檔案是否不適合放進 prompt
+
+    Args:
+        path: 檔案路徑
+        max_size: 大小上限（bytes，0 表示不限制）
+        max_line: 單行長度上限（bytes，0 表示不限制）
+
+    Returns:
+        (kind, size)：kind 為 "too large" / "binary" / "not UTF-8" / "minified" / "generated"；
+        可以放進 prompt（或無法讀取，交給原本的錯誤處理）時回傳 None
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    size = st.st_size
+    if max_size and size > max_size:
+        return "too large", size
+    name = os.path.basename(path)
+    if any(fnmatch.fnmatch(name, pattern) for pattern in GENERATED_NAMES):
+        return "generated", size
+
+    key = (st.st_dev, st.st_ino)
+    hit = _heads.get(key)
+    if hit is not None and hit[0] == (st.st_mtime_ns, size):
+        _heads.move_to_end(key)
+        facts = hit[1]
+    else:
+        try:
+            facts = _read_head(path, size)
+        except (OSError, ValueError):
+            return None
+        _heads[key] = ((st.st_mtime_ns, size), facts)
+        while len(_heads) > SNIFF_CACHE_SIZE:
+            _heads.popitem(last=False)
+
+    has_nul, utf8_ok, longest, generated = facts
+    if has_nul:
+        return "binary", size
+    if not utf8_ok:
+        return "not UTF-8", size
+    if max_line and longest > max_line:
+        return "minified", size
+    if generated:
+        return "generated", size
+    return None
+
+
+def summary(path: str, kind: str, size: int) -> str:
+    """排除的檔案在 prompt 中的說明，例如 "skipped: binary, image/png, 1.2 MB" """
+    mime = mimetypes.guess_type(path)[0]
+    return f"skipped: {kind}, {mime + ', ' if mime else ''}{format_size(size)}"
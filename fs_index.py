@@ -0,0 +1,455 @@
+"""
+Filesystem Index for AI Coder Helper
+
+One os.scandir-based index per context root, shared by every tree window
+(Console, ProjectChoose, ShadowManager, Sync).  Each directory record keeps
+name / type / size / mtime / inode of its entries plus the directory's own
+mtime, so a refresh only re-lists directories whose mtime changed.
+Subtrees are walked level by level on a thread pool.
+
+Entries ignored by the root's IgnoreMatcher (.gitignore / .coderignore,
+see ignore.py) are dropped while listing, so ignored subtrees are never
+descended into and no consumer of the index sees them.
+
+Indexes can be persisted to a compact binary snapshot (file/<project>/scan.idx,
+see save_snapshot / load_snapshot), so a window opens from the last known
+listing and the following refresh only re-lists directories whose mtime
+differs from the snapshot.
+"""
+
+import os
+import stat
+import struct
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from ignore import get_ignore, GITIGNORE
+
+MAX_WORKERS = min(8, (os.cpu_count() or 2) + 2)
+
+# Directories per progress() batch during refresh
+BATCH_SIZE = 256
+
+# Snapshot file name inside file/<project>/
+SNAPSHOT_NAME = "scan.idx"
+SNAPSHOT_MAGIC = b"CFSX"
+SNAPSHOT_VERSION = 1
+
+
+class Entry:
+    """單一目錄項目的 stat 快照"""
+    __slots__ = ("name", "is_dir", "size", "mtime_ns", "inode")
+
+    def __init__(self, name, is_dir, size, mtime_ns, inode):
+        self.name = name
+        self.is_dir = is_dir
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.inode = inode
+
+    def __repr__(self):
+        return f"Entry({self.name!r}, dir={self.is_dir}, size={self.size})"
+
+
+class DirRecord:
+    """一個目錄的內容（依名稱排序）與目錄本身的 mtime"""
+    __slots__ = ("mtime_ns", "entries")
+
+    def __init__(self, mtime_ns, entries):
+        self.mtime_ns = mtime_ns
+        self.entries = entries
+
+
+def _same_entries(a: list, b: list) -> bool:
+    if len(a) != len(b):
+        return False
+    return all(x.name == y.name and x.is_dir == y.is_dir and x.size == y.size and x.mtime_ns == y.mtime_ns
+               for x, y in zip(a, b))
+
+
+def _scan_dir(path: str) -> list:
+    entries = []
+    with os.scandir(path) as it:
+        for e in it:
+            try:
+                st = e.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            is_dir = stat.S_ISDIR(st.st_mode)
+            entries.append(Entry(e.name, is_dir, 0 if is_dir else st.st_size, st.st_mtime_ns, st.st_ino))
+    entries.sort(key=lambda x: x.name)
+    return entries
+
+
+class FsIndex:
+    """
+    單一 context 根目錄的檔案索引
+
+    Keys of self.dirs are relative directory paths joined with os.sep
+    ("" for the root).
+    """
+
+    def __init__(self, root: str, ignore=None, max_workers: int = MAX_WORKERS):
+        self.root = os.path.normpath(root)
+        self.ignore = ignore if ignore is not None else get_ignore(self.root)
+        self.max_workers = max_workers
+        self.dirs = {}
+        self.generation = 0    # bumped whenever a refresh changes anything
+        self.saved_generation = 0   # generation written to / read from the snapshot
+        self.lock = threading.RLock()
+
+    # ========================
+    # Refresh
+    # ========================
+
+    def _visit(self, rel: str, force: bool = False):
+        """Stat one directory; re-list it only if its mtime changed (or force)."""
+        path = os.path.join(self.root, rel) if rel else self.root
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            return rel, None, False, False
+        old = self.dirs.get(rel)
+        if old is not None and old.mtime_ns == mtime_ns and not force:
+            return rel, old, False, False
+        try:
+            entries = _scan_dir(path)
+        except OSError:
+            return rel, None, True, False
+        # A .gitignore added/removed here invalidates what was already filtered
+        stale = self.ignore.listing_changed(rel, entries)
+        ignored = self.ignore.ignored
+        entries = [e for e in entries
+                   if not ignored(os.path.join(rel, e.name) if rel else e.name, e.is_dir)]
+        return rel, DirRecord(mtime_ns, entries), True, stale
+
+    def refresh(self, progress=None, cancelled=None, batch_size: int = BATCH_SIZE) -> set:
+        """
+        與磁碟同步（只重新列出 mtime 改變的目錄）
+
+        Args:
+            progress: progress(rels, files_seen)，每掃描完一批目錄呼叫一次
+            cancelled: 回傳 True 時中止掃描（已掃描的目錄仍會保留）
+            batch_size: 每批最多幾個目錄
+
+        Returns:
+            內容有變動的目錄相對路徑集合
+        """
+        with self.lock:
+            if self.ignore.changed():
+                # Ignore rules changed: every cached listing was filtered with the old ones
+                self.dirs.clear()
+            changed = set()
+            seen = set()
+            batch = []
+            files = 0
+            aborted = False
+            stale = False
+            frontier = [""]
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                while frontier and not aborted:
+                    results = pool.map(self._visit, frontier) if len(frontier) > 1 else [self._visit(frontier[0])]
+                    next_frontier = []
+                    for rel, record, dirty, rules_changed in results:
+                        if cancelled is not None and cancelled():
+                            aborted = True
+                            break
+                        if record is None:
+                            continue
+                        seen.add(rel)
+                        stale = stale or rules_changed
+                        if dirty:
+                            self.dirs[rel] = record
+                            changed.add(rel)
+                        for e in record.entries:
+                            if e.is_dir:
+                                next_frontier.append(os.path.join(rel, e.name) if rel else e.name)
+                            else:
+                                files += 1
+                        if progress is not None:
+                            batch.append(rel)
+                            if len(batch) >= batch_size:
+                                progress(batch, files)
+                                batch = []
+                    if progress is not None and batch:
+                        # End of a level: flush so shallow directories show up first
+                        progress(batch, files)
+                        batch = []
+                    frontier = next_frontier
+            if not aborted:
+                for gone in set(self.dirs) - seen:
+                    del self.dirs[gone]
+                    changed.add(gone)
+            if changed:
+                self.generation += 1
+            if stale and not aborted:
+                self.ignore.reset()
+                self.dirs.clear()
+                return changed | self.refresh(progress, cancelled, batch_size)
+            return changed
+
+    def refresh_dirs(self, rels) -> set:
+        """
+        只重新列出指定的目錄（檔案監看回報的目錄），新出現的子目錄會整個掃描，
+        消失的子目錄連同子樹移除
+
+        Args:
+            rels: 目錄相對路徑（不在索引中的會被略過）
+
+        Returns:
+            內容有變動的目錄相對路徑集合
+        """
+        with self.lock:
+            if self.ignore.changed():
+                self.dirs.clear()
+                return self.refresh()
+            changed = set()
+            stale = False
+            frontier = [rel for rel in rels if rel in self.dirs]
+            while frontier:
+                next_frontier = []
+                for rel in frontier:
+                    old = self.dirs.get(rel)
+                    _, record, _, rules_changed = self._visit(rel, force=True)
+                    if record is None:
+                        self._drop(rel, changed)
+                        continue
+                    stale = stale or rules_changed
+                    if old is not None and _same_entries(old.entries, record.entries):
+                        old.mtime_ns = record.mtime_ns
+                        continue
+                    self.dirs[rel] = record
+                    changed.add(rel)
+                    old_dirs = {e.name for e in old.entries if e.is_dir} if old is not None else set()
+                    new_dirs = {e.name for e in record.entries if e.is_dir}
+                    for name in old_dirs - new_dirs:
+                        self._drop(os.path.join(rel, name) if rel else name, changed)
+                    for name in sorted(new_dirs - old_dirs):
+                        next_frontier.append(os.path.join(rel, name) if rel else name)
+                frontier = next_frontier
+            if stale:
+                self.ignore.reset()
+                self.dirs.clear()
+                return changed | self.refresh()
+            if changed:
+                self.generation += 1
+            return changed
+
+    def _drop(self, rel: str, changed: set) -> None:
+        """移除目錄與其子樹的記錄"""
+        prefix = rel + os.sep
+        for key in [k for k in self.dirs if not rel or k == rel or k.startswith(prefix)]:
+            del self.dirs[key]
+            changed.add(key)
+
+    def ensure(self) -> "FsIndex":
+        """第一次使用時才完整掃描"""
+        if not self.dirs:
+            self.refresh()
+        return self
+
+    # ========================
+    # Queries
+    # ========================
+
+    def listdir(self, rel: str = "") -> list:
+        """
+        取得目錄內容
+
+        Args:
+            rel: 目錄相對路徑（"" 為根目錄）
+
+        Returns:
+            Entry 清單（依名稱排序）；不存在則為空清單
+        """
+        record = self.dirs.get(rel)
+        return record.entries if record is not None else []
+
+    def is_dir(self, rel: str) -> bool:
+        return rel in self.dirs
+
+    def walk_files(self, rel: str = ""):
+        """
+        依名稱順序走訪子樹中的所有檔案
+
+        Yields:
+            (相對路徑, Entry)
+        """
+        for e in self.listdir(rel):
+            child = os.path.join(rel, e.name) if rel else e.name
+            if e.is_dir:
+                yield from self.walk_files(child)
+            else:
+                yield child, e
+
+    def file_count(self) -> int:
+        return sum(1 for rec in self.dirs.values() for e in rec.entries if not e.is_dir)
+
+
+# ========================
+# Snapshot (binary, zlib compressed)
+# ========================
+#
+#   header:  magic "CFSX", u16 version, u32 root count
+#   root:    u32 len + root path, q q .coderignore (mtime_ns, size) or (-1, -1), u32 dir count
+#   dir:     u32 len + rel path, q mtime_ns, u32 entry count,
+#            entry count x (B is_dir, q size, q mtime_ns, Q inode),
+#            u32 len + names joined with "\0"
+
+_HEAD = struct.Struct("<4sHI")
+_ROOT = struct.Struct("<qqI")
+_DIR = struct.Struct("<qI")
+_ENTRY = struct.Struct("<BqqQ")
+_U32 = struct.Struct("<I")
+_INODE_MASK = (1 << 64) - 1
+
+
+def _pack_str(out: list, text: str) -> None:
+    raw = text.encode("utf-8", "surrogateescape")
+    out.append(_U32.pack(len(raw)))
+    out.append(raw)
+
+
+def _unpack_str(buf, pos: int):
+    n, = _U32.unpack_from(buf, pos)
+    pos += 4
+    return bytes(buf[pos:pos + n]).decode("utf-8", "surrogateescape"), pos + n
+
+
+def save_snapshot(path: str, indexes) -> bool:
+    """
+    將索引寫入快照檔（只有在有索引變動過時才寫入，atomic rename）
+
+    Args:
+        path: 快照檔路徑（通常為 file/<project>/scan.idx）
+        indexes: FsIndex 清單
+
+    Returns:
+        True if written
+    """
+    indexes = [idx for idx in indexes if idx.dirs]
+    if not indexes or all(idx.generation == idx.saved_generation for idx in indexes):
+        return False
+    out = [_HEAD.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(indexes))]
+    generations = []
+    for idx in indexes:
+        with idx.lock:
+            generations.append(idx.generation)
+            _pack_str(out, idx.root)
+            coder_mtime, coder_size = idx.ignore.coder_signature or (-1, -1)
+            out.append(_ROOT.pack(coder_mtime, coder_size, len(idx.dirs)))
+            for rel, record in idx.dirs.items():
+                _pack_str(out, rel)
+                out.append(_DIR.pack(record.mtime_ns, len(record.entries)))
+                out.extend(_ENTRY.pack(e.is_dir, e.size, e.mtime_ns, e.inode & _INODE_MASK)
+                           for e in record.entries)
+                _pack_str(out, "\0".join(e.name for e in record.entries))
+    data = zlib.compress(b"".join(out), 1)
+    tmp = path + ".tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except OSError:
+        return False
+    for idx, generation in zip(indexes, generations):
+        idx.saved_generation = generation
+    return True
+
+
+def load_snapshot(path: str) -> list:
+    """
+    從快照檔載入索引到共用的 registry（已有資料的索引不會被覆蓋）
+
+    .coderignore 與快照時不同的根目錄會被略過；各目錄 .gitignore 的簽章會交給
+    IgnoreMatcher，下一次 refresh 時若有變動就整個重新掃描。
+
+    Args:
+        path: 快照檔路徑
+
+    Returns:
+        已載入的 FsIndex 清單
+    """
+    try:
+        with open(path, "rb") as f:
+            buf = memoryview(zlib.decompress(f.read()))
+        magic, version, n_roots = _HEAD.unpack_from(buf, 0)
+    except (OSError, zlib.error, struct.error):
+        return []
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+        return []
+
+    loaded = []
+    pos = _HEAD.size
+    try:
+        for _ in range(n_roots):
+            root, pos = _unpack_str(buf, pos)
+            coder_mtime, coder_size, n_dirs = _ROOT.unpack_from(buf, pos)
+            pos += _ROOT.size
+            index = None
+            if os.path.isdir(root):
+                candidate = get_index(root)
+                coder_sig = (coder_mtime, coder_size) if coder_mtime >= 0 else None
+                if not candidate.dirs and candidate.ignore.coder_signature == coder_sig:
+                    index = candidate
+            dirs = {}
+            for _ in range(n_dirs):
+                rel, pos = _unpack_str(buf, pos)
+                mtime_ns, n = _DIR.unpack_from(buf, pos)
+                pos += _DIR.size
+                end = pos + n * _ENTRY.size
+                stats = _ENTRY.iter_unpack(buf[pos:end])
+                names, pos = _unpack_str(buf, end)
+                if index is None:
+                    continue
+                names = names.split("\0") if n else []
+                dirs[rel] = DirRecord(mtime_ns, [Entry(name, bool(d), size, mtime, inode)
+                                                 for name, (d, size, mtime, inode) in zip(names, stats)])
+                if GITIGNORE in names:
+                    index.ignore.seed(rel, dirs[rel].entries)
+                else:
+                    index.ignore.seed(rel, ())
+            if index is not None:
+                with index.lock:
+                    if not index.dirs:
+                        index.dirs = dirs
+                        index.generation += 1
+                        index.saved_generation = index.generation
+                        loaded.append(index)
+    except (struct.error, UnicodeDecodeError, ValueError):
+        pass
+    return loaded
+
+
+# ========================
+# Shared registry
+# ========================
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(root: str) -> FsIndex:
+    """
+    取得共用的 FsIndex（同一根目錄在所有視窗間共用，ignore 規則來自 get_ignore(root)）
+
+    Args:
+        root: context 根目錄絕對路徑
+
+    Returns:
+        FsIndex（尚未 refresh，呼叫端視需要呼叫 refresh()/ensure()）
+    """
+    key = os.path.normcase(os.path.normpath(os.path.abspath(root)))
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = FsIndex(root)
+        return index
+
+
+def drop_index(root: str) -> None:
+    """移除某根目錄的索引（例如 coped 專案被刪除時）"""
+    norm = os.path.normcase(os.path.normpath(os.path.abspath(root)))
+    with _indexes_lock:
+        _indexes.pop(norm, None)
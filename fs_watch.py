@@ -0,0 +1,245 @@
+"""
+Filesystem Watching for AI Coder Helper
+
+One FsWatcher per FsIndex (shared by every open tree window, reference
+counted through watch() / unwatch()).  Directory events from
+QFileSystemWatcher (inotify / ReadDirectoryChangesW / kqueue) are
+debounced, only the reported directories are re-listed
+(FsIndex.refresh_dirs), and the set of changed directories is emitted so
+models can patch just those rows (ProjectTreeModel.reconcile).
+
+Trees with more than WATCH_LIMIT directories, or when the OS refuses more
+watches, fall back to polling: a periodic FsIndex.refresh() on the global
+QThreadPool, which only re-lists directories whose mtime changed.
+
+Caches keyed by FsIndex.generation (selection counts, see selection_index)
+are invalidated by the same refresh.
+"""
+
+import os
+
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, QTimer, QFileSystemWatcher, pyqtSignal
+
+from ignore import GITIGNORE, CODERIGNORE
+
+# Directories watched natively at most; larger trees are polled
+WATCH_LIMIT = 8192
+
+# Quiet period before a burst of events is applied
+DEBOUNCE_MS = 150
+
+# Interval of the polling fallback
+POLL_INTERVAL_MS = 2000
+
+
+class _PollSignals(QObject):
+    done = pyqtSignal(object)   # changed rel dirs
+
+
+class _PollJob(QRunnable):
+    """One FsIndex.refresh() on a worker thread (polling mode)"""
+
+    def __init__(self, index):
+        super().__init__()
+        self.setAutoDelete(False)   # kept alive by the watcher until done
+        self.index = index
+        self.signals = _PollSignals()
+
+    def run(self):
+        try:
+            changed = self.index.refresh()
+        except OSError:
+            changed = set()
+        self.signals.done.emit(changed)
+
+
+class FsWatcher(QObject):
+    """
+    Watches one FsIndex root and keeps the index in sync.
+
+    Signals:
+        changed(set): relative directories whose listing changed
+    """
+
+    changed = pyqtSignal(object)
+
+    def __init__(self, index, parent=None):
+        super().__init__(parent)
+        self.index = index
+        self.refs = 0
+        self._dirty = set()
+        self._watcher = None
+        self._poll_timer = None
+        self._poll_job = None
+        self._debounce = QTimer(self)
+        self._debounce.setSingleShot(True)
+        self._debounce.setInterval(DEBOUNCE_MS)
+        self._debounce.timeout.connect(self._flush)
+
+    @property
+    def polling(self) -> bool:
+        return self._poll_timer is not None
+
+    # ========================
+    # Start / stop
+    # ========================
+
+    def start(self) -> None:
+        if self._watcher is not None or self._poll_timer is not None:
+            return
+        if len(self.index.dirs) > WATCH_LIMIT or not self._start_native():
+            self._start_polling()
+
+    def stop(self) -> None:
+        self._debounce.stop()
+        self._dirty.clear()
+        if self._watcher is not None:
+            self._watcher.directoryChanged.disconnect()
+            self._watcher.fileChanged.disconnect()
+            self._watcher.deleteLater()
+            self._watcher = None
+        if self._poll_timer is not None:
+            self._poll_timer.stop()
+            self._poll_timer.deleteLater()
+            self._poll_timer = None
+        if self._poll_job is not None:
+            self._poll_job.signals.done.disconnect()
+            self._poll_job = None
+
+    def _start_native(self) -> bool:
+        self._watcher = QFileSystemWatcher(self)
+        self._watcher.directoryChanged.connect(self._on_dir_changed)
+        self._watcher.fileChanged.connect(self._on_file_changed)
+        if not self._add_dirs(list(self.index.dirs)):
+            self.stop()
+            return False
+        return True
+
+    def _start_polling(self) -> None:
+        self._poll_timer = QTimer(self)
+        self._poll_timer.setInterval(POLL_INTERVAL_MS)
+        self._poll_timer.timeout.connect(self._poll)
+        self._poll_timer.start()
+
+    def _add_dirs(self, rels) -> bool:
+        """Watch directories (and their ignore files); False if the OS ran out of watches"""
+        paths = []
+        for rel in rels:
+            path = os.path.join(self.index.root, rel) if rel else self.index.root
+            paths.append(path)
+            # Editing an ignore file does not touch its directory's mtime: watch the file itself
+            for name in (GITIGNORE, CODERIGNORE) if not rel else (GITIGNORE,):
+                if any(e.name == name for e in self.index.listdir(rel)):
+                    paths.append(os.path.join(path, name))
+        watched = set(self._watcher.directories()) | set(self._watcher.files())
+        paths = [p for p in paths if p not in watched]
+        if not paths:
+            return True
+        # Paths that vanished in the meantime are fine; anything else means the watch limit was hit
+        failed = [p for p in self._watcher.addPaths(paths) if os.path.exists(p)]
+        return not failed
+
+    # ========================
+    # Events
+    # ========================
+
+    def _rel(self, path: str):
+        try:
+            rel = os.path.relpath(path, self.index.root)
+        except ValueError:
+            return None
+        if rel.startswith(".."):
+            return None
+        return "" if rel == "." else rel
+
+    def _on_dir_changed(self, path: str) -> None:
+        rel = self._rel(path)
+        if rel is not None:
+            self.touch([rel], immediate=False)
+
+    def _on_file_changed(self, path: str) -> None:
+        rel = self._rel(os.path.dirname(path))
+        if rel is not None:
+            self.touch([rel], immediate=False)
+
+    def touch(self, rels, immediate: bool = True) -> None:
+        """
+        標記目錄為已變動（程式自己修改檔案後呼叫，不必等檔案系統事件）
+
+        Args:
+            rels: 目錄相對路徑
+            immediate: True 表示立即套用，False 表示等 DEBOUNCE_MS 沒有新事件後才套用
+        """
+        self._dirty.update(rels)
+        if immediate:
+            self._flush()
+        else:
+            self._debounce.start()
+
+    def _flush(self) -> None:
+        self._debounce.stop()
+        if not self._dirty:
+            return
+        if not self.index.lock.acquire(blocking=False):
+            # A scan holds the index; try again once it is released
+            self._debounce.start()
+            return
+        try:
+            rels, self._dirty = self._dirty, set()
+            changed = self.index.refresh_dirs(rels)
+        finally:
+            self.index.lock.release()
+        if not changed:
+            return
+        if self._watcher is not None:
+            new = [rel for rel in changed if rel in self.index.dirs]
+            if not self._add_dirs(new):
+                self.stop()
+                self._start_polling()
+        self.changed.emit(changed)
+
+    def _poll(self) -> None:
+        if self._poll_job is not None:
+            return
+        job = self._poll_job = _PollJob(self.index)
+        job.signals.done.connect(self._on_poll_done)
+        QThreadPool.globalInstance().start(job)
+
+    def _on_poll_done(self, changed) -> None:
+        self._poll_job = None
+        if changed:
+            self.changed.emit(changed)
+
+
+# ========================
+# Shared registry
+# ========================
+
+_watchers = {}
+
+
+def watch(index) -> FsWatcher:
+    """
+    取得（並開始）某個 FsIndex 的共用 FsWatcher；每次呼叫都要對應一次 unwatch()
+
+    Args:
+        index: 已掃描過的 fs_index.FsIndex
+
+    Returns:
+        FsWatcher
+    """
+    watcher = _watchers.get(id(index))
+    if watcher is None or watcher.index is not index:
+        watcher = _watchers[id(index)] = FsWatcher(index)
+    watcher.refs += 1
+    watcher.start()
+    return watcher
+
+
+def unwatch(watcher: FsWatcher) -> None:
+    """釋放 watch() 取得的 FsWatcher，沒有人使用時停止監看"""
+    watcher.refs -= 1
+    if watcher.refs <= 0:
+        watcher.stop()
+        if _watchers.get(id(watcher.index)) is watcher:
+            del _watchers[id(watcher.index)]
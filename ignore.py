@@ -0,0 +1,381 @@
+"""
+Ignore Engine for AI Coder Helper
+
+One matcher per context root, used by tree scanning (fs_index), coped
+project copying (shutil.copytree), and prompt generation (selection expand).
+The VS Code extension has the same rules in src/ignoreEngine.ts (syncShadow).
+
+Sources, from lowest to highest precedence:
+
+    DEFAULT_PATTERNS                built in (.git/, __pycache__/, node_modules/, /file/)
+    <root>/.gitignore               \\
+    <root>/sub/.gitignore            > hierarchical, deeper files win
+    <root>/sub/deeper/.gitignore    /
+    <root>/.coderignore             project level, wins over everything
+
+Patterns follow .gitignore syntax (negation "!", directory-only "/",
+anchoring, "*", "?", "[...]", "**").  Consecutive patterns of one file are
+compiled into a single regex per (negate, dir_only) run, and callers prune
+ignored directories before descending, so a parent that is ignored can not
+be re-included by a pattern below it (same as git).
+"""
+
+import os
+import re
+import threading
+
+GITIGNORE = ".gitignore"
+CODERIGNORE = ".coderignore"
+
+DEFAULT_PATTERNS = (
+    ".git/",
+    "__pycache__/",
+    "node_modules/",
+    "/file/",   # coder's own data folder when the project is the coder directory
+)
+
+
+# ========================
+# Pattern compilation
+# ========================
+
+def _glob_to_regex(glob: str) -> str:
+    """將單一 gitignore glob（已去除開頭/結尾的 /）轉為 regex"""
+    out = []
+    i, n = 0, len(glob)
+    while i < n:
+        c = glob[i]
+        if c == "*":
+            if glob.startswith("**", i):
+                j = i + 2
+                if j < n and glob[j] == "/":
+                    out.append("(?:.*/)?")    # "**/" : zero or more directories
+                    i = j + 1
+                else:
+                    out.append(".*")
+                    i = j
+                continue
+            out.append("[^/]*")
+        elif c == "?":
+            out.append("[^/]")
+        elif c == "[":
+            j = i + 1
+            if j < n and glob[j] in "!^":
+                j += 1
+            if j < n and glob[j] == "]":
+                j += 1
+            j = glob.find("]", j)
+            if j < 0:
+                out.append(re.escape(c))
+            else:
+                body = glob[i + 1:j]
+                if body[:1] in ("!", "^"):
+                    body = "^" + body[1:]
+                out.append("[" + body.replace("\\", "\\\\") + "]")
+                i = j + 1
+                continue
+        elif c == "\\" and i + 1 < n:
+            out.append(re.escape(glob[i + 1]))
+            i += 2
+            continue
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return "".join(out)
+
+
+def parse_pattern(line: str):
+    """
+    解析一行 gitignore
+
+    Returns:
+        (regex, negate, dir_only)；空行或註解回傳 None
+    """
+    line = line.rstrip("\r\n")
+    # Trailing spaces are ignored unless escaped
+    stripped = line.rstrip(" ")
+    if stripped.endswith("\\") and len(stripped) < len(line):
+        stripped += " "
+    line = stripped
+    if not line or line.startswith("#"):
+        return None
+    negate = False
+    if line.startswith("!"):
+        negate = True
+        line = line[1:]
+    elif line.startswith("\\!") or line.startswith("\\#"):
+        line = line[1:]
+    dir_only = line.endswith("/")
+    line = line.rstrip("/")
+    if not line:
+        return None
+    anchored = "/" in line
+    regex = _glob_to_regex(line.lstrip("/"))
+    if not anchored:
+        regex = "(?:.*/)?" + regex
+    return regex, negate, dir_only
+
+
+class PatternSet:
+    """
+    Compiled patterns of one ignore file, relative to its directory.
+
+    Args:
+        lines: pattern lines
+        base: directory of the ignore file, relative to the context root ("" for the root)
+    """
+
+    def __init__(self, lines, base: str = ""):
+        self.base = base
+        self.depth = len(base.split("/")) if base else 0
+        runs = []   # [(negate, dir_only, [regex])]
+        for line in lines:
+            parsed = parse_pattern(line)
+            if parsed is None:
+                continue
+            regex, negate, dir_only = parsed
+            if runs and runs[-1][0] == negate and runs[-1][1] == dir_only:
+                runs[-1][2].append(regex)
+            else:
+                runs.append((negate, dir_only, [regex]))
+        # Evaluated last-to-first: the last matching pattern decides
+        self.runs = [(negate, dir_only, re.compile("|".join(f"(?:{r})" for r in regexes)))
+                     for negate, dir_only, regexes in reversed(runs)]
+
+    def __bool__(self):
+        return bool(self.runs)
+
+    def match(self, path: str, is_dir: bool):
+        """
+        Args:
+            path: 相對於 base 的路徑（/ 分隔）
+
+        Returns:
+            True (ignored) / False (re-included by "!") / None (no pattern matched)
+        """
+        for negate, dir_only, regex in self.runs:
+            if dir_only and not is_dir:
+                continue
+            if regex.fullmatch(path):
+                return not negate
+        return None
+
+
+def _read_lines(path: str):
+    try:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            return f.readlines()
+    except OSError:
+        return None
+
+
+def _signature(path: str):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+# ========================
+# Matcher
+# ========================
+
+class IgnoreMatcher:
+    """
+    Hierarchical ignore rules of one context root.
+
+    Ignore files are read lazily, the first time an entry of their
+    directory is queried; callers walk top-down and do not descend into
+    ignored directories.
+    """
+
+    def __init__(self, root: str, defaults=DEFAULT_PATTERNS):
+        self.root = os.path.normpath(root)
+        self.defaults = PatternSet(defaults)
+        self.lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self._sets = {}    # rel_dir -> PatternSet or None (no .gitignore)
+        self._sigs = {}    # rel_dir -> signature of its .gitignore (None if absent)
+        self._chains = {}  # rel_dir -> tuple of PatternSet, highest precedence first
+        path = os.path.join(self.root, CODERIGNORE)
+        self._coder_sig = _signature(path)
+        lines = _read_lines(path) if self._coder_sig is not None else None
+        self.coderignore = PatternSet(lines or ())
+
+    def _dir_set(self, rel_dir: str):
+        pset = self._sets.get(rel_dir, False)
+        if pset is False:
+            path = os.path.join(self.root, rel_dir, GITIGNORE) if rel_dir else os.path.join(self.root, GITIGNORE)
+            sig = _signature(path)
+            lines = _read_lines(path) if sig is not None else None
+            pset = PatternSet(lines, rel_dir.replace(os.sep, "/")) if lines else None
+            self._sets[rel_dir] = pset or None
+            self._sigs[rel_dir] = sig
+        return pset
+
+    def _chain(self, rel_dir: str) -> tuple:
+        chain = self._chains.get(rel_dir)
+        if chain is None:
+            with self.lock:
+                if rel_dir:
+                    parent = os.path.dirname(rel_dir)
+                    parent_chain = self._chain(parent)
+                    # parent_chain = (coderignore, deepest gitignore ..., defaults)
+                    head, rest = parent_chain[:1], parent_chain[1:]
+                else:
+                    head, rest = (self.coderignore,), (self.defaults,)
+                own = self._dir_set(rel_dir)
+                chain = head + ((own,) if own else ()) + rest
+                self._chains[rel_dir] = chain
+        return chain
+
+    def ignored(self, rel: str, is_dir: bool) -> bool:
+        """
+        判斷 context 內的項目是否被忽略（只看最後一段，祖先目錄由呼叫端剪枝）
+
+        Args:
+            rel: 相對於 context 根目錄的路徑（os.sep 或 / 分隔）
+            is_dir: 是否為目錄
+
+        Returns:
+            True if ignored
+        """
+        rel = rel.replace("\\", "/").strip("/")
+        if not rel:
+            return False
+        slash = rel.rfind("/")
+        rel_dir = rel[:slash].replace("/", os.sep) if slash >= 0 else ""
+        for pset in self._chain(rel_dir):
+            if pset.depth:
+                path = rel.split("/", pset.depth)[-1]
+            else:
+                path = rel
+            result = pset.match(path, is_dir)
+            if result is not None:
+                return result
+        return False
+
+    def is_path_ignored(self, rel: str, is_dir: bool) -> bool:
+        """與 ignored() 相同，但也檢查所有祖先目錄（用於單一路徑查詢）"""
+        comps = [c for c in rel.replace("\\", "/").split("/") if c]
+        for i in range(1, len(comps)):
+            if self.ignored("/".join(comps[:i]), True):
+                return True
+        return self.ignored("/".join(comps), is_dir)
+
+    def copytree_ignore(self):
+        """回傳給 shutil.copytree(ignore=...) 使用的函式（路徑須在 root 之下）"""
+        def ignore(path, names):
+            try:
+                rel_dir = os.path.relpath(path, self.root)
+            except ValueError:
+                return []
+            if rel_dir == ".":
+                rel_dir = ""
+            if rel_dir.startswith(".."):
+                return []
+            return [name for name in names
+                    if self.ignored(os.path.join(rel_dir, name) if rel_dir else name,
+                                    os.path.isdir(os.path.join(path, name)))]
+        return ignore
+
+    # ========================
+    # Change detection
+    # ========================
+
+    def reset(self) -> None:
+        """丟棄已編譯的規則（下次查詢時重新讀取 ignore 檔案）"""
+        with self.lock:
+            self._reset()
+
+    @property
+    def coder_signature(self):
+        """.coderignore 的 (mtime_ns, size)，不存在時為 None"""
+        return self._coder_sig
+
+    def seed(self, rel_dir: str, entries) -> None:
+        """
+        以先前保存的目錄內容（fs_index 快照）記錄該目錄 .gitignore 的簽章，
+        讓 changed() / listing_changed() 能偵測快照之後的修改
+
+        Args:
+            rel_dir: 目錄相對路徑
+            entries: 快照中該目錄的 Entry 清單
+        """
+        sig = None
+        for e in entries:
+            if e.name == GITIGNORE and not e.is_dir:
+                sig = (e.mtime_ns, e.size)
+                break
+        with self.lock:
+            self._sigs.setdefault(rel_dir, sig)
+
+    def changed(self) -> bool:
+        """
+        .coderignore 或已讀取過的 .gitignore 是否被修改/刪除（有變動時自動 reset）
+
+        新增的 .gitignore 會改變所在目錄的 mtime，由 listing_changed() 檢查。
+        """
+        with self.lock:
+            stale = _signature(os.path.join(self.root, CODERIGNORE)) != self._coder_sig
+            if not stale:
+                for rel_dir, sig in list(self._sigs.items()):
+                    if sig is None:
+                        continue
+                    path = os.path.join(self.root, rel_dir, GITIGNORE) if rel_dir else os.path.join(self.root, GITIGNORE)
+                    if _signature(path) != sig:
+                        stale = True
+                        break
+            if stale:
+                self._reset()
+            return stale
+
+    def listing_changed(self, rel_dir: str, entries) -> bool:
+        """
+        以重新列出的目錄內容檢查該目錄的 .gitignore 是否與已編譯的版本不同
+
+        Args:
+            rel_dir: 目錄相對路徑
+            entries: 該目錄的 fs_index.Entry 清單（未過濾）
+
+        Returns:
+            True 表示規則已過期（呼叫端應 reset() 並重新掃描）
+        """
+        old = self._sigs.get(rel_dir, False)
+        if old is False:
+            return False   # never consulted, nothing compiled from it
+        sig = None
+        for e in entries:
+            if e.name == GITIGNORE and not e.is_dir:
+                sig = (e.mtime_ns, e.size)
+                break
+        return sig != old
+
+
+# ========================
+# Shared registry
+# ========================
+
+_matchers = {}
+_matchers_lock = threading.Lock()
+
+
+def get_ignore(root: str) -> IgnoreMatcher:
+    """
+    取得共用的 IgnoreMatcher（同一根目錄共用）
+
+    Args:
+        root: context 根目錄絕對路徑
+
+    Returns:
+        IgnoreMatcher
+    """
+    key = os.path.normcase(os.path.normpath(os.path.abspath(root)))
+    with _matchers_lock:
+        matcher = _matchers.get(key)
+        if matcher is None:
+            matcher = _matchers[key] = IgnoreMatcher(root)
+        return matcher
@@ -0,0 +1,377 @@
+"""
+Line Diff for AI Coder Helper (no Qt)
+
+Replaces difflib.SequenceMatcher for the Source -> Coped diff report.
+SequenceMatcher treats frequent lines as junk and is quadratic on large,
+heavily edited files; this module is built for whole files of 10k-100k lines:
+
+    interning       every distinct line becomes a small int, so the
+                    algorithms compare ints instead of strings
+    trimming        the common prefix and suffix are matched before any
+                    algorithm runs (most edits touch a small part of a file)
+    myers           Myers' O((N+M)D) algorithm in linear space: the middle
+                    snake splits the problem in two; past MAX_COST edits the
+                    furthest reaching path is used as the split instead
+    patience        lines unique in both sides, in increasing order on both,
+                    are matched first; the gaps between them use myers
+    histogram       patience first; in gaps without unique lines the least
+                    frequent line (at most MAX_CHAIN occurrences) with the
+                    longest run around it is matched and both sides are split
+                    again; gaps of only frequent lines use myers
+
+opcodes() returns the same (tag, i1, i2, j1, j2) tuples as
+SequenceMatcher.get_opcodes(), so the Replace / Delete / Insert report
+format does not change.
+
+    python line_diff.py [--lines N ...]     benchmark against difflib
+"""
+
+import bisect
+
+ALGORITHMS = ("histogram", "patience", "myers")
+DEFAULT_ALGORITHM = "histogram"
+
+# Edits explored by one Myers step before the furthest reaching path is taken
+MAX_COST = 1024
+
+# Lines occurring more often than this are not used as histogram anchors
+MAX_CHAIN = 64
+
+
+def intern_lines(a, b):
+    """
+    將兩邊的每一行換成整數（相同內容相同整數）
+
+    Returns:
+        (ints_a, ints_b)
+    """
+    table = {}
+    get = table.setdefault
+    ints_a = [get(line, len(table)) for line in a]
+    ints_b = [get(line, len(table)) for line in b]
+    return ints_a, ints_b
+
+
+# ========================
+# Myers (linear space)
+# ========================
+
+def _middle_snake(a, b, a0, a1, b0, b1, max_cost):
+    """
+    Myers bisection of a[a0:a1] / b[b0:b1] (no common prefix or suffix).
+
+    Returns:
+        (x, y)：切割點（相對於 a0 / b0）；None 表示沒有共同的行
+    """
+    n = a1 - a0
+    m = b1 - b0
+    max_d = (n + m + 1) // 2
+    offset = max_d
+    size = 2 * max_d + 2
+    v1 = [-1] * size
+    v2 = [-1] * size
+    v1[offset + 1] = 0
+    v2[offset + 1] = 0
+    delta = n - m
+    front = delta % 2 != 0
+    k1start = k1end = k2start = k2end = 0
+    for d in range(max_d):
+        if d > max_cost:
+            # Too expensive: split where the forward search got furthest
+            best = None
+            for k in range(-d + 1 + k1start, d - k1end, 2):
+                x = v1[offset + k]
+                y = x - k
+                if 0 <= x <= n and 0 <= y <= m and (best is None or x + y > best[0] + best[1]):
+                    best = (x, y)
+            if best is not None and 0 < best[0] + best[1] < n + m:
+                return best
+            return (n // 2, m // 2) if n > 1 or m > 1 else None
+        for k1 in range(-d + k1start, d + 1 - k1end, 2):
+            k1_offset = offset + k1
+            if k1 == -d or (k1 != d and v1[k1_offset - 1] < v1[k1_offset + 1]):
+                x1 = v1[k1_offset + 1]
+            else:
+                x1 = v1[k1_offset - 1] + 1
+            y1 = x1 - k1
+            while x1 < n and y1 < m and a[a0 + x1] == b[b0 + y1]:
+                x1 += 1
+                y1 += 1
+            v1[k1_offset] = x1
+            if x1 > n:
+                k1end += 2
+            elif y1 > m:
+                k1start += 2
+            elif front:
+                k2_offset = offset + delta - k1
+                if 0 <= k2_offset < size and v2[k2_offset] != -1 and x1 >= n - v2[k2_offset]:
+                    return x1, y1
+        for k2 in range(-d + k2start, d + 1 - k2end, 2):
+            k2_offset = offset + k2
+            if k2 == -d or (k2 != d and v2[k2_offset - 1] < v2[k2_offset + 1]):
+                x2 = v2[k2_offset + 1]
+            else:
+                x2 = v2[k2_offset - 1] + 1
+            y2 = x2 - k2
+            while x2 < n and y2 < m and a[a1 - x2 - 1] == b[b1 - y2 - 1]:
+                x2 += 1
+                y2 += 1
+            v2[k2_offset] = x2
+            if x2 > n:
+                k2end += 2
+            elif y2 > m:
+                k2start += 2
+            elif not front:
+                k1_offset = offset + delta - k2
+                if 0 <= k1_offset < size and v1[k1_offset] != -1:
+                    x1 = v1[k1_offset]
+                    y1 = offset + x1 - k1_offset
+                    if x1 >= n - x2:
+                        return x1, y1
+    return None
+
+
+# ========================
+# Anchors (patience / histogram)
+# ========================
+
+def _patience_anchors(a, b, a0, a1, b0, b1):
+    """a / b 兩邊都只出現一次的行，取兩邊順序一致的最長序列：[(i, j)]"""
+    count_a = {}
+    for i in range(a0, a1):
+        line = a[i]
+        count_a[line] = i if line not in count_a else -1
+    count_b = {}
+    for j in range(b0, b1):
+        line = b[j]
+        if count_a.get(line, -1) >= 0:
+            count_b[line] = j if line not in count_b else -1
+    pairs = [(count_a[line], j) for line, j in count_b.items() if j >= 0]
+    if not pairs:
+        return []
+    pairs.sort(key=lambda pair: pair[1])
+    # Longest increasing subsequence of the a positions (patience sorting)
+    tails = []
+    tail_index = []
+    back = [-1] * len(pairs)
+    for index, (i, _) in enumerate(pairs):
+        pile = bisect.bisect_left(tails, i)
+        if pile == len(tails):
+            tails.append(i)
+            tail_index.append(index)
+        else:
+            tails[pile] = i
+            tail_index[pile] = index
+        back[index] = tail_index[pile - 1] if pile else -1
+    anchors = []
+    index = tail_index[-1]
+    while index >= 0:
+        anchors.append(pairs[index])
+        index = back[index]
+    anchors.reverse()
+    return anchors
+
+
+def _histogram_anchor(a, b, a0, a1, b0, b1):
+    """
+    出現次數最少（且最長）的共同片段
+
+    Returns:
+        (i, j, length)；所有共同的行都太常見時回傳 None
+    """
+    positions = {}
+    for i in range(a0, a1):
+        positions.setdefault(a[i], []).append(i)
+    best = None   # (count, -length, i, j, length)
+    j = b0
+    while j < b1:
+        found = positions.get(b[j])
+        next_j = j + 1
+        if found is not None and len(found) <= MAX_CHAIN:
+            count = len(found)
+            for i in found:
+                s_i, s_j = i, j
+                while s_i > a0 and s_j > b0 and a[s_i - 1] == b[s_j - 1]:
+                    s_i -= 1
+                    s_j -= 1
+                e_i, e_j = i + 1, j + 1
+                while e_i < a1 and e_j < b1 and a[e_i] == b[e_j]:
+                    e_i += 1
+                    e_j += 1
+                candidate = (count, s_i - e_i, s_i, s_j, e_i - s_i)
+                if best is None or candidate < best:
+                    best = candidate
+                next_j = max(next_j, e_j)
+        j = next_j
+    return best[2:] if best is not None else None
+
+
+# ========================
+# Driver
+# ========================
+
+def matching_blocks(a, b, algorithm: str = DEFAULT_ALGORITHM, max_cost: int = MAX_COST):
+    """
+    兩個整數序列（intern_lines 的結果）的相同片段
+
+    Args:
+        a / b: 整數序列
+        algorithm: "histogram" / "patience" / "myers"
+        max_cost: Myers 每一步最多探索的編輯數
+
+    Returns:
+        [(i, j, n)]：a[i:i+n] == b[j:j+n]，依序且不重疊；最後一項為 (len(a), len(b), 0)
+        （與 SequenceMatcher.get_matching_blocks 相同）
+    """
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f"unknown diff algorithm: {algorithm}")
+    blocks = []
+    stack = [(0, len(a), 0, len(b), algorithm)]
+    while stack:
+        a0, a1, b0, b1, mode = stack.pop()
+        # Common prefix / suffix
+        start = a0
+        while a0 < a1 and b0 < b1 and a[a0] == b[b0]:
+            a0 += 1
+            b0 += 1
+        if a0 > start:
+            blocks.append((start, b0 - (a0 - start), a0 - start))
+        end = a1
+        while a1 > a0 and b1 > b0 and a[a1 - 1] == b[b1 - 1]:
+            a1 -= 1
+            b1 -= 1
+        if end > a1:
+            blocks.append((a1, b1, end - a1))
+        if a0 == a1 or b0 == b1:
+            continue
+
+        if mode in ("histogram", "patience"):
+            anchors = _patience_anchors(a, b, a0, a1, b0, b1)
+            if anchors:
+                prev_i, prev_j = a0, b0
+                for i, j in anchors:
+                    blocks.append((i, j, 1))
+                    stack.append((prev_i, i, prev_j, j, mode))
+                    prev_i, prev_j = i + 1, j + 1
+                stack.append((prev_i, a1, prev_j, b1, mode))
+                continue
+        if mode == "histogram":
+            anchor = _histogram_anchor(a, b, a0, a1, b0, b1)
+            if anchor is not None:
+                i, j, n = anchor
+                blocks.append((i, j, n))
+                stack.append((a0, i, b0, j, mode))
+                stack.append((i + n, a1, j + n, b1, mode))
+                continue
+
+        split = _middle_snake(a, b, a0, a1, b0, b1, max_cost)
+        if split is None:
+            continue   # nothing in common: one replace
+        x, y = split
+        stack.append((a0, a0 + x, b0, b0 + y, "myers"))
+        stack.append((a0 + x, a1, b0 + y, b1, "myers"))
+
+    # Sorted, adjacent blocks merged (as SequenceMatcher does)
+    blocks.sort()
+    merged = []
+    for i, j, n in blocks:
+        if merged and merged[-1][0] + merged[-1][2] == i and merged[-1][1] + merged[-1][2] == j:
+            merged[-1] = (merged[-1][0], merged[-1][1], merged[-1][2] + n)
+        elif n:
+            merged.append((i, j, n))
+    merged.append((len(a), len(b), 0))
+    return merged
+
+
+def opcodes(a_lines, b_lines, algorithm: str = DEFAULT_ALGORITHM):
+    """
+    a_lines -> b_lines 的編輯步驟
+
+    Args:
+        a_lines / b_lines: 行的清單（readlines() 的結果）
+        algorithm: "histogram" / "patience" / "myers"
+
+    Returns:
+        [(tag, i1, i2, j1, j2)]：tag 為 "equal" / "replace" / "delete" / "insert"
+        （與 SequenceMatcher.get_opcodes 相同）
+    """
+    a, b = intern_lines(a_lines, b_lines)
+    codes = []
+    i = j = 0
+    for ai, bj, size in matching_blocks(a, b, algorithm):
+        if i < ai and j < bj:
+            codes.append(("replace", i, ai, j, bj))
+        elif i < ai:
+            codes.append(("delete", i, ai, j, bj))
+        elif j < bj:
+            codes.append(("insert", i, ai, j, bj))
+        i, j = ai + size, bj + size
+        if size:
+            codes.append(("equal", ai, i, bj, j))
+    return codes
+
+
+# ========================
+# Benchmark
+# ========================
+
+def _bench_files(lines: int, edit_every: int, seed: int = 1):
+    import random
+    rng = random.Random(seed)
+    # Real code repeats lines ("}", "return None", blank lines, common calls): half the
+    # lines come from a vocabulary of a few hundred, each too rare for difflib's junk heuristic
+    common = [f"    statement_{k}()\n" for k in range(300)]
+    a = [rng.choice(common) if rng.random() < 0.5 else f"line {i} value = {rng.randrange(1 << 30)}\n"
+         for i in range(lines)]
+    b = []
+    for i, line in enumerate(a):
+        if edit_every and i % edit_every == 0:
+            roll = rng.random()
+            if roll < 0.4:
+                b.append(f"changed {i}\n")
+                continue
+            if roll < 0.7:
+                continue
+            b.append(f"inserted {i}\n")
+        b.append(line)
+    return a, b
+
+
+def benchmark(sizes=(10000, 30000, 100000), edit_rates=(1000, 20), difflib_limit: float = 60.0):
+    """與 difflib.SequenceMatcher 比較（輸出表格；difflib 太慢時以 "-" 表示跳過）"""
+    import difflib
+    import time
+
+    print(f"{'lines':>8} {'edits':>8} {'difflib':>10} " + " ".join(f"{name:>10}" for name in ALGORITHMS)
+          + f" {'changed lines (difflib / ' + ' / '.join(ALGORITHMS) + ')'}")
+    for lines in sizes:
+        for every in edit_rates:
+            a, b = _bench_files(lines, every)
+            row = [f"{lines:>8,}", f"{'1/' + str(every):>8}"]
+            changed = []
+            # difflib is quadratic on heavily edited files: only run it where it finishes
+            if lines * lines / every <= difflib_limit * 1e6:
+                start = time.perf_counter()
+                codes = difflib.SequenceMatcher(None, a, b).get_opcodes()
+                row.append(f"{time.perf_counter() - start:>9.2f}s")
+                changed.append(sum(i2 - i1 + j2 - j1 for tag, i1, i2, j1, j2 in codes if tag != "equal"))
+            else:
+                row.append(f"{'-':>10}")
+                changed.append("-")
+            for name in ALGORITHMS:
+                start = time.perf_counter()
+                codes = opcodes(a, b, name)
+                row.append(f"{time.perf_counter() - start:>9.2f}s")
+                changed.append(sum(i2 - i1 + j2 - j1 for tag, i1, i2, j1, j2 in codes if tag != "equal"))
+            print(" ".join(row) + "  " + " / ".join(map(str, changed)))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="benchmark line_diff against difflib")
+    parser.add_argument("--lines", type=int, nargs="+", default=[10000, 30000, 100000])
+    parser.add_argument("--every", type=int, nargs="+", default=[1000, 20],
+                        help="one edit every N lines (small N: heavily edited)")
+    args = parser.parse_args()
+    benchmark(args.lines, args.every)
@@ -1,34 +1,54 @@
 import sys
 import os
+
+if __name__ == "__main__" and len(sys.argv) > 1:
+    # Headless commands (generate / diff / sync / history / status) never load Qt, see cli.py
+    from cli import main as cli_main
+    sys.exit(cli_main(sys.argv[1:]))
+
 import shutil
 import json
 import datetime
 import filecmp
 import subprocess
 from PyQt6.QtWidgets import (
-    QApplication, QWidget, QTreeWidget, QTreeWidgetItem, QPushButton,
+    QApplication, QWidget, QTreeView, QPushButton,
     QLabel, QVBoxLayout, QHBoxLayout, QMessageBox, QTextEdit, QInputDialog, QCheckBox,
-    QFileDialog, QTreeWidgetItemIterator
+    QFileDialog, QComboBox, QLineEdit, QSpinBox
 )
-from PyQt6.QtCore import Qt
-
-# Use script directory for consistent data.json path
+from PyQt6.QtCore import Qt, QThreadPool
+from project_store import get_store
+from selection import (
+    dir_rule, file_rule, rebase_rules, compact_selection, ROOT_RULE
+)
+from selection_index import get_selection_index
+from fs_index import get_index, drop_index, load_snapshot, save_snapshot, SNAPSHOT_NAME
+from ignore import get_ignore
+from chat_writer import CHAT_NAME, DEFAULT_WORKERS
+from prompt_builder import resolve_contexts, build_sections
+from shadow_sync import sync_to_origin
+from chat_job import GenerateJob
+from token_budget import MODEL_WINDOWS, budget_for
+from file_sniff import project_limits
+from chat_split import split_chat, part_paths
+from compact import Compactor
+from repo_map import get_repo_map, DEFAULT_MAP_TOKENS
+from prompt_history import get_history, HISTORY_DIR_NAME, HISTORY_LIMIT
+from line_diff import opcodes as diff_opcodes
+from block_cache import get_block_cache, CACHE_DIR_NAME
+from tree_model import ProjectTreeModel, ScanProgressLabel
+
+# Use script directory for consistent file/ path
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
-DATA_JSON = os.path.join(SCRIPT_DIR, "file", "data.json")
 
 # ------------------------
-# Data IO
+# Data IO (file/data.db, see project_store.py)
 # ------------------------
 def load_data():
-    if not os.path.exists(DATA_JSON):
-        return {}
-    with open(DATA_JSON, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return get_store().load_data()
 
 def save_data(data):
-    os.makedirs(os.path.dirname(DATA_JSON), exist_ok=True)
-    with open(DATA_JSON, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    get_store().save_data(data)
 
 # ------------------------
 # Control Selected Files
@@ -42,29 +62,7 @@ class ConsoleWindow(QWidget):
         self.project_name = project_name
         self.project_path = project_path
         self.data = data
-        # Load selected_files from all sections (origin + coped)
-        self.selected_files = set()
-        
-        # Load from origin
-        origin_files = self.data["projects"][self.project_name].get("origin", {}).get("selected_files", [])
-        for f in origin_files:
-            if os.path.isabs(f):
-                self.selected_files.add(os.path.normpath(f))
-            else:
-                self.selected_files.add(os.path.normpath(os.path.join(self.project_path, f)))
-        
-        # Load from all coped projects
-        coped_dict = self.data["projects"][self.project_name].get("coped", {})
-        file_dir = os.path.join(SCRIPT_DIR, "file", self.project_name)
-        for coped_name, coped_data in coped_dict.items():
-            coped_path = os.path.join(file_dir, coped_name)
-            for f in coped_data.get("selected_files", []):
-                if os.path.isabs(f):
-                    self.selected_files.add(os.path.normpath(f))
-                else:
-                    self.selected_files.add(os.path.normpath(os.path.join(coped_path, f)))
-        
-        self.updating = False
+        self.file_dir = os.path.join(SCRIPT_DIR, "file", self.project_name)
 
         self.setWindowTitle("Console - Manage Project & Files")
         self.resize(700, 500)
@@ -76,10 +74,13 @@ class ConsoleWindow(QWidget):
         # Head
         layout.addWidget(QLabel(f"Project: {self.project_name}\nPath: {self.project_path}"))
 
-        # Tree
-        self.tree = QTreeWidget()
-        self.tree.setHeaderLabel("Project Structure")
+        # Tree (checkbox changes propagate inside the model, see tree_model.py)
+        self.model = ProjectTreeModel("Project Structure", checkable=True, propagate=True)
+        self.tree = QTreeView()
+        self.tree.setUniformRowHeights(True)
+        self.tree.setModel(self.model)
         layout.addWidget(self.tree)
+        layout.addWidget(ScanProgressLabel(self.model))
         
         # Action Buttons
         btn_layout = QHBoxLayout()
@@ -99,26 +100,33 @@ class ConsoleWindow(QWidget):
         self.btn_cancel.clicked.connect(self.close)
         self.btn_add.clicked.connect(self.add_coped_project)
         self.btn_delete.clicked.connect(self.delete_coped_project)
+        # Unexpanded directories are saved from the counts, so wait for the scan
+        self.model.scan_finished.connect(lambda: self.btn_apply.setEnabled(True))
+        self.model.scan_finished.connect(self.save_scan_snapshot)
         self.setLayout(layout)
 
+    def closeEvent(self, event):
+        self.model.shutdown()
+        super().closeEvent(event)
+
+    def save_scan_snapshot(self):
+        # Next window (or next run) starts from this listing; skipped if nothing changed
+        if os.path.isdir(self.file_dir):
+            save_snapshot(os.path.join(self.file_dir, SNAPSHOT_NAME),
+                          [index for _, index, _, _ in self.model.roots.values()])
+
     def build_tree(self):
-        self.tree.clear()
+        self.model.clear()
+        # Selection state of all sections (origin + coped), shared with the other windows
+        self.selection = get_selection_index(self.project_name)
+        # Warm start: indexes not in memory yet are filled from the last snapshot, then reconciled in the background
+        load_snapshot(os.path.join(self.file_dir, SNAPSHOT_NAME))
         
         # Root 0: None (Option for Empty Creation)
-        self.none_root = QTreeWidgetItem(["None (Create Empty Project)"])
-        self.none_root.setData(0, Qt.ItemDataRole.UserRole, "NONE_ROOT")
-        self.tree.addTopLevelItem(self.none_root)
+        self.none_root = self.model.add_root("None (Create Empty Project)", tag="NONE_ROOT", checkable=False)
 
         # Root 1: Origin Project
-        self.origin_root = QTreeWidgetItem([f"[Origin] {self.project_name}"])
-        self.origin_root.setData(0, Qt.ItemDataRole.UserRole, "ORIGIN_ROOT")
-        self.origin_root.setFlags(self.origin_root.flags() | Qt.ItemFlag.ItemIsUserCheckable)
-        self.origin_root.setCheckState(0, Qt.CheckState.Unchecked)
-        self.tree.addTopLevelItem(self.origin_root)
-        
-        if os.path.exists(self.project_path):
-            self.add_items(self.origin_root, self.project_path)
-            self.update_parent_state(self.origin_root)  # Update checkbox based on children
+        self.origin_root = self.add_root(f"[Origin] {self.project_name}", self.project_path, tag="ORIGIN_ROOT")
             
         # Root 2+: Coped Projects (Scan 'file/{project_name}/' directory)
         file_dir = os.path.join(SCRIPT_DIR, "file", self.project_name)
@@ -135,237 +143,91 @@ class ConsoleWindow(QWidget):
         for d in subdirs:
             if d == "__pycache__": continue
             if d.lower() == "shadow": continue # Hide Shadow Layer from UI
+            if d == CACHE_DIR_NAME: continue # Prompt block cache, not a project
+            if d == HISTORY_DIR_NAME: continue # Prompt history, not a project
             
             full_path = os.path.join(file_dir, d)
             # Display name
             display_name = f"[Coped] {d}"
-            
-            coped_root = QTreeWidgetItem([display_name])
-            coped_root.setData(0, Qt.ItemDataRole.UserRole, full_path)
-            coped_root.setFlags(coped_root.flags() | Qt.ItemFlag.ItemIsUserCheckable)
-            coped_root.setCheckState(0, Qt.CheckState.Unchecked)
-            self.tree.addTopLevelItem(coped_root)
-            
-            self.add_items(coped_root, full_path, is_shadow=True)
-            self.update_parent_state(coped_root)  # Update checkbox based on children
-            coped_root.setExpanded(False) # Start collapsed
-            
-        self.origin_root.setExpanded(False) # Start collapsed
-        self.tree.itemChanged.connect(self.handle_item_changed)
-
-    def add_items(self, parent_widget, path, is_shadow=False):
-        # Flatten directory similar to original but attached to parent_widget
-        if os.path.isdir(path):
-            for f in sorted(os.listdir(path)):
-                if f in [".git", "__pycache__", "file"]: continue
-                self.add_node_recursive(parent_widget, os.path.join(path, f), is_shadow)
-
-    def add_node_recursive(self, parent_item, full_path, is_shadow):
-        name = os.path.basename(full_path)
-        item = QTreeWidgetItem([name])
-        item.setData(0, Qt.ItemDataRole.UserRole, full_path)
-        # Enable checkable items (our custom update_parent_state handles tri-state)
-        item.setFlags(item.flags() | Qt.ItemFlag.ItemIsUserCheckable)
-        
-        # Set initial check state based on selected_files
-        norm_path = os.path.normpath(full_path)
-        if norm_path in self.selected_files:
-            item.setCheckState(0, Qt.CheckState.Checked)
-        else:
-            item.setCheckState(0, Qt.CheckState.Unchecked)
+            self.add_root(display_name, full_path) # Start collapsed
 
-        parent_item.addChild(item)
+        self.btn_apply.setEnabled(not self.model.is_scanning())
 
-        if os.path.isdir(full_path):
-            for f in sorted(os.listdir(full_path)):
-                if f in [".git", "__pycache__", "file"]: continue
-                self.add_node_recursive(item, os.path.join(full_path, f), is_shadow)
-            # After adding children, update this item's check state based on children
-            self.update_parent_state(item)
-
-    def handle_item_changed(self, item, column):
-        if self.updating: return
-        self.updating = True
-        try:
-             # Basic check propagation
-            state = item.checkState(0)
-            self.update_children(item, state)
-            self.update_parent(item)
-        finally:
-            self.updating = False
-
-    def update_children(self, item, state):
-        for i in range(item.childCount()):
-            child = item.child(i)
-            # Only propagate if checkable
-            if child.flags() & Qt.ItemFlag.ItemIsUserCheckable:
-                child.setCheckState(0, state)
-                self.update_children(child, state)
-
-    def update_parent(self, item):
-        parent = item.parent()
-        if not parent: return
-        self.update_parent_state(parent)
-        # Recursively update grandparents
-        self.update_parent(parent)
-
-    def update_parent_state(self, parent):
-        """Update parent checkbox to reflect children's states (tri-state logic)"""
-        if parent.childCount() == 0:
-            return
-        
-        checked_count = 0
-        unchecked_count = 0
-        partial_count = 0
-        
-        for i in range(parent.childCount()):
-            child = parent.child(i)
-            if child.flags() & Qt.ItemFlag.ItemIsUserCheckable:
-                state = child.checkState(0)
-                if state == Qt.CheckState.Checked:
-                    checked_count += 1
-                elif state == Qt.CheckState.Unchecked:
-                    unchecked_count += 1
-                else:  # PartiallyChecked
-                    partial_count += 1
-        
-        total = checked_count + unchecked_count + partial_count
-        if total == 0:
-            return
-        
-        # Check if parent is checkable (root items may not be)
-        if not (parent.flags() & Qt.ItemFlag.ItemIsUserCheckable):
-            return
-            
-        # Determine parent state
-        if checked_count == total:
-            parent.setCheckState(0, Qt.CheckState.Checked)
-        elif unchecked_count == total:
-            parent.setCheckState(0, Qt.CheckState.Unchecked)
-        else:
-            parent.setCheckState(0, Qt.CheckState.PartiallyChecked)
-
-    def collect_checked_files(self, parent_item):
-        path = parent_item.data(0, Qt.ItemDataRole.UserRole)
-        # Skip roots
-        if path in ["ORIGIN_ROOT", "SHADOW_ROOT", "NONE_ROOT"]: 
-            pass
-        elif os.path.isfile(path):
-             if parent_item.checkState(0) == Qt.CheckState.Checked and (parent_item.flags() & Qt.ItemFlag.ItemIsUserCheckable):
-                 # Store path relative to project_path for portability
-                 abs_path = os.path.abspath(path)
-                 try:
-                     rel_path = os.path.relpath(abs_path, self.project_path)
-                     # If relative path goes outside project (starts with ..), use absolute
-                     if not rel_path.startswith('..'):
-                         self.selected_files.add(rel_path)
-                         print(f"[ConsoleWindow] Added checked file (relative): {rel_path}")
-                     else:
-                         self.selected_files.add(abs_path)
-                         print(f"[ConsoleWindow] Added checked file (absolute): {abs_path}")
-                 except ValueError:
-                     # Different drives on Windows, use absolute
-                     self.selected_files.add(abs_path)
-                     print(f"[ConsoleWindow] Added checked file (absolute-drive): {abs_path}")
-             
-        for i in range(parent_item.childCount()):
-            self.collect_checked_files(parent_item.child(i))
+    def add_root(self, label, path, tag=None, row=None):
+        # Roots are populated lazily; the index and aggregated selection counts are built in the background
+        if not os.path.isdir(path):
+            return self.model.add_root(label, tag=tag, row=row)
+        root = os.path.normpath(path)
+        index = get_index(root)
+        rules = self.selection.rules_for_root(root)
+        return self.model.add_root(label, root, tag=tag, index=index, rules=rules, scan=True,
+                                   counts_fn=lambda idx: self.selection.counts(root, idx), row=row)
 
     def apply_changes(self):
-        # Collect checked files categorized by section
-        self.origin_selected = set()
-        self.coped_selected = {}  # coped_name -> set of files
+        # Collect selection rules categorized by section: a fully checked
+        # directory becomes one "dir/" rule instead of one entry per file
+        self.origin_selected = []
+        self.coped_selected = {}  # coped_name -> list of rules
         
         # Initialize coped_selected keys
-        file_dir = os.path.join(SCRIPT_DIR, "file", self.project_name)
         coped_dict = self.data["projects"][self.project_name].get("coped", {})
         for coped_name in coped_dict.keys():
-            self.coped_selected[coped_name] = set()
+            self.coped_selected[coped_name] = []
         
         # Scan ALL top-level items
-        root_count = self.tree.topLevelItemCount()
-        print(f"[ConsoleWindow] Scanning {root_count} roots for selection...")
-        for i in range(root_count):
-            root = self.tree.topLevelItem(i)
-            root_path = root.data(0, Qt.ItemDataRole.UserRole)
-            print(f"[ConsoleWindow] Scanning Root: {root.text(0)} - Path: {root_path}")
-            self.collect_checked_files_by_section(root, root_path)
+        roots = self.model.children()
+        print(f"[ConsoleWindow] Scanning {len(roots)} roots for selection...")
+        for root in roots:
+            root_path = self.model.node_path(root)
+            if root_path == "NONE_ROOT":
+                continue
+            if root_path == "ORIGIN_ROOT":
+                rules = self.origin_selected
+                section_root = self.project_path
+            else:
+                rules = self.coped_selected.setdefault(os.path.basename(root_path), [])
+                section_root = root_path
+            print(f"[ConsoleWindow] Scanning Root: {self.model.node_name(root)} - Path: {section_root}")
+            if self.model.check_state(root) == Qt.CheckState.Checked:
+                rules.append(ROOT_RULE)
+            else:
+                self.collect_checked_rules(root, rules)
         
         # Save to respective sections
-        # Origin
-        origin_list = []
-        for f in self.origin_selected:
-            try:
-                rel = os.path.relpath(f, self.project_path)
-                if not rel.startswith('..'):
-                    origin_list.append(rel)
-                else:
-                    origin_list.append(f)
-            except ValueError:
-                origin_list.append(f)
+        store = get_store()
+        proj = self.data["projects"][self.project_name]
+        proj.setdefault("origin", {})["selected_files"] = self.origin_selected
+        store.set_selected_files(self.project_name, "origin", self.origin_selected)
         
-        if "origin" not in self.data["projects"][self.project_name]:
-            self.data["projects"][self.project_name]["origin"] = {}
-        self.data["projects"][self.project_name]["origin"]["selected_files"] = origin_list
-        
-        # Coped projects
-        if "coped" not in self.data["projects"][self.project_name]:
-            self.data["projects"][self.project_name]["coped"] = {}
-        
-        for coped_name, files in self.coped_selected.items():
-            coped_path = os.path.join(file_dir, coped_name)
-            coped_list = []
-            for f in files:
-                try:
-                    rel = os.path.relpath(f, coped_path)
-                    if not rel.startswith('..'):
-                        coped_list.append(rel)
-                    else:
-                        coped_list.append(f)
-                except ValueError:
-                    coped_list.append(f)
-            
-            if coped_name not in self.data["projects"][self.project_name]["coped"]:
-                self.data["projects"][self.project_name]["coped"][coped_name] = {}
-            self.data["projects"][self.project_name]["coped"][coped_name]["selected_files"] = coped_list
+        proj.setdefault("coped", {})
+        for coped_name, rules in self.coped_selected.items():
+            proj["coped"].setdefault(coped_name, {})["selected_files"] = rules
+            store.set_selected_files(self.project_name, coped_name, rules)
         
         total = len(self.origin_selected) + sum(len(v) for v in self.coped_selected.values())
-        print(f"[ConsoleWindow] Saving {total} selected files across sections.")
-        save_data(self.data)
+        print(f"[ConsoleWindow] Saved {total} selection rules across sections.")
         self.close()
     
-    def collect_checked_files_by_section(self, parent_item, root_path):
-        """Collect checked files and categorize them by section (origin or coped)"""
-        path = parent_item.data(0, Qt.ItemDataRole.UserRole)
-        file_dir = os.path.join(SCRIPT_DIR, "file", self.project_name)
-        
-        if path in ["ORIGIN_ROOT", "SHADOW_ROOT", "NONE_ROOT"]:
-            pass
-        elif os.path.isfile(path):
-            if parent_item.checkState(0) == Qt.CheckState.Checked and (parent_item.flags() & Qt.ItemFlag.ItemIsUserCheckable):
-                abs_path = os.path.abspath(path)
-                
-                # Determine which section this file belongs to
-                if abs_path.startswith(os.path.abspath(file_dir)):
-                    # It's in a coped project
-                    rel_from_file = os.path.relpath(abs_path, file_dir)
-                    parts = rel_from_file.split(os.sep)
-                    if len(parts) >= 1:
-                        coped_name = parts[0]
-                        if coped_name in self.coped_selected:
-                            self.coped_selected[coped_name].add(abs_path)
-                            print(f"[ConsoleWindow] Added to coped '{coped_name}': {abs_path}")
-                        else:
-                            # New coped project not in data yet, add it
-                            self.coped_selected[coped_name] = {abs_path}
-                            print(f"[ConsoleWindow] Added to NEW coped '{coped_name}': {abs_path}")
-                else:
-                    # It's in origin
-                    self.origin_selected.add(abs_path)
-                    print(f"[ConsoleWindow] Added to origin: {abs_path}")
-        
-        for i in range(parent_item.childCount()):
-            self.collect_checked_files_by_section(parent_item.child(i), root_path)
+    def collect_checked_rules(self, node, rules):
+        """Emit the shallowest fully-checked nodes under node as rules"""
+        model = self.model
+        if model.check_state(node) == Qt.CheckState.Unchecked:
+            return
+        if not model.is_loaded(node):
+            # Never expanded, so its subtree still matches the saved selection
+            root, rel = model.node_rel(node)
+            _, index, section_rules, counts = model.roots[root]
+            rules.extend(compact_selection(index, counts, section_rules, rel))
+            return
+        for child in model.children(node):
+            if not model.is_checkable(child):
+                continue
+            state = model.check_state(child)
+            if state == Qt.CheckState.Checked:
+                _, rel = model.node_rel(child)
+                rules.append(dir_rule(rel) if model.is_dir(child) else file_rule(rel))
+            elif state == Qt.CheckState.PartiallyChecked:
+                self.collect_checked_rules(child, rules)
 
     def add_coped_project(self):
         # Determine Source
@@ -373,16 +235,17 @@ class ConsoleWindow(QWidget):
         source_name = "Origin"
         is_empty_create = False
         
-        item = self.tree.currentItem()
-        if item:
-            path = item.data(0, Qt.ItemDataRole.UserRole)
+        current = self.tree.currentIndex()
+        if current.isValid():
+            node = self.model.node_of(current)
+            path = self.model.node_path(node)
             if path == "NONE_ROOT":
                 is_empty_create = True
                 source_name = "None (Empty)"
             elif path and os.path.isdir(path) and path != "ORIGIN_ROOT":
                 # Ensure we are not copying "file/" itself or something weird
                 source_path = path
-                source_name = item.text(0)
+                source_name = self.model.node_name(node)
             # If ORIGIN_ROOT or others, default to Origin
 
         promp_title = f"Create New Project from '{source_name}':"
@@ -423,15 +286,13 @@ class ConsoleWindow(QWidget):
                     # Copy ALL files from source to new_path
                     import shutil
                     
-                    # Ignore function to skip .git, file/, __pycache__
-                    def ignore_patterns(path, names):
-                        ignored = []
-                        if ".git" in names: ignored.append(".git")
-                        if "__pycache__" in names: ignored.append("__pycache__")
-                        # If we are copying Origin, 'file' is in it. We MUST ignore 'file' to avoid recursion/duplication
-                        if "file" in names and os.path.abspath(path) == os.path.abspath(self.project_path):
-                            ignored.append("file")
-                        return ignored
+                    # Same ignore rules as the tree (.gitignore / .coderignore of the source context;
+                    # the default "/file/" pattern keeps coder's own data folder out of the copy)
+                    ignore_root = self.project_path
+                    abs_source = os.path.abspath(source_path)
+                    if abs_source.startswith(os.path.abspath(self.file_dir) + os.sep):
+                        ignore_root = os.path.join(self.file_dir, os.path.relpath(abs_source, self.file_dir).split(os.sep)[0])
+                    ignore_patterns = get_ignore(ignore_root).copytree_ignore()
 
                     shutil.copytree(source_path, new_path, ignore=ignore_patterns, dirs_exist_ok=True) # dirs_exist_ok because we makedirs above
 
@@ -441,37 +302,23 @@ class ConsoleWindow(QWidget):
                     self.data["projects"][self.project_name]["coped"][safe_name] = {"selected_files": []}
                     
                     # Inherit Selection State from source section
-                    source_selected = []
-                    if os.path.abspath(source_path) == os.path.abspath(self.project_path):
-                        # Source is Origin
-                        source_selected = self.data["projects"][self.project_name].get("origin", {}).get("selected_files", [])
-                    else:
-                        # Source is another coped project
-                        source_coped_name = os.path.basename(source_path)
-                        source_selected = self.data["projects"][self.project_name].get("coped", {}).get(source_coped_name, {}).get("selected_files", [])
-                    
-                    # Map selected files to new coped project
-                    new_selected = []
                     abs_source = os.path.abspath(source_path)
+                    file_dir_abs = os.path.abspath(self.file_dir)
+                    if abs_source.startswith(file_dir_abs + os.sep):
+                        # Source is (a folder inside) another coped project
+                        source_coped_name = os.path.relpath(abs_source, file_dir_abs).split(os.sep)[0]
+                        section_root = os.path.join(file_dir_abs, source_coped_name)
+                        source_selected = self.data["projects"][self.project_name].get("coped", {}).get(source_coped_name, {}).get("selected_files", [])
+                    else:
+                        # Source is (a folder inside) Origin
+                        section_root = os.path.abspath(self.project_path)
+                        source_selected = self.data["projects"][self.project_name].get("origin", {}).get("selected_files", [])
                     
-                    for rel_path in source_selected:
-                        if os.path.isabs(rel_path):
-                            if rel_path.startswith(abs_source):
-                                inner_rel = os.path.relpath(rel_path, abs_source)
-                                new_file_path = os.path.join(new_path, inner_rel)
-                                if os.path.exists(new_file_path):
-                                    new_selected.append(inner_rel)
-                        else:
-                            new_file_path = os.path.join(new_path, rel_path)
-                            if os.path.exists(new_file_path):
-                                new_selected.append(rel_path)
+                    # Map selection rules to new coped project (re-rooted at the copied folder)
+                    new_selected = rebase_rules(source_selected, os.path.relpath(abs_source, section_root))
                     
                     self.data["projects"][self.project_name]["coped"][safe_name]["selected_files"] = new_selected
-                    save_data(self.data)
-                    
-                    # Update local set
-                    for rel in new_selected:
-                        self.selected_files.add(os.path.normpath(os.path.join(new_path, rel)))
+                    get_store().add_context(self.project_name, safe_name, new_selected)
 
                     QMessageBox.information(self, "Success", f"Created '{safe_name}' from '{source_name}'.\nCopied {len(new_selected)} selections.")
                 else:
@@ -479,22 +326,37 @@ class ConsoleWindow(QWidget):
                     if "coped" not in self.data["projects"][self.project_name]:
                         self.data["projects"][self.project_name]["coped"] = {}
                     self.data["projects"][self.project_name]["coped"][safe_name] = {"selected_files": []}
-                    save_data(self.data)
+                    get_store().add_context(self.project_name, safe_name)
                     QMessageBox.information(self, "Success", f"Created empty project '{safe_name}'.")
 
-                self.build_tree()
+                self.add_coped_root(safe_name, new_path)
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"Failed to create project: {e}")
 
+    def add_coped_root(self, name, path):
+        # Only the new subtree is scanned; the other roots keep their rows and expansion
+        self.selection = get_selection_index(self.project_name)
+        label = f"[Coped] {name}"
+        roots = self.model.children()
+        row = len(roots)
+        for i, node in enumerate(roots):
+            text = self.model.node_name(node)
+            if text.startswith("[Coped] ") and text > label:
+                row = i
+                break
+        self.add_root(label, path, row=row)
+        self.btn_apply.setEnabled(not self.model.is_scanning())
+
     def delete_coped_project(self):
-        item = self.tree.currentItem()
-        if not item:
+        current = self.tree.currentIndex()
+        if not current.isValid():
             QMessageBox.information(self, "Info", "Please select the project root to delete.")
             return
 
         # Check if it is a Coped Project Root
-        # We set UserRole to the full path of the root
-        path = item.data(0, Qt.ItemDataRole.UserRole)
+        # The model returns the full path of the root
+        node = self.model.node_of(current)
+        path = self.model.node_path(node)
         # Verify it's in 'file/' and is a directory
         
         # Simple check: Is it a child of "Coped Projects" (wait, ConsoleWindow has separate roots)
@@ -520,8 +382,15 @@ class ConsoleWindow(QWidget):
                 try:
                     import shutil
                     shutil.rmtree(path)
+                    drop_index(path)
+                    self.data["projects"][self.project_name].get("coped", {}).pop(project_name, None)
+                    get_store().delete_context(self.project_name, project_name)
+                    # Only the deleted root's rows go away
+                    if node in self.model.roots:
+                        self.model.remove_root(node)
+                    else:
+                        self.build_tree()
                     QMessageBox.information(self, "Deleted", f"Project '{project_name}' deleted.")
-                    self.build_tree()
                 except Exception as e:
                     QMessageBox.critical(self, "Error", f"Failed to delete: {e}")
         else:
@@ -545,9 +414,14 @@ class ShadowManagerWindow(QWidget):
         layout = QHBoxLayout()
         
         # Left: Tree
-        self.tree = QTreeWidget()
-        self.tree.setHeaderLabel("Shadow Layer Files")
-        layout.addWidget(self.tree)
+        self.model = ProjectTreeModel("Shadow Layer Files")
+        self.tree = QTreeView()
+        self.tree.setUniformRowHeights(True)
+        self.tree.setModel(self.model)
+        tree_layout = QVBoxLayout()
+        tree_layout.addWidget(self.tree)
+        tree_layout.addWidget(ScanProgressLabel(self.model))
+        layout.addLayout(tree_layout)
         
         # Right: Buttons
         btn_layout = QVBoxLayout()
@@ -578,24 +452,14 @@ class ShadowManagerWindow(QWidget):
         self.sync_win.show()
 
     def build_tree(self):
-        self.tree.clear()
+        self.model.clear()
         if os.path.exists(self.shadow_root):
-            self.add_items(self.tree, self.shadow_root)
+            index = get_index(self.shadow_root)
+            self.model.add_root(os.path.basename(index.root), index.root, index=index, scan=True)
 
-    def add_items(self, parent_widget, path):
-        name = os.path.basename(path)
-        item = QTreeWidgetItem([name])
-        item.setData(0, Qt.ItemDataRole.UserRole, path)
-        
-        if isinstance(parent_widget, QTreeWidget):
-            parent_widget.addTopLevelItem(item)
-        else:
-            parent_widget.addChild(item)
-
-        if os.path.isdir(path):
-            files = sorted(os.listdir(path))
-            for f in files:
-                self.add_items(item, os.path.join(path, f))
+    def closeEvent(self, event):
+        self.model.shutdown()
+        super().closeEvent(event)
 
     def launch_vscode(self):
         self.close()
@@ -614,23 +478,30 @@ class ShadowManagerWindow(QWidget):
                 dest = os.path.join(self.shadow_root, rel)
                 os.makedirs(os.path.dirname(dest), exist_ok=True)
                 shutil.copy2(fname, dest)
-                self.build_tree()
+                self.refresh_path(dest)
             except Exception as e:
                 QMessageBox.critical(self, "Error", str(e))
 
     def delete_files(self):
-        item = self.tree.currentItem()
-        if not item: return
-        path = item.data(0, Qt.ItemDataRole.UserRole)
+        current = self.tree.currentIndex()
+        if not current.isValid(): return
+        path = self.model.node_path(self.model.node_of(current))
         try:
             if os.path.isfile(path):
                 os.remove(path)
             elif os.path.isdir(path):
                 shutil.rmtree(path)
-            self.build_tree()
+            self.refresh_path(path)
         except Exception as e:
             QMessageBox.critical(self, "Error", str(e))
 
+    def refresh_path(self, path):
+        # Only the directories containing path are re-listed (the watcher would catch it a moment later)
+        if self.model.roots:
+            self.model.notify_changed(path)
+        else:
+            self.build_tree()
+
 
 # ------------------------
 # Sync Window (Save Shadow to Origin)
@@ -650,9 +521,14 @@ class SyncWindow(QWidget):
         layout = QHBoxLayout()
         
         # Left: Tree
-        self.tree = QTreeWidget()
-        self.tree.setHeaderLabel("Select Files to Sync")
-        layout.addWidget(self.tree)
+        self.model = ProjectTreeModel("Select Files to Sync", checkable=True) # Default unchecked for safety
+        self.tree = QTreeView()
+        self.tree.setUniformRowHeights(True)
+        self.tree.setModel(self.model)
+        tree_layout = QVBoxLayout()
+        tree_layout.addWidget(self.tree)
+        tree_layout.addWidget(ScanProgressLabel(self.model))
+        layout.addLayout(tree_layout)
         
         # Right: Buttons
         btn_layout = QVBoxLayout()
@@ -667,42 +543,26 @@ class SyncWindow(QWidget):
         self.btn_choose.clicked.connect(self.sync_files)
 
     def build_tree(self):
-        self.tree.clear()
+        self.model.clear()
         if os.path.exists(self.shadow_root):
-            self.add_items(self.tree, self.shadow_root)
-
-    def add_items(self, parent_widget, path):
-        name = os.path.basename(path)
-        item = QTreeWidgetItem([name])
-        item.setData(0, Qt.ItemDataRole.UserRole, path)
-        item.setCheckState(0, Qt.CheckState.Unchecked) # Default unchecked for safety? Or checked? User didn't specify.
-        
-        if isinstance(parent_widget, QTreeWidget):
-            parent_widget.addTopLevelItem(item)
-        else:
-            parent_widget.addChild(item)
+            index = get_index(self.shadow_root)
+            self.model.add_root(os.path.basename(index.root), index.root, index=index, scan=True)
 
-        if os.path.isdir(path):
-            files = sorted(os.listdir(path))
-            for f in files:
-                self.add_items(item, os.path.join(path, f))
+    def closeEvent(self, event):
+        self.model.shutdown()
+        super().closeEvent(event)
     
     def sync_files(self):
-        count = 0
         try:
             # Iterate tree to find checked items
-            iterator = QTreeWidgetItemIterator(self.tree)
-            while iterator.value():
-                item = iterator.value()
-                if item.checkState(0) == Qt.CheckState.Checked:
-                    shadow_path = item.data(0, Qt.ItemDataRole.UserRole)
+            rels = []
+            for node in self.model.iter_loaded():
+                if self.model.check_state(node) == Qt.CheckState.Checked:
+                    shadow_path = self.model.node_path(node)
                     if os.path.isfile(shadow_path):
-                        rel = os.path.relpath(shadow_path, self.shadow_root)
-                        dest = os.path.join(self.project_path, rel)
-                        os.makedirs(os.path.dirname(dest), exist_ok=True)
-                        shutil.copy2(shadow_path, dest)
-                        count += 1
-                iterator += 1
+                        rels.append(os.path.relpath(shadow_path, self.shadow_root))
+            # Copy back to origin (shared with "python cli.py sync", see shadow_sync.py)
+            count = len(sync_to_origin(self.project_path, rels, self.shadow_root))
             
             QMessageBox.information(self, "Success", f"Synced {count} files to origin.")
             self.close()
@@ -732,10 +592,18 @@ class ProjectChooseWindow(QWidget):
         # Head
         layout.addWidget(QLabel(f"Origin Project: {self.project_name}\nPath: {self.project_path}"))
 
+        # Selection state for visual marking from ALL sections
+        self.selection = get_selection_index(self.project_name)
+
         # Tree
-        self.tree = QTreeWidget()
-        self.tree.setHeaderLabel("Projects / Contexts")
+        self.model = ProjectTreeModel("Projects / Contexts", highlight_fn=self.selection.is_selected)
+        self.tree = QTreeView()
+        self.tree.setUniformRowHeights(True)
+        self.tree.setModel(self.model)
         layout.addWidget(self.tree)
+        layout.addWidget(ScanProgressLabel(self.model))
+        self.model.scan_finished.connect(lambda: self.log("Scan finished"))
+        self.model.scan_finished.connect(self.save_scan_snapshot)
 
         # Debug Log (Initialize EARLY)
         self.log_widget = QTextEdit()
@@ -745,26 +613,20 @@ class ProjectChooseWindow(QWidget):
         # Load saved context for THIS context_key
         saved_context = self.data["projects"][self.project_name].get(self.context_key)
         
-        # Roots
-        self.origin_item = QTreeWidgetItem([f"[Origin] {self.project_name}"])
-        self.origin_item.setData(0, Qt.ItemDataRole.UserRole, self.project_path)
+        # Roots (warm start from the last scan snapshot, reconciled in the background)
+        self.snapshot_path = os.path.join(SCRIPT_DIR, "file", self.project_name, SNAPSHOT_NAME)
+        load_snapshot(self.snapshot_path)
+        self.origin_item = self.add_root(f"[Origin] {self.project_name}", self.project_path)
         
         # Check Origin if:
         #   1. Saved context matches Origin, OR
         #   2. No saved context AND context_key is 'source_context' (default for source)
         if saved_context == self.project_path:
-            self.origin_item.setCheckState(0, Qt.CheckState.Checked)
+            self.model.set_check(self.origin_item, Qt.CheckState.Checked)
         elif not saved_context and self.context_key == "source_context":
-            self.origin_item.setCheckState(0, Qt.CheckState.Checked)
-        else:
-            self.origin_item.setCheckState(0, Qt.CheckState.Unchecked)
-            
-        self.tree.addTopLevelItem(self.origin_item)
-
-        self.coped_root = QTreeWidgetItem(["Coped Projects"])
-        self.tree.addTopLevelItem(self.coped_root)
+            self.model.set_check(self.origin_item, Qt.CheckState.Checked)
 
-        self.tree.addTopLevelItem(self.coped_root)
+        self.coped_root = self.model.add_root("Coped Projects", checkable=False)
 
         # Populate Coped Projects (Scan 'file/{project_name}/' directory)
         file_dir = os.path.join(SCRIPT_DIR, "file", self.project_name)
@@ -784,34 +646,30 @@ class ProjectChooseWindow(QWidget):
             for d in subdirs:
                 if d == "__pycache__": continue
                 if d.lower() == "shadow": continue # Hide Shadow Layer from UI
+                if d == CACHE_DIR_NAME: continue # Prompt block cache, not a project
+                if d == HISTORY_DIR_NAME: continue # Prompt history, not a project
                 
                 full_path = os.path.join(file_dir, d)
                 display_name = d
                 
-                item = QTreeWidgetItem([display_name])
-                item.setData(0, Qt.ItemDataRole.UserRole, full_path)
+                item = self.add_root(display_name, full_path, parent_node=self.coped_root)
                 
                 # Check if:
                 #   1. Saved context matches this path, OR
                 #   2. No saved context AND context_key is 'coped_context' AND this is first coped
                 if saved_context == full_path:
-                    item.setCheckState(0, Qt.CheckState.Checked)
+                    self.model.set_check(item, Qt.CheckState.Checked)
                 elif not saved_context and self.context_key == "coped_context" and first_coped:
-                    item.setCheckState(0, Qt.CheckState.Checked)
+                    self.model.set_check(item, Qt.CheckState.Checked)
                     first_coped = False
-                else:
-                    item.setCheckState(0, Qt.CheckState.Unchecked)
                 
-                self.coped_root.addChild(item)
                 self.coped_roots.append(item)
-                
-                # Populate files
-                self.populate_tree(item, full_path)
 
-        self.coped_root.setExpanded(True)
-        self.origin_item.setExpanded(True)
+        # Expanding fetches the first level of each root from the model
+        self.tree.setExpanded(self.model.index_for(self.coped_root), True)
+        self.tree.setExpanded(self.model.index_for(self.origin_item), True)
 
-        self.tree.itemClicked.connect(self.handle_item_clicked)
+        self.tree.clicked.connect(self.handle_item_clicked)
 
         # Buttons
         btn_layout = QHBoxLayout()
@@ -831,106 +689,60 @@ class ProjectChooseWindow(QWidget):
         
         self.log(f"Initialized ProjectChooseWindow for: {self.project_path}")
 
-        self.log(f"Initialized ProjectChooseWindow for: {self.project_path}")
-
-        # Populate NOW (after log widget exists)
-        # Origin
-        if os.path.exists(self.project_path):
-            self.populate_tree(self.origin_item, self.project_path)
-            
-        # Coped Projects are already populated in the loop above (check lines 488-513 in original context)
-        # The loop scanning 'file/' calls self.populate_tree(item, full_path) immediately.
-        # So we don't need a separate call here for 'shadow_path'.
-
     def log(self, msg):
         self.log_widget.append(msg)
         print(f"[ProjectChooseWindow] {msg}")
 
-    def populate_tree(self, parent_item, root_path):
-        try:
-            self.log(f"Populating path: {root_path}")
-            if not os.path.exists(root_path):
-                self.log(f"Path does not exist: {root_path}")
-                return
-
-            if os.path.isdir(root_path):
-                files = sorted(os.listdir(root_path))
-                # Get selected files for visual marking from ALL sections
-                selected_set = set()
-                
-                # Load from origin
-                origin_files = self.data["projects"][self.project_name].get("origin", {}).get("selected_files", [])
-                for f in origin_files:
-                    if os.path.isabs(f):
-                        selected_set.add(os.path.normpath(f))
-                    else:
-                        selected_set.add(os.path.normpath(os.path.join(self.project_path, f)))
-                
-                # Load from all coped projects
-                file_dir = os.path.join(SCRIPT_DIR, "file", self.project_name)
-                coped_dict = self.data["projects"][self.project_name].get("coped", {})
-                for coped_name, coped_data in coped_dict.items():
-                    coped_path = os.path.join(file_dir, coped_name)
-                    for f in coped_data.get("selected_files", []):
-                        if os.path.isabs(f):
-                            selected_set.add(os.path.normpath(f))
-                        else:
-                            selected_set.add(os.path.normpath(os.path.join(coped_path, f)))
-                
-                self.log(f"Found {len(files)} files in {root_path}")
-                for f in files:
-                    full_path = os.path.join(root_path, f)
-                    if f in [".git", "__pycache__", "file"]: 
-                        continue # Skip generic ignores
-                    
-                    item = QTreeWidgetItem([f])
-                    item.setData(0, Qt.ItemDataRole.UserRole, full_path)
-                    
-                    # Visual: Color/Bold for selected
-                    norm_full_path = os.path.normpath(full_path)
-                    if norm_full_path in selected_set:
-                        from PyQt6.QtGui import QColor, QFont, QBrush
-                        # Use a brighter green
-                        item.setForeground(0, QBrush(QColor("#00CD00"))) # Medium Spring Green / Bright Green
-                        font = item.font(0)
-                        font.setBold(True)
-                        item.setFont(0, font)
-
-                    parent_item.addChild(item)
-                    if os.path.isdir(full_path):
-                        self.populate_tree(item, full_path)
-            else:
-                self.log(f"Not a directory: {root_path}")
-        except Exception as e:
-            self.log(f"Error populating tree: {e}")
-
-    def handle_item_clicked(self, item, column):
+    def closeEvent(self, event):
+        self.model.shutdown()
+        super().closeEvent(event)
+
+    def save_scan_snapshot(self):
+        save_snapshot(self.snapshot_path, [index for _, index, _, _ in self.model.roots.values()])
+
+    def add_root(self, label, root_path, parent_node=None):
+        # Roots are checkable (radio behavior); their contents are fetched by the model on expand
+        kwargs = {} if parent_node is None else {"parent_node": parent_node}
+        self.log(f"Populating path: {root_path}")
+        if not os.path.exists(root_path):
+            self.log(f"Path does not exist: {root_path}")
+            return self.model.add_root(label, checkable=True, **kwargs)
+        if not os.path.isdir(root_path):
+            self.log(f"Not a directory: {root_path}")
+            return self.model.add_root(label, checkable=True, **kwargs)
+        # Shared index: only directories whose mtime changed are re-read (in the background)
+        index = get_index(root_path)
+        return self.model.add_root(label, root_path, checkable=True, index=index, scan=True, **kwargs)
+
+    def handle_item_clicked(self, index):
         # Enforce Radio Behavior for Roots (Origin vs any Coped Root)
+        node = self.model.node_of(index)
         roots = [self.origin_item] + getattr(self, "coped_roots", [])
         
-        if item in roots:
-            # Uncheck others
-            for root in roots:
-                if root != item:
-                    root.setCheckState(0, Qt.CheckState.Unchecked)
-            # Ensure clicked is checked
-            if item.checkState(0) == Qt.CheckState.Unchecked:
-                 item.setCheckState(0, Qt.CheckState.Checked)
+        if node in roots:
+            with self.model.batch():
+                # Uncheck others
+                for root in roots:
+                    if root != node:
+                        self.model.set_check(root, Qt.CheckState.Unchecked)
+                # Ensure clicked is checked
+                if self.model.check_state(node) == Qt.CheckState.Unchecked:
+                     self.model.set_check(node, Qt.CheckState.Checked)
 
     def apply_changes(self):
         try:
             selected_path = None
             
             # Check Origin
-            if self.origin_item.checkState(0) == Qt.CheckState.Checked:
-                selected_path = self.origin_item.data(0, Qt.ItemDataRole.UserRole)
+            if self.model.check_state(self.origin_item) == Qt.CheckState.Checked:
+                selected_path = self.project_path
             
             # Check Coped Roots
             if not selected_path:
                  coped_roots = getattr(self, "coped_roots", [])
                  for root in coped_roots:
-                     if root.checkState(0) == Qt.CheckState.Checked:
-                         selected_path = root.data(0, Qt.ItemDataRole.UserRole)
+                     if self.model.check_state(root) == Qt.CheckState.Checked:
+                         selected_path = os.path.join(SCRIPT_DIR, "file", self.project_name, self.model.node_name(root))
                          break
             
             if not selected_path:
@@ -939,7 +751,7 @@ class ProjectChooseWindow(QWidget):
 
             # Save to the correct context_key
             self.data["projects"][self.project_name][self.context_key] = selected_path
-            save_data(self.data)
+            get_store().set_project_field(self.project_name, self.context_key, selected_path)
             # QMessageBox.information(self, "Saved", "Project selection saved.") 
             self.selection_made.emit()
             self.close()
@@ -957,6 +769,8 @@ class EnterWindow(QWidget):
         self.project_name = project_name
         self.project_path = project_path
         self.data = data
+        self.gen_job = None # Running GenerateJob (see chat_job.py)
+        self.compactor = None # Compactor of the running / last generation (see compact.py)
 
         self.setWindowTitle(f"Enter Workspace - {project_name}")
         self.resize(700, 600)
@@ -1008,8 +822,68 @@ class EnterWindow(QWidget):
         row2.addWidget(self.btn_toggle_src)
         row2.addWidget(self.btn_toggle_shadow)
         row2.addWidget(self.btn_toggle_diff)
+        # Repository map: tree + top-level signatures of the whole source context (see repo_map.py)
+        self.btn_toggle_map = QPushButton("Repo Map")
+        self.btn_toggle_map.setCheckable(True)
+        self.btn_toggle_map.setChecked(bool(self.data["projects"][self.project_name].get("repo_map")))
+        self.btn_toggle_map.setStyleSheet("QPushButton:checked { background-color: #a0d0a0; }")
+        self.btn_toggle_map.setToolTip("Add the directory tree of the Source context with the top-level\n"
+                                       "def / class signatures and line spans of every source file.")
+        row2.addWidget(self.btn_toggle_map)
         layout.addLayout(row2)
 
+        # Target model: the prompt is trimmed to its context window (see token_budget.py)
+        row_model = QHBoxLayout()
+        row_model.addWidget(QLabel("Target Model:"))
+        self.combo_model = QComboBox()
+        self.combo_model.addItem("(No limit)", None)
+        for model, window in MODEL_WINDOWS.items():
+            self.combo_model.addItem(f"{model} ({window // 1000}k)", model)
+        target_model = self.data["projects"][self.project_name].get("target_model")
+        index = self.combo_model.findData(target_model) if target_model else 0
+        self.combo_model.setCurrentIndex(max(index, 0))
+        self.combo_model.setToolTip("Files are trimmed (regions, signatures, path only) to fit the model;\n"
+                                    "a fixed \"token_budget\" project field overrides the window.")
+        row_model.addWidget(self.combo_model, 1)
+        layout.addLayout(row_model)
+
+        # Python slicing: only the definitions named here or in the task (see symbol_slice.py)
+        row_slice = QHBoxLayout()
+        proj = self.data["projects"][self.project_name]
+        self.btn_toggle_slice = QPushButton("Python: Symbols Only")
+        self.btn_toggle_slice.setCheckable(True)
+        self.btn_toggle_slice.setChecked(bool(proj.get("slice_python")))
+        self.btn_toggle_slice.setStyleSheet("QPushButton:checked { background-color: #a0d0a0; }")
+        self.btn_toggle_slice.setToolTip("Keep imports and the defs / classes named below or in the task;\n"
+                                         "other Python files are reduced to an outline. Line numbers are kept.")
+        self.slice_symbols = QLineEdit(", ".join(proj.get("slice_symbols") or []))
+        self.slice_symbols.setPlaceholderText("Symbols, e.g. Login, Login.check (empty: names in the task)")
+        row_slice.addWidget(self.btn_toggle_slice)
+        row_slice.addWidget(self.slice_symbols, 1)
+        # Compaction: blank / comment-only lines left out, line numbers kept (see compact.py)
+        self.btn_toggle_compact = QPushButton("Compact")
+        self.btn_toggle_compact.setCheckable(True)
+        self.btn_toggle_compact.setChecked(bool(proj.get("compact")))
+        self.btn_toggle_compact.setStyleSheet("QPushButton:checked { background-color: #a0d0a0; }")
+        self.btn_toggle_compact.setToolTip("Leave out blank lines, comment-only lines (banners, license headers)\n"
+                                           "and trailing whitespace. Kept lines keep their original numbers.")
+        row_slice.addWidget(self.btn_toggle_compact)
+        layout.addLayout(row_slice)
+
+        # Paste limit: larger prompts are also written as chat.partNN.txt (see chat_split.py)
+        row_parts = QHBoxLayout()
+        row_parts.addWidget(QLabel("Paste Limit:"))
+        self.combo_part = QComboBox()
+        for label, chars in (("(Whole prompt)", 0), ("30k chars", 30000), ("50k chars", 50000),
+                             ("100k chars", 100000), ("200k chars", 200000), ("500k chars", 500000)):
+            self.combo_part.addItem(label, chars)
+        index = self.combo_part.findData(proj.get("part_chars") or 0)
+        self.combo_part.setCurrentIndex(max(index, 0))
+        self.combo_part.setToolTip("Split chat.txt into parts under this size at file boundaries;\n"
+                                   "the last part carries the instructions.")
+        row_parts.addWidget(self.combo_part, 1)
+        layout.addLayout(row_parts)
+
         # 4. Input (Row 3)
         # input_box[1]
         layout.addWidget(QLabel("AI Command / Code Input:"))
@@ -1028,10 +902,21 @@ class EnterWindow(QWidget):
         
         # Removed toggle_switch[3] "Target: Coped" as per instructions
         
+        self.btn_cancel_gen = QPushButton("Cancel")
+        self.btn_cancel_gen.setToolTip("Stop generating (keeps the previous chat.txt)")
+        self.btn_cancel_gen.clicked.connect(self.cancel_generate)
+        self.btn_cancel_gen.hide()
+        
         row4.addWidget(self.btn_gen_chat)
+        row4.addWidget(self.btn_cancel_gen)
         row4.addWidget(self.btn_open_ide)
         layout.addLayout(row4)
 
+        # Progress of the background generation (hidden when idle)
+        self.gen_progress = QLabel()
+        self.gen_progress.hide()
+        layout.addWidget(self.gen_progress)
+
         # 5. Chat Actions (Row 5 - Copy/Paste)
         row5 = QHBoxLayout()
         self.btn_copy_chat = QPushButton("Copy Chat.txt")
@@ -1040,9 +925,24 @@ class EnterWindow(QWidget):
         self.btn_paste_ai = QPushButton("Paste AI Response")
         self.btn_paste_ai.clicked.connect(self.paste_ai_response)
         
+        # Copy part N of M (shown when chat.txt was split)
+        self.part_spin = QSpinBox()
+        self.part_spin.setPrefix("Part ")
+        self.btn_copy_part = QPushButton("Copy Part")
+        self.btn_copy_part.clicked.connect(self.copy_part)
+
+        # Past prompts (file/<project>/.coder-history, see prompt_history.py)
+        self.btn_history = QPushButton("History...")
+        self.btn_history.setToolTip("Copy a previously generated prompt to the clipboard")
+        self.btn_history.clicked.connect(self.copy_history)
+        
         row5.addWidget(self.btn_copy_chat)
+        row5.addWidget(self.part_spin)
+        row5.addWidget(self.btn_copy_part)
+        row5.addWidget(self.btn_history)
         row5.addWidget(self.btn_paste_ai)
         layout.addLayout(row5)
+        self.show_parts(part_paths(os.path.join(self.project_path, CHAT_NAME)))
 
         # Log
         self.log_output = QTextEdit()
@@ -1187,358 +1087,208 @@ class EnterWindow(QWidget):
         return rel
 
     def generate_chat(self):
+        if self.gen_job is not None:
+            return
         try:
             # RELOAD DATA to ensure we have the latest 'selected_files' from ConsoleWindow
             self.data = load_data() 
             
             # SAVE TOGGLES for Extension to use
-            self.data["projects"][self.project_name]["toggles"] = {
+            toggles = {
                 "source": self.btn_toggle_src.isChecked(),
                 "shadow": self.btn_toggle_shadow.isChecked(),
                 "diff": self.btn_toggle_diff.isChecked()
             }
-            save_data(self.data)
-
-            # Load selected_files from ALL sections (origin + coped)
-            selected_files = []
-            
-            # Load from origin
-            origin_files = self.data["projects"][self.project_name].get("origin", {}).get("selected_files", [])
-            for f in origin_files:
-                if os.path.isabs(f):
-                    selected_files.append(f)
-                else:
-                    selected_files.append(os.path.join(self.project_path, f))
-            
-            # Load from all coped projects
-            file_dir = os.path.join(SCRIPT_DIR, "file", self.project_name)
-            coped_dict = self.data["projects"][self.project_name].get("coped", {})
-            for coped_name, coped_data in coped_dict.items():
-                coped_path = os.path.join(file_dir, coped_name)
-                for f in coped_data.get("selected_files", []):
-                    if os.path.isabs(f):
-                        selected_files.append(f)
-                    else:
-                        selected_files.append(os.path.join(coped_path, f))
-            
+            self.data["projects"][self.project_name]["toggles"] = toggles
+            get_store().set_project_field(self.project_name, "toggles", toggles)
+
+            # Target model (None = no limit), also used by "python main.py generate"
+            model = self.combo_model.currentData()
+            if model != self.data["projects"][self.project_name].get("target_model"):
+                self.data["projects"][self.project_name]["target_model"] = model
+                get_store().set_project_field(self.project_name, "target_model", model)
+            budget = budget_for(model, self.data["projects"][self.project_name].get("token_budget"))
+
+            # Python slicing (None = whole files)
+            slice_python = self.btn_toggle_slice.isChecked()
+            symbols = [s.strip() for s in self.slice_symbols.text().replace(";", ",").split(",") if s.strip()]
+            for key, value in (("slice_python", slice_python), ("slice_symbols", symbols)):
+                if value != (self.data["projects"][self.project_name].get(key) or type(value)()):
+                    self.data["projects"][self.project_name][key] = value
+                    get_store().set_project_field(self.project_name, key, value)
+            symbols = symbols if slice_python else None
+            # Compaction (per-project "compact" field); the Compactor collects the savings report
+            compact = self.btn_toggle_compact.isChecked()
+            if compact != bool(self.data["projects"][self.project_name].get("compact")):
+                self.data["projects"][self.project_name]["compact"] = compact
+                get_store().set_project_field(self.project_name, "compact", compact)
+            compactor = self.compactor = Compactor() if compact else None
+            # Repository map (per-project "repo_map" / "repo_map_tokens" fields)
+            use_map = self.btn_toggle_map.isChecked()
+            if use_map != bool(self.data["projects"][self.project_name].get("repo_map")):
+                self.data["projects"][self.project_name]["repo_map"] = use_map
+                get_store().set_project_field(self.project_name, "repo_map", use_map)
+            repo_map = get_repo_map(self.project_name) if use_map else None
+            map_tokens = self.data["projects"][self.project_name].get("repo_map_tokens", DEFAULT_MAP_TOKENS)
+            # Shadow files also in Source: referenced / changes only (per-project "dedupe_shadow" field)
+            dedupe = self.data["projects"][self.project_name].get("dedupe_shadow", True)
+            # Size / line length thresholds of the binary, huge and generated file check
+            limits = project_limits(self.data["projects"][self.project_name])
+            # Paste limit (chars; a "part_tokens" project field caps estimated tokens instead)
+            part_chars = self.combo_part.currentData()
+            if part_chars != (self.data["projects"][self.project_name].get("part_chars") or 0):
+                self.data["projects"][self.project_name]["part_chars"] = part_chars
+                get_store().set_project_field(self.project_name, "part_chars", part_chars)
+            part_tokens = self.data["projects"][self.project_name].get("part_tokens") or 0
+            # Snapshots kept in file/<project>/.coder-history (per-project "history_limit" field, 0: none)
+            history_limit = self.data["projects"][self.project_name].get("history_limit", HISTORY_LIMIT)
+            history = get_history(self.project_name)
+
+            # Selection rules from ALL sections (origin + coped); expanded to files by the job
             # Permissive: Allow generation even if no files are selected
+            sections = get_selection_index(self.project_name).sections
 
-            # Determine Contexts (Ensure Absolute)
-            # Track if contexts are explicitly set vs using defaults
-            raw_source_context = self.data["projects"][self.project_name].get("source_context")
-            raw_coped_context = self.data["projects"][self.project_name].get("coped_context")
-            
-            # Normalize for comparison
-            p_path_norm = os.path.normcase(os.path.abspath(self.project_path))
-            raw_src_norm = os.path.normcase(os.path.abspath(raw_source_context)) if raw_source_context else None
-            raw_coped_norm = os.path.normcase(os.path.abspath(raw_coped_context)) if raw_coped_context else None
-            
-            # source/coped_is_origin: True if explicitly set to project path (or Source default)
-            source_is_origin = raw_source_context is None or raw_source_context == "" or raw_src_norm == p_path_norm
-            coped_is_origin = raw_coped_norm == p_path_norm
-            
-            coped_explicitly_set = raw_coped_context is not None and raw_coped_context != ""
-            
-            # self.log(f"DEBUG: Raw Source: '{raw_source_context}', Is Origin: {source_is_origin}")
-            # self.log(f"DEBUG: Raw Coped: '{raw_coped_context}', Is Origin: {coped_is_origin}, Explicit: {coped_explicitly_set}")
-            
-            source_root = raw_source_context if raw_source_context else self.project_path
-            coped_root = raw_coped_context if raw_coped_context else os.path.join(SCRIPT_DIR, "file", "shadow")
-            
-            script_dir = os.path.dirname(os.path.abspath(__file__))
-            
-            # If path starts with 'file', it's relative to coder directory (script_dir), not project_path
-            if not os.path.isabs(source_root):
-                if source_root.startswith("file" + os.sep) or source_root.startswith("file/"):
-                    source_root = os.path.join(script_dir, source_root)
-                else:
-                    source_root = os.path.join(self.project_path, source_root)
-            
-            if not os.path.isabs(coped_root):
-                if coped_root.startswith("file" + os.sep) or coped_root.startswith("file/"):
-                    coped_root = os.path.join(script_dir, coped_root)
-                else:
-                    coped_root = os.path.join(self.project_path, coped_root)
-
-            source_root = os.path.abspath(source_root)
-            coped_root = os.path.abspath(coped_root)
+            # Source / Coped contexts and their display names (see prompt_builder.py)
+            ctx = resolve_contexts(self.project_name, self.data)
 
             self.log(f"Generating Prompt with:")
-            self.log(f"  Source Context: {source_root}")
-            self.log(f"  Coped Context: {coped_root}")
-
-            # Filter Selected Files by Context
-            # We ONLY consider files that are explicitly selected WITHIN the chosen root.
-            src_files = [] 
-            coped_files = []
-            
-            # Normalize selected_files to sets of absolute paths for easy checking
-            abs_selected = set()
-            for p in selected_files:
-                # Fix: Resolve relative paths from project_path, not current working directory
-                if os.path.isabs(p):
-                    abs_p = os.path.normpath(p)
-                else:
-                    # Relative path - resolve from project_path
-                    abs_p = os.path.normpath(os.path.join(self.project_path, p))
-                
-                # Safety check: Allow files under project_path OR under coder's file/ directory
-                rel_to_project = os.path.relpath(abs_p, self.project_path)
-                rel_to_file_dir = os.path.relpath(abs_p, os.path.join(script_dir, "file"))
-                
-                if not rel_to_project.startswith("..") or not rel_to_file_dir.startswith(".."):
-                    abs_selected.add(abs_p)
-
-            # Assign to contexts
-            def is_subpath(p, r):
-                # Ensure r ends with separator or checking exact match
-                # Use normcase to handle Windows case insensitivity and separators
-                r = os.path.normcase(os.path.abspath(r))
-                p = os.path.normcase(os.path.abspath(p))
-                return p == r or p.startswith(os.path.join(r, ""))
-
-            self.log(f"DEBUG: Filtering {len(abs_selected)} files...")
-            self.log(f"DEBUG: Source Root (norm): {os.path.normcase(os.path.abspath(source_root))}")
-            self.log(f"DEBUG: Coped Root (norm): {os.path.normcase(os.path.abspath(coped_root))}")
-
-            for path in abs_selected:
-                is_src = is_subpath(path, source_root)
-                is_coped = is_subpath(path, coped_root)
-                self.log(f"DEBUG: Checking {path} -> Src: {is_src}, Coped: {is_coped}")
-
-                if is_src:
-                    src_files.append(path)
-                
-                # Check Coped match independently (in case user selected Origin for both contexts)
-                # However, if roots differ, we want strict separation.
-                # If source_root == coped_root, then src_files == coped_files.
-                
-                if is_coped:
-                    coped_files.append(path)
-
-            # Prepare Relative Paths for Display & Diff
-            src_rels = {} # rel -> abs_path
-            for p in src_files:
-                rel = os.path.relpath(p, source_root)
-                src_rels[rel] = p
-            
-            coped_rels = {} # rel -> abs_path
-            for p in coped_files:
-                rel = os.path.relpath(p, coped_root)
-                coped_rels[rel] = p
+            self.log(f"  Source Context: {ctx.source_root}")
+            self.log(f"  Coped Context: {ctx.coped_root}")
+            if budget:
+                self.log(f"  Token Budget: {budget:,} ({model or 'token_budget'})")
 
-            content = ""
-            
-            # 1. System Prompt (Penter Unified Prompt)
-            # 1. System Prompt
-            self.log("DEBUG: Starting generate_chat...")
-            prompt_file = os.path.join(SCRIPT_DIR, "file", "prompt.txt")
-            if os.path.exists(prompt_file):
-                try:
-                    with open(prompt_file, "r", encoding="utf-8") as f:
-                        prompt_text = f.read()
-                        content += prompt_text
-                        self.log(f"DEBUG: Loaded prompt.txt ({len(prompt_text)} chars)")
-                except Exception as e:
-                     content += f"// Error reading prompt.txt: {e}\n\n"
-                     self.log(f"DEBUG: Error reading prompt.txt: {e}")
-            else:
-                 # self.log("DEBUG: prompt.txt NOT found. Using fallback.")
-                 content += "// Warning: prompt.txt not found.\n"
-                 content += "You are Penter AI.\n\n"
-
-             # 2. Input Prompt
             user_input = self.text_input.toPlainText()
-            
-            # Resolve Source/Coped Project Names
-            source_name = "[Not Selected]"
-            coped_name = "[Not Selected]"
-
-            def find_project_by_path(target_path):
-                target = os.path.normcase(os.path.abspath(target_path))
-                curr_proj_path_norm = os.path.normcase(os.path.abspath(self.project_path))
-                script_dir = os.path.dirname(os.path.abspath(__file__))
-                file_dir_norm = os.path.normcase(os.path.join(script_dir, "file"))
-                
-                # Priority 1: Check Database for EXACT match (Handles nested projects)
-                for name, info in self.data.get("projects", {}).items():
-                    p_path = info.get("path")
-                    if p_path:
-                        norm_p = os.path.normcase(os.path.abspath(p_path))
-                        if norm_p == target:
-                            return name
-
-                # Priority 2: Check against Current Project (Root)
-                if target == curr_proj_path_norm:
-                     return self.project_name
-                
-                # Priority 3: Coped Folder
-                if target.startswith(file_dir_norm + os.sep):
-                    rel_to_file = os.path.relpath(target, file_dir_norm)
-                    parts = rel_to_file.split(os.sep)
-                    if len(parts) >= 2:
-                        coped_folder_name = parts[1]
-                        self.log(f"DEBUG: Coped folder name extracted: {coped_folder_name}")
-                        return coped_folder_name
-                    elif len(parts) == 1:
-                        self.log(f"DEBUG: Direct folder name: {parts[0]}")
-                        return parts[0]
-                
-                # Priority 4: Subpath of Current?
-                if target.startswith(curr_proj_path_norm + os.sep):
-                    self.log("DEBUG: Subpath match found (Current Project)")
-                    return self.project_name
-
-                return None
-
-            # Resolve names based on context selection
-            if source_is_origin:
-                source_name = self.project_name
-            else:
-                found_src = find_project_by_path(source_root)
-                if found_src: source_name = found_src
-
-            if coped_explicitly_set:
-                found_coped = find_project_by_path(coped_root)
-                if found_coped: coped_name = found_coped
-
-            # Always output Task Description Header & Project Context
-            content += "# Task Description\n"
-            content += f"Origin Project: {self.project_name}\n"
-
-            # Conditional Injection based on GUI Toggles
-            show_source = self.btn_toggle_src.isChecked()
-            show_shadow = self.btn_toggle_shadow.isChecked()
-            show_diff = self.btn_toggle_diff.isChecked()
-            
-            # Determine ACTIVE names based on toggles (UI Logic)
-            active_source_name = source_name if (show_source or show_diff) else "[Disabled]"
-            active_coped_name = coped_name if (show_shadow or show_diff) else "[Disabled]"
-            
-            self.log(f"DEBUG: Toggles - Source: {show_source}, Shadow: {show_shadow}, Diff: {show_diff}")
-            self.log(f"DEBUG: Active Names - Current: {self.project_name}, Source: {active_source_name}, Coped: {active_coped_name}")
-
-            if show_diff:
-                content += f"Source Project: {source_name}\n"
-                content += f"Coped Project: {coped_name}\n"
-            else:
-                if show_source:
-                    content += f"Source Project: {source_name}\n"
-                if show_shadow:
-                    content += f"Coped Project: {coped_name}\n"
-            
-            if user_input:
-                content += "\n" + user_input + "\n\n"
-            else:
-                content += "\n(No manual task description provided)\n\n"
-                self.log("DEBUG: User input is empty/None")
-
-            # 3. Source Files (Only src_rels)
-            if self.btn_toggle_src.isChecked():
-                content += f"# Source Files (Context: {os.path.basename(source_root)})\n"
-                sorted_src = sorted(src_rels.keys())
-                if not sorted_src:
-                     content += "(No files selected in Source Context. Hint: Ensure you selected files from the **Source Project** tree in Console.)\n\n"
-                
-                for rel in sorted_src:
-                    path = src_rels[rel]
-                    if os.path.exists(path):
-                        content += f"## {rel}\n```\n"
-                        try:
-                            with open(path, "r", encoding="utf-8") as f:
-                                # Add line numbers to help Penter Spec
-                                lines = f.readlines()
-                                for i, line in enumerate(lines, 1):
-                                    content += f"{i:4} | {line}"
-                        except: content += "(Error reading file)"
-                        content += "\n```\n\n"
-                    else:
-                        content += f"## {rel}\n(File not found in Source Context)\n\n"
 
-            # 4. Shadow Files (Only coped_rels)
-            if self.btn_toggle_shadow.isChecked():
-                content += f"# Shadow Files (Context: {os.path.basename(coped_root)})\n"
-                sorted_coped = sorted(coped_rels.keys())
-                if not sorted_coped:
-                     content += "(No files selected in Coped Context. Hint: Ensure you selected files from the **Coped Project** tree in Console.)\n\n"
-
-                for rel in sorted_coped:
-                    path = coped_rels[rel]
-                    if os.path.exists(path):
-                        content += f"## (Shadow) {rel}\n```\n"
-                        try:
-                            with open(path, "r", encoding="utf-8") as f:
-                                # Add line numbers to help Penter Spec
-                                lines = f.readlines()
-                                for i, line in enumerate(lines, 1):
-                                    content += f"{i:4} | {line}"
-                        except: content += "(Error reading file)"
-                        content += "\n```\n\n"
-                    else:
-                         content += f"## (Shadow) {rel}\n(File not found in Coped Context)\n\n"
+            # Rendered blocks of files unchanged since the last generation are reused
+            cache = get_block_cache(self.project_name)
+            # Files read concurrently per section (per-project "load_workers" field)
+            workers = self.data["projects"][self.project_name].get("load_workers") or DEFAULT_WORKERS
 
-            # 5. Diff Report (Intersection of Selected Files)
-            if self.btn_toggle_diff.isChecked():
-                # Rel paths that exist in BOTH selections
-                common_rels = set(src_rels.keys()) & set(coped_rels.keys())
-                sorted_common = sorted(list(common_rels))
-                
-                if sorted_common:
-                    diff_report = self.get_diff_report_context(source_root, coped_root, sorted_common)
-                    if diff_report:
-                        content += "# Diff Report (Source -> Shadow)\n"
-                        content += diff_report + "\n\n"
-                else:
-                    if src_rels or coped_rels:
-                        content += "# Diff Report\n(No common files selected between Source and Coped context to compare)\n\n"
+            # Runs on a worker thread (GenerateJob): expanding the selection, reading files and
+            # writing chat.txt. It must not touch widgets.
+            def plan(job):
+                planned = build_sections(ctx, sections, user_input, toggles, cache, workers, job.file_done,
+                                         budget, model, symbols, dedupe, limits, compactor, repo_map, map_tokens)
+                if repo_map is not None:
+                    repo_map.save()
+                return planned
 
             # Save to Project Root (consistent with copy_chat)
-            chat_path = os.path.join(self.project_path, "chat.txt")
-            
-            with open(chat_path, "w", encoding="utf-8") as f:
-                f.write(content)
-                
-            self.log(f"chat.txt generated ({len(content)} chars).")
-            self.btn_copy_chat.setEnabled(True)
-            self.copy_chat() # Auto-copy convenience
+            chat_path = os.path.join(self.project_path, CHAT_NAME)
+            def after(path):
+                history.record(path, user_input, history_limit, model=model)
+                try:
+                    return split_chat(path, part_chars, part_tokens)
+                except ValueError as e:
+                    return e   # chat.txt itself is complete; on_generate_done reports why it was not split
+
+            job = self.gen_job = GenerateJob(chat_path, plan, cache, after)
+            job.signals.progress.connect(self.on_generate_progress)
+            job.signals.done.connect(self.on_generate_done)
+            job.signals.failed.connect(self.on_generate_failed)
+            job.signals.cancelled.connect(self.on_generate_cancelled)
+            self.set_generating(True)
+            QThreadPool.globalInstance().start(job)
             
         except Exception as e:
             self.log(f"Error generating chat.txt: {e}")
             import traceback
             traceback.print_exc()
 
-    def get_diff_report_context(self, source_root, coped_root, rels):
+    def set_generating(self, running):
+        self.btn_gen_chat.setEnabled(not running)
+        self.btn_copy_chat.setEnabled(not running)
+        self.btn_copy_part.setEnabled(not running)
+        self.btn_cancel_gen.setVisible(running)
+        self.btn_cancel_gen.setEnabled(running)
+        self.gen_progress.setVisible(running)
+        if running:
+            self.gen_progress.setText("Generating...")
+
+    def cancel_generate(self):
+        if self.gen_job is not None:
+            self.gen_job.cancel()
+            self.btn_cancel_gen.setEnabled(False)
+
+    def on_generate_progress(self, files_done, files_total, written, eta):
+        text = f"Generating... {files_done:,}/{files_total:,} files, {written / 1024:,.0f} KB written"
+        if eta >= 0:
+            text += f", ETA {eta:,.0f}s"
+        self.gen_progress.setText(text)
+
+    def on_generate_done(self, chars):
+        parts = self.gen_job.result or []
+        self.gen_job = None
+        self.set_generating(False)
+        self.log(f"chat.txt generated ({chars} chars).")
+        if isinstance(parts, ValueError):
+            self.log(f"Not split into parts: {parts}")
+            parts = []
+        if self.compactor is not None:
+            for line in self.compactor.report():
+                self.log(line)
+        self.show_parts(parts)
+        if parts:
+            self.log(f"Split into {len(parts)} parts (chat.part01.txt ...); paste them in order.")
+            self.copy_part() # Auto-copy part 1
+        else:
+            self.copy_chat() # Auto-copy convenience
+
+    def show_parts(self, parts):
+        self.parts = parts
+        self.part_spin.setRange(1, max(len(parts), 1))
+        self.part_spin.setValue(1)
+        self.part_spin.setSuffix(f" of {len(parts)}")
+        self.part_spin.setVisible(bool(parts))
+        self.btn_copy_part.setVisible(bool(parts))
+
+    def copy_part(self):
+        index = self.part_spin.value()
+        if not 1 <= index <= len(self.parts):
+            return
         try:
-            import difflib
-            diffs = []
-            for rel in rels:
-                src_file = os.path.join(source_root, rel)
-                dst_file = os.path.join(coped_root, rel)
-                
-                src_lines = []
-                dst_lines = []
-                
-                if os.path.exists(src_file):
-                     with open(src_file, 'r', encoding='utf-8') as f: src_lines = f.readlines()
-                if os.path.exists(dst_file):
-                     with open(dst_file, 'r', encoding='utf-8') as f: dst_lines = f.readlines()
-                     
-                matcher = difflib.SequenceMatcher(None, src_lines, dst_lines)
-                file_diffs = []
-                for tag, i1, i2, j1, j2 in matcher.get_opcodes():
-                    if tag == "replace":
-                        file_diffs.append(f"Line {i1+1}-{i2}: Replace with\n{''.join(dst_lines[j1:j2])}")
-                    elif tag == "delete":
-                        file_diffs.append(f"Line {i1+1}-{i2}: Delete")
-                    elif tag == "insert":
-                        file_diffs.append(f"Line {i1+1}: Insert\n{''.join(dst_lines[j1:j2])}")
-                
-                if file_diffs:
-                    diffs.append(f"### {rel}")
-                    diffs.extend(file_diffs)
-            
-            return "\n".join(diffs)
-        except Exception as e: return f"Error diffing: {e}"
+            with open(self.parts[index - 1], "r", encoding="utf-8") as f:
+                QApplication.clipboard().setText(f.read())
+            self.log(f"Part {index} of {len(self.parts)} copied to clipboard.")
+            if index < len(self.parts):
+                self.part_spin.setValue(index + 1) # Ready for the next paste
+        except Exception as e:
+            self.log(f"Error copying part {index}: {e}")
+
+    def copy_history(self):
+        history = get_history(self.project_name)
+        entries = history.entries()
+        if not entries:
+            self.log("No prompt history yet.")
+            return
+        labels = []
+        for entry in entries:
+            when = datetime.datetime.fromtimestamp(entry.get("time", 0)).strftime("%Y-%m-%d %H:%M:%S")
+            labels.append(f"{when}  {entry.get('chars', 0):,} chars  {entry.get('task') or '(no task)'}")
+        label, ok = QInputDialog.getItem(self, "Prompt History", "Copy prompt to clipboard:", labels, 0, False)
+        if not ok:
+            return
+        entry = entries[labels.index(label)]
+        try:
+            QApplication.clipboard().setText("".join(history.read_entry(entry["id"])))
+            self.log(f"Prompt {entry['id']} copied to clipboard.")
+        except Exception as e:
+            self.log(f"Error reading prompt {entry['id']}: {e}")
+
+    def on_generate_failed(self, message):
+        self.gen_job = None
+        self.set_generating(False)
+        self.log(f"Error generating chat.txt: {message}")
+
+    def on_generate_cancelled(self):
+        self.gen_job = None
+        self.set_generating(False)
+        self.log("Generation cancelled; previous chat.txt kept.")
+
+    def closeEvent(self, event):
+        # The job keeps running until its next text piece; the old chat.txt stays
+        self.cancel_generate()
+        super().closeEvent(event)
 
     def get_diff_report(self):
         try:
@@ -1546,7 +1296,6 @@ class EnterWindow(QWidget):
             if not os.path.exists(shadow_root):
                 return None
             
-            import difflib
             diffs = []
             # Compare ALL files in shadow? or just selected? prompt didn't specify. 
             # Ideally comprehensive diff.
@@ -1561,8 +1310,7 @@ class EnterWindow(QWidget):
                         with open(origin_file, 'r', encoding='utf-8') as f: origin_lines = f.readlines()
                     else: origin_lines = [] # New file
 
-                    matcher = difflib.SequenceMatcher(None, origin_lines, shadow_lines)
-                    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+                    for tag, i1, i2, j1, j2 in diff_opcodes(origin_lines, shadow_lines):
                         if tag == "replace":
                             diffs.append(f"{rel} replace@{i1+1}-{i2}{{\n{''.join(shadow_lines[j1:j2])}}}")
                         elif tag == "delete":
@@ -1762,7 +1510,6 @@ class EnterWindow(QWidget):
                 self.log("Shadow layer not found.")
                 return
 
-            import difflib
             diffs = []
             for root, dirs, files in os.walk(shadow_root):
                 for file in files:
@@ -1777,8 +1524,7 @@ class EnterWindow(QWidget):
                     else:
                         origin_lines = []
 
-                    matcher = difflib.SequenceMatcher(None, origin_lines, shadow_lines)
-                    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+                    for tag, i1, i2, j1, j2 in diff_opcodes(origin_lines, shadow_lines):
                         if tag == "equal":
                             continue
                         elif tag == "replace":
@@ -7,6 +7,10 @@ based on the new data.json structure with separate origin/shadow/coped sections.
 
 import os
 
+from project_store import get_store
+from selection import SelectionRules
+from selection_index import get_selection_index
+
 # Script directory (coder-main)
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 
@@ -122,9 +126,27 @@ def get_relative_path(abs_path: str, context: str, project_name: str, data: dict
 # Selected Files Functions
 # ========================
 
+def get_selection(project_name: str, context: str) -> SelectionRules:
+    """
+    取得指定 context 的 selection rules
+    
+    Args:
+        project_name: 專案名稱
+        context: "origin", "shadow", 或 coped 名稱
+    
+    Returns:
+        SelectionRules
+    """
+    rules = get_selection_index(project_name).rules_for_context(context)
+    if rules is None:
+        # shadow (or a context unknown to the index)
+        rules = SelectionRules(get_store().get_selected_files(project_name, context))
+    return rules
+
+
 def get_selected_files(project_name: str, context: str, data: dict) -> list:
     """
-    取得指定 context 的 selected_files 清單（絕對路徑）
+    取得指定 context 的 selected_files 清單（絕對路徑，由 rules 展開）
     
     Args:
         project_name: 專案名稱
@@ -134,23 +156,14 @@ def get_selected_files(project_name: str, context: str, data: dict) -> list:
     Returns:
         絕對路徑清單
     """
-    proj = data["projects"][project_name]
-    
-    if context == CONTEXT_ORIGIN:
-        rel_files = proj.get("origin", {}).get("selected_files", [])
-    elif context == CONTEXT_SHADOW:
-        rel_files = proj.get("shadow", {}).get("selected_files", [])
-    else:
-        # Coped project
-        rel_files = proj.get("coped", {}).get(context, {}).get("selected_files", [])
-    
     base = get_context_root(project_name, context, data)
-    return [os.path.normpath(os.path.join(base, f)) for f in rel_files]
+    rules = get_selection(project_name, context)
+    return [os.path.normpath(os.path.join(base, f)) for f in rules.expand(base)]
 
 
 def get_selected_files_relative(project_name: str, context: str, data: dict) -> list:
     """
-    取得指定 context 的 selected_files 清單（相對路徑）
+    取得指定 context 的 selection rules 原始字串（相對路徑 / 目錄 / glob）
     
     Args:
         project_name: 專案名稱
@@ -160,43 +173,27 @@ def get_selected_files_relative(project_name: str, context: str, data: dict) ->
     Returns:
         相對路徑清單
     """
-    proj = data["projects"][project_name]
-    
-    if context == CONTEXT_ORIGIN:
-        return proj.get("origin", {}).get("selected_files", [])
-    elif context == CONTEXT_SHADOW:
-        return proj.get("shadow", {}).get("selected_files", [])
-    else:
-        return proj.get("coped", {}).get(context, {}).get("selected_files", [])
+    return get_store().get_selected_files(project_name, context)
 
 
 def set_selected_files(project_name: str, context: str, files: list, data: dict) -> None:
     """
-    設定指定 context 的 selected_files（傳入相對路徑）
+    設定指定 context 的 selected_files（傳入相對路徑或 selection rules）
     
     Args:
         project_name: 專案名稱
         context: "origin", "shadow", 或 coped 名稱
-        files: 相對路徑清單
-        data: data.json 資料（會被修改）
+        files: 相對路徑 / rule 清單
+        data: data.json 資料（會被修改，保持與資料庫一致）
     """
+    get_store().set_selected_files(project_name, context, files)
+
     proj = data["projects"][project_name]
-    
-    if context == CONTEXT_ORIGIN:
-        if "origin" not in proj:
-            proj["origin"] = {}
-        proj["origin"]["selected_files"] = files
-    elif context == CONTEXT_SHADOW:
-        if "shadow" not in proj:
-            proj["shadow"] = {}
-        proj["shadow"]["selected_files"] = files
+    if context in (CONTEXT_ORIGIN, CONTEXT_SHADOW):
+        section = proj.setdefault(context, {})
     else:
-        # Coped project
-        if "coped" not in proj:
-            proj["coped"] = {}
-        if context not in proj["coped"]:
-            proj["coped"][context] = {}
-        proj["coped"][context]["selected_files"] = files
+        section = proj.setdefault("coped", {}).setdefault(context, {})
+    section["selected_files"] = files
 
 
 # ========================
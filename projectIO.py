@@ -1,23 +1,18 @@
 import os
-import json
 from init import init_file
-
-FILE_DIR = "file"
-DATA_FILE = os.path.join(FILE_DIR, "data.json")
+from project_store import get_store
 
 # --------------------------
-# 初始化 file/data.json
+# 初始化 file/data.db (data.json 為 extension 用的 mirror)
 # --------------------------
 # init_file imported from init.py
 
 def load_data():
     init_file()
-    with open(DATA_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return get_store().load_data()
 
 def save_data(data):
-    with open(DATA_FILE, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2)
+    get_store().save_data(data)
 
 # --------------------------
 # 專案操作
@@ -44,17 +39,7 @@ def add_project():
         return
     os.makedirs(path, exist_ok=True)
     # New structure with origin/shadow/coped sections
-    data["projects"][name] = {
-        "path": os.path.abspath(path),
-        "origin": {"selected_files": []},
-        "shadow": {"selected_files": []},
-        "coped": {},
-        "source_context": "origin",
-        "coped_context": None,
-        "toggles": {"source": True, "shadow": False, "diff": False}
-    }
-    data["current_project"] = name
-    save_data(data)
+    get_store().add_project(name, os.path.abspath(path))
     print(f"Project '{name}' added and set as current project.")
 
 def delete_project():
@@ -68,14 +53,10 @@ def delete_project():
     if confirm != "y":
         print("Delete cancelled.")
         return
-    del data["projects"][name]
-    if data.get("current_project") == name:
-        data["current_project"] = None
-    save_data(data)
-    print(f"Project '{name}' removed from data.json.")
+    get_store().delete_project(name)
+    print(f"Project '{name}' removed from project store.")
 
 def select_project():
-    data = load_data()
     projects = list_projects()
     if not projects:
         return None
@@ -83,8 +64,7 @@ def select_project():
     if name not in projects:
         print(f"Project '{name}' not found.")
         return None
-    data["current_project"] = name
-    save_data(data)
+    get_store().set_current_project(name)
     print(f"Project '{name}' is now the current project.")
     return name
 
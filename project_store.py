@@ -0,0 +1,521 @@
+"""
+Project Store for AI Coder Helper
+
+SQLite-backed replacement for whole-file data.json rewrites.
+Projects, contexts (origin/shadow/coped) and selected files live in indexed
+tables, so a checkbox Apply or a toggle change only touches the rows it needs.
+
+file/data.json is still written (atomically) as a read-only mirror of the
+project metadata for the VS Code extension, which reads path / toggles /
+*_context / current_project from it. Selection lists are not mirrored.
+"""
+
+import os
+import json
+import sqlite3
+import shutil
+import threading
+
+# Script directory (coder-main)
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+FILE_DIR = os.path.join(SCRIPT_DIR, "file")
+DB_FILE = os.path.join(FILE_DIR, "data.db")
+DATA_JSON = os.path.join(FILE_DIR, "data.json")
+
+SCHEMA_VERSION = 1
+
+# Context kinds (see path_utils.CONTEXT_ORIGIN / CONTEXT_SHADOW)
+KIND_ORIGIN = "origin"
+KIND_SHADOW = "shadow"
+KIND_COPED = "coped"
+
+# Scalar project fields stored as their own columns
+PROJECT_FIELDS = ("path", "source_context", "coped_context", "ide_context", "active_context")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS projects (
+    name           TEXT PRIMARY KEY,
+    path           TEXT,
+    source_context TEXT,
+    coped_context  TEXT,
+    ide_context    TEXT,
+    active_context TEXT,
+    toggles        TEXT,
+    extra          TEXT
+);
+CREATE TABLE IF NOT EXISTS contexts (
+    id      INTEGER PRIMARY KEY,
+    project TEXT NOT NULL REFERENCES projects(name) ON DELETE CASCADE,
+    kind    TEXT NOT NULL,
+    name    TEXT NOT NULL,
+    UNIQUE(project, name)
+);
+CREATE TABLE IF NOT EXISTS selected_files (
+    context_id INTEGER NOT NULL REFERENCES contexts(id) ON DELETE CASCADE,
+    rel        TEXT NOT NULL,
+    PRIMARY KEY (context_id, rel)
+) WITHOUT ROWID;
+"""
+
+
+def _context_kind(context: str) -> str:
+    if context == KIND_ORIGIN:
+        return KIND_ORIGIN
+    if context == KIND_SHADOW:
+        return KIND_SHADOW
+    return KIND_COPED
+
+
+class ProjectStore:
+    """
+    data.db 的存取介面
+
+    所有寫入都在單一 transaction 內完成，只更新有變動的 row。
+    """
+
+    def __init__(self, db_path: str = DB_FILE, json_path: str = DATA_JSON):
+        self.db_path = db_path
+        self.json_path = json_path
+        self._lock = threading.RLock()
+        self._versions = {}     # project -> state version, bumped on every change
+        self._listeners = []
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(_SCHEMA)
+        self.migrate_from_json()
+
+    # ========================
+    # Low-level helpers
+    # ========================
+
+    def _tx(self):
+        return _Transaction(self._conn, self._lock)
+
+    def _changed(self, project=None) -> None:
+        """通知 listeners 專案資料已變動（project 為 None 表示全部）"""
+        with self._lock:
+            if project is None:
+                for name in self._versions:
+                    self._versions[name] += 1
+            else:
+                self._versions[project] = self._versions.get(project, 0) + 1
+            listeners = list(self._listeners)
+        for callback in listeners:
+            callback(project)
+
+    def _get_meta(self, key: str, default=None):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, key: str, value) -> None:
+        self._conn.execute(
+            "INSERT INTO meta(key, value) VALUES(?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, value),
+        )
+
+    def _context_id(self, project: str, context: str, create: bool = False):
+        row = self._conn.execute(
+            "SELECT id FROM contexts WHERE project = ? AND name = ?", (project, context)
+        ).fetchone()
+        if row:
+            return row[0]
+        if not create:
+            return None
+        cur = self._conn.execute(
+            "INSERT INTO contexts(project, kind, name) VALUES(?, ?, ?)",
+            (project, _context_kind(context), context),
+        )
+        return cur.lastrowid
+
+    def _sync_selected(self, context_id: int, files) -> None:
+        """Row-level diff between stored and requested selection."""
+        current = {r[0] for r in self._conn.execute(
+            "SELECT rel FROM selected_files WHERE context_id = ?", (context_id,))}
+        wanted = set(files)
+        removed = current - wanted
+        added = wanted - current
+        if removed:
+            self._conn.executemany(
+                "DELETE FROM selected_files WHERE context_id = ? AND rel = ?",
+                [(context_id, r) for r in removed],
+            )
+        if added:
+            self._conn.executemany(
+                "INSERT INTO selected_files(context_id, rel) VALUES(?, ?)",
+                [(context_id, r) for r in added],
+            )
+
+    def _upsert_project(self, name: str, info: dict) -> None:
+        known = set(PROJECT_FIELDS) | {"toggles", "origin", "shadow", "coped", "selected_files"}
+        extra = {k: v for k, v in info.items() if k not in known}
+        row = (
+            info.get("path"),
+            info.get("source_context"),
+            info.get("coped_context"),
+            info.get("ide_context"),
+            info.get("active_context"),
+            json.dumps(info["toggles"]) if "toggles" in info else None,
+            json.dumps(extra, ensure_ascii=False) if extra else None,
+        )
+        old = self._conn.execute(
+            "SELECT path, source_context, coped_context, ide_context, active_context, toggles, extra "
+            "FROM projects WHERE name = ?", (name,)
+        ).fetchone()
+        if old is None:
+            self._conn.execute(
+                "INSERT INTO projects(name, path, source_context, coped_context, ide_context, "
+                "active_context, toggles, extra) VALUES(?, ?, ?, ?, ?, ?, ?, ?)",
+                (name,) + row,
+            )
+        elif tuple(old) != row:
+            self._conn.execute(
+                "UPDATE projects SET path = ?, source_context = ?, coped_context = ?, ide_context = ?, "
+                "active_context = ?, toggles = ?, extra = ? WHERE name = ?",
+                row + (name,),
+            )
+
+    # ========================
+    # Whole-document API (legacy data dict)
+    # ========================
+
+    def load_data(self, include_selection: bool = True, project: str = None) -> dict:
+        """
+        以舊 data.json 的結構回傳所有資料
+
+        Args:
+            include_selection: 是否載入各 context 的 selected_files
+            project: 只載入此專案（None 表示全部）
+
+        Returns:
+            {"projects": {...}, "current_project": ...}
+        """
+        params = (project,) if project is not None else ()
+        with self._lock:
+            data = {"projects": {}, "current_project": self._get_meta("current_project")}
+            for row in self._conn.execute(
+                "SELECT name, path, source_context, coped_context, ide_context, active_context, "
+                "toggles, extra FROM projects " + ("WHERE name = ? " if params else "") + "ORDER BY rowid", params
+            ):
+                name, path, src, coped, ide, active, toggles, extra = row
+                info = {"path": path}
+                if extra:
+                    info.update(json.loads(extra))
+                info["origin"] = {}
+                info["shadow"] = {}
+                info["coped"] = {}
+                for key, value in (("source_context", src), ("coped_context", coped),
+                                   ("ide_context", ide), ("active_context", active)):
+                    if value is not None or key in ("source_context", "coped_context"):
+                        info[key] = value
+                if toggles:
+                    info["toggles"] = json.loads(toggles)
+                data["projects"][name] = info
+
+            for ctx_id, owner, kind, name in self._conn.execute(
+                "SELECT id, project, kind, name FROM contexts "
+                + ("WHERE project = ? " if params else "") + "ORDER BY id", params
+            ):
+                info = data["projects"].get(owner)
+                if info is None:
+                    continue
+                section = info[kind] if kind != KIND_COPED else info["coped"].setdefault(name, {})
+                if include_selection:
+                    section["selected_files"] = self._selected_rel(ctx_id)
+            return data
+
+    def save_data(self, data: dict) -> None:
+        """
+        將整份 data dict 同步到資料庫（只寫入有變動的 row）
+
+        Args:
+            data: data.json 結構的資料
+        """
+        projects = data.get("projects", {})
+        with self._tx():
+            existing = {r[0] for r in self._conn.execute("SELECT name FROM projects")}
+            for gone in existing - set(projects):
+                self._conn.execute("DELETE FROM projects WHERE name = ?", (gone,))
+
+            for name, info in projects.items():
+                self._upsert_project(name, info)
+                wanted = {KIND_ORIGIN: info.get("origin"), KIND_SHADOW: info.get("shadow")}
+                for coped_name, coped_data in (info.get("coped") or {}).items():
+                    wanted[coped_name] = coped_data
+                stored = {r[0] for r in self._conn.execute(
+                    "SELECT name FROM contexts WHERE project = ?", (name,))}
+                for gone in stored - {k for k, v in wanted.items() if v is not None}:
+                    self._conn.execute(
+                        "DELETE FROM contexts WHERE project = ? AND name = ?", (name, gone))
+                for ctx_name, section in wanted.items():
+                    if section is None:
+                        continue
+                    ctx_id = self._context_id(name, ctx_name, create=True)
+                    if "selected_files" in section:
+                        self._sync_selected(ctx_id, section["selected_files"])
+
+            self._set_meta("current_project", data.get("current_project"))
+        self.export_json()
+        self._changed()
+
+    # ========================
+    # Row-level API
+    # ========================
+
+    def get_selected_files(self, project: str, context: str) -> list:
+        """
+        取得指定 context 的 selected_files（相對路徑）
+
+        Args:
+            project: 專案名稱
+            context: "origin", "shadow", 或 coped 名稱
+
+        Returns:
+            相對路徑清單（已排序）
+        """
+        with self._lock:
+            ctx_id = self._context_id(project, context)
+            return self._selected_rel(ctx_id) if ctx_id is not None else []
+
+    def _selected_rel(self, ctx_id: int) -> list:
+        return [r[0] for r in self._conn.execute(
+            "SELECT rel FROM selected_files WHERE context_id = ? ORDER BY rel", (ctx_id,))]
+
+    def set_selected_files(self, project: str, context: str, files) -> None:
+        """
+        設定指定 context 的 selected_files（只增刪差異的 row）
+
+        Args:
+            project: 專案名稱
+            context: "origin", "shadow", 或 coped 名稱
+            files: 相對路徑清單
+        """
+        with self._tx():
+            ctx_id = self._context_id(project, context, create=True)
+            self._sync_selected(ctx_id, files)
+        self._changed(project)
+
+    def set_project_field(self, project: str, key: str, value) -> None:
+        """
+        更新單一專案欄位（path, *_context, toggles 或其他自訂欄位）
+
+        Args:
+            project: 專案名稱
+            key: 欄位名稱
+            value: 新的值
+        """
+        with self._tx():
+            if key in PROJECT_FIELDS:
+                self._conn.execute(f"UPDATE projects SET {key} = ? WHERE name = ?", (value, project))
+            elif key == "toggles":
+                self._conn.execute(
+                    "UPDATE projects SET toggles = ? WHERE name = ?", (json.dumps(value), project))
+            else:
+                row = self._conn.execute(
+                    "SELECT extra FROM projects WHERE name = ?", (project,)).fetchone()
+                if row is None:
+                    return
+                extra = json.loads(row[0]) if row[0] else {}
+                extra[key] = value
+                self._conn.execute(
+                    "UPDATE projects SET extra = ? WHERE name = ?",
+                    (json.dumps(extra, ensure_ascii=False), project))
+        self.export_json()
+        self._changed(project)
+
+    def add_project(self, name: str, path: str) -> None:
+        """新增專案（含 origin/shadow context）並設為目前專案"""
+        with self._tx():
+            self._upsert_project(name, {
+                "path": path,
+                "source_context": "origin",
+                "coped_context": None,
+                "toggles": {"source": True, "shadow": False, "diff": False},
+            })
+            self._context_id(name, KIND_ORIGIN, create=True)
+            self._context_id(name, KIND_SHADOW, create=True)
+            self._set_meta("current_project", name)
+        self.export_json()
+        self._changed(name)
+
+    def delete_project(self, name: str) -> None:
+        """刪除專案（contexts 與 selected_files 以 cascade 一併刪除）"""
+        with self._tx():
+            self._conn.execute("DELETE FROM projects WHERE name = ?", (name,))
+            if self._get_meta("current_project") == name:
+                self._set_meta("current_project", None)
+        self.export_json()
+        self._changed(name)
+
+    def set_current_project(self, name) -> None:
+        with self._tx():
+            self._set_meta("current_project", name)
+        self.export_json()
+
+    def add_context(self, project: str, context: str, files=()) -> None:
+        """註冊 context（通常是新的 coped 專案），可同時寫入初始 selection"""
+        with self._tx():
+            ctx_id = self._context_id(project, context, create=True)
+            self._sync_selected(ctx_id, files)
+        self.export_json()
+        self._changed(project)
+
+    def delete_context(self, project: str, context: str) -> None:
+        with self._tx():
+            self._conn.execute(
+                "DELETE FROM contexts WHERE project = ? AND name = ?", (project, context))
+        self.export_json()
+        self._changed(project)
+
+    # ========================
+    # Change notifications
+    # ========================
+
+    def version(self, project: str) -> int:
+        """專案資料的版本號（每次寫入後遞增，用於判斷快取是否過期）"""
+        with self._lock:
+            return self._versions.setdefault(project, 0)
+
+    def subscribe(self, callback) -> None:
+        """
+        註冊變動通知
+
+        Args:
+            callback: callback(project)，project 為 None 表示所有專案都可能變動
+        """
+        with self._lock:
+            self._listeners.append(callback)
+
+    def unsubscribe(self, callback) -> None:
+        with self._lock:
+            if callback in self._listeners:
+                self._listeners.remove(callback)
+
+    # ========================
+    # data.json migration / mirror
+    # ========================
+
+    def migrate_from_json(self) -> bool:
+        """
+        一次性從舊的 data.json 匯入（原檔備份為 data.json.migrated）
+
+        Returns:
+            True if a migration happened
+        """
+        with self._lock:
+            if self._get_meta("schema_version") is not None:
+                return False
+            data = None
+            if os.path.exists(self.json_path):
+                try:
+                    with open(self.json_path, "r", encoding="utf-8") as f:
+                        data = json.load(f)
+                except (OSError, json.JSONDecodeError):
+                    data = None
+
+            with self._tx():
+                if data:
+                    for info in data.get("projects", {}).values():
+                        _upgrade_legacy_selection(info)
+                    self._set_meta("schema_version", str(SCHEMA_VERSION))
+                    self._save_data_in_tx(data)
+                else:
+                    self._set_meta("schema_version", str(SCHEMA_VERSION))
+
+            if data:
+                backup = self.json_path + ".migrated"
+                if not os.path.exists(backup):
+                    shutil.copy2(self.json_path, backup)
+                self.export_json()
+                return True
+            return False
+
+    def _save_data_in_tx(self, data: dict) -> None:
+        # Same as save_data() minus the transaction / mirror (used by the migrator)
+        for name, info in data.get("projects", {}).items():
+            self._upsert_project(name, info)
+            sections = {KIND_ORIGIN: info.get("origin") or {}, KIND_SHADOW: info.get("shadow") or {}}
+            sections.update(info.get("coped") or {})
+            for ctx_name, section in sections.items():
+                ctx_id = self._context_id(name, ctx_name, create=True)
+                self._sync_selected(ctx_id, section.get("selected_files", []))
+        self._set_meta("current_project", data.get("current_project"))
+
+    def export_json(self) -> None:
+        """將專案 metadata 以 atomic rename 寫入 data.json（供 VS Code extension 讀取）"""
+        data = self.load_data(include_selection=False)
+        tmp = self.json_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        os.replace(tmp, self.json_path)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT/ROLLBACK, re-entrant within one thread."""
+
+    def __init__(self, conn, lock):
+        self.conn = conn
+        self.lock = lock
+        self.outer = False
+
+    def __enter__(self):
+        self.lock.acquire()
+        self.outer = not self.conn.in_transaction
+        if self.outer:
+            self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if self.outer:
+                self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self.lock.release()
+        return False
+
+
+def _upgrade_legacy_selection(info: dict) -> None:
+    """Old schema kept absolute paths in proj["selected_files"]; fold them into origin."""
+    legacy = info.pop("selected_files", None)
+    if not legacy:
+        return
+    base = info.get("path") or ""
+    origin = info.setdefault("origin", {}).setdefault("selected_files", [])
+    for f in legacy:
+        rel = f
+        if base and os.path.isabs(f):
+            try:
+                rel = os.path.relpath(f, base)
+            except ValueError:
+                rel = f
+            if rel.startswith(".."):
+                rel = f
+        if rel not in origin:
+            origin.append(rel)
+
+
+# ========================
+# Shared instance
+# ========================
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> ProjectStore:
+    """取得共用的 ProjectStore（第一次呼叫時開啟 file/data.db，必要時自動 migrate）"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ProjectStore()
+        return _store
@@ -0,0 +1,640 @@
+"""
+Prompt Builder for AI Coder Helper (no Qt)
+
+Everything needed to produce chat.txt without a window, shared by the
+Enter window (EnterWindow.generate_chat, through chat_job.GenerateJob) and
+the command line (cli.py):
+
+    resolve_contexts()   source / coped context roots and display names
+    collect_files()      selection rules expanded inside those roots
+    build_sections()     section generators of chat.txt, in order (a map of the
+                         whole source context, see repo_map.py, when on; Python files
+                         sliced to the task's symbols, see symbol_slice.py, compacted,
+                         see compact.py, and trimmed to a token budget, see
+                         token_budget.py, when on)
+    iter_diff_report()   per-file diff blocks (Source -> Coped)
+    generate()           all of the above, written through a ChatWriter
+
+chat.txt layout:
+
+    prompt.txt (or a fallback)
+    # Task Description            project names, skipped / dedup / slicing / compaction / token budget
+                                  summary, the user's task
+    # Repository Map (Context: x)  directory tree + top-level signatures (when on)
+    # Source Files (Context: x)   "## rel" + numbered code per file
+    # Shadow Files (Context: y)   "## (Shadow) rel" + numbered code per file; a file also in
+                                  Source is only referenced (identical) or given as changes
+    # Diff Report (Source -> Shadow)  "### rel" + its changes per file, fenced (chat_writer.fence_for)
+                                  so changed lines starting with "#" or "```" stay content
+
+The optional stages are imported where they are used, so cli.py commands that
+only resolve contexts (status) do not load them.
+"""
+
+import os
+
+from chat_writer import ChatWriter, Note, Verbatim, fence_for, file_blocks, CHAT_NAME, DEFAULT_WORKERS
+
+# Script directory (coder-main)
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Toggles used when a project has none saved
+DEFAULT_TOGGLES = {"source": True, "shadow": True, "diff": True}
+
+
+# ========================
+# Context resolution
+# ========================
+
+class PromptContext:
+    """
+    Resolved contexts of one prompt.
+
+    Attributes:
+        project_name / project_path: origin 專案
+        source_root / coped_root: 兩個 context 的絕對路徑
+        source_name / coped_name: 顯示在 Task Description 的專案名稱
+    """
+
+    def __init__(self, project_name, project_path, source_root, coped_root, source_name, coped_name):
+        self.project_name = project_name
+        self.project_path = project_path
+        self.source_root = source_root
+        self.coped_root = coped_root
+        self.source_name = source_name
+        self.coped_name = coped_name
+
+    @property
+    def chat_path(self) -> str:
+        """chat.txt 位置（origin 專案根目錄，與 Copy Chat.txt 一致）"""
+        return os.path.join(self.project_path, CHAT_NAME)
+
+
+def _absolute_context(path: str, project_path: str) -> str:
+    # If path starts with 'file', it's relative to coder directory (SCRIPT_DIR), not project_path
+    if not os.path.isabs(path):
+        if path.startswith("file" + os.sep) or path.startswith("file/"):
+            path = os.path.join(SCRIPT_DIR, path)
+        else:
+            path = os.path.join(project_path, path)
+    return os.path.abspath(path)
+
+
+def find_project_by_path(target_path: str, project_name: str, project_path: str, data: dict):
+    """
+    由 context 路徑推算顯示用的專案名稱
+
+    Returns:
+        專案名稱；無法判斷時回傳 None
+    """
+    target = os.path.normcase(os.path.abspath(target_path))
+    curr_proj_path_norm = os.path.normcase(os.path.abspath(project_path))
+    file_dir_norm = os.path.normcase(os.path.join(SCRIPT_DIR, "file"))
+
+    # Priority 1: Check Database for EXACT match (Handles nested projects)
+    for name, info in data.get("projects", {}).items():
+        p_path = info.get("path")
+        if p_path:
+            norm_p = os.path.normcase(os.path.abspath(p_path))
+            if norm_p == target:
+                return name
+
+    # Priority 2: Check against Current Project (Root)
+    if target == curr_proj_path_norm:
+        return project_name
+
+    # Priority 3: Coped Folder
+    if target.startswith(file_dir_norm + os.sep):
+        parts = os.path.relpath(target, file_dir_norm).split(os.sep)
+        if len(parts) >= 2:
+            return parts[1]
+        elif len(parts) == 1:
+            return parts[0]
+
+    # Priority 4: Subpath of Current?
+    if target.startswith(curr_proj_path_norm + os.sep):
+        return project_name
+
+    return None
+
+
+def resolve_contexts(project_name: str, data: dict) -> PromptContext:
+    """
+    解析專案的 source / coped context（未設定時 source 為 origin，coped 為 file/shadow）
+
+    Args:
+        project_name: 專案名稱
+        data: load_data() 的結果
+
+    Returns:
+        PromptContext
+    """
+    proj = data["projects"][project_name]
+    project_path = proj["path"]
+    # Track if contexts are explicitly set vs using defaults
+    raw_source_context = proj.get("source_context")
+    raw_coped_context = proj.get("coped_context")
+
+    p_path_norm = os.path.normcase(os.path.abspath(project_path))
+    raw_src_norm = os.path.normcase(os.path.abspath(raw_source_context)) if raw_source_context else None
+    # Source defaults to the origin project
+    source_is_origin = not raw_source_context or raw_src_norm == p_path_norm
+    coped_explicitly_set = bool(raw_coped_context)
+
+    source_root = _absolute_context(raw_source_context or project_path, project_path)
+    coped_root = _absolute_context(raw_coped_context or os.path.join(SCRIPT_DIR, "file", "shadow"), project_path)
+
+    source_name = "[Not Selected]"
+    coped_name = "[Not Selected]"
+    if source_is_origin:
+        source_name = project_name
+    else:
+        source_name = find_project_by_path(source_root, project_name, project_path, data) or source_name
+    if coped_explicitly_set:
+        coped_name = find_project_by_path(coped_root, project_name, project_path, data) or coped_name
+
+    return PromptContext(project_name, project_path, source_root, coped_root, source_name, coped_name)
+
+
+def is_subpath(p: str, r: str) -> bool:
+    """p 是否為 r 本身或在 r 之下（normcase，Windows 不分大小寫）"""
+    r = os.path.normcase(os.path.abspath(r))
+    p = os.path.normcase(os.path.abspath(p))
+    return p == r or p.startswith(os.path.join(r, ""))
+
+
+def collect_files(ctx: PromptContext, sections):
+    """
+    展開選取規則，只保留位於 source / coped context 之內的檔案
+
+    Args:
+        ctx: PromptContext
+        sections: SelectionIndex.sections（[(root, SelectionRules)]）
+
+    Returns:
+        (src_rels, coped_rels)：{rel: 絕對路徑}，rel 相對於各自的 context 根目錄
+    """
+    file_dir = os.path.join(SCRIPT_DIR, "file")
+    roots = (ctx.source_root, ctx.coped_root)
+
+    # Expand selection rules lazily: only sections overlapping the chosen roots are walked
+    abs_selected = set()
+    for section_root, rules in sections:
+        overlaps = any(is_subpath(section_root, r) or is_subpath(r, section_root) for r in roots)
+        if not rules or not overlaps:
+            continue
+        for rel in rules.expand(section_root):
+            abs_p = os.path.normpath(os.path.join(section_root, rel))
+            # Safety check: Allow files under project_path OR under coder's file/ directory
+            rel_to_project = os.path.relpath(abs_p, ctx.project_path)
+            rel_to_file_dir = os.path.relpath(abs_p, file_dir)
+            if not rel_to_project.startswith("..") or not rel_to_file_dir.startswith(".."):
+                abs_selected.add(abs_p)
+
+    # A file may belong to both contexts (when source and coped are the same root)
+    src_rels = {}
+    coped_rels = {}
+    for path in abs_selected:
+        if is_subpath(path, ctx.source_root):
+            src_rels[os.path.relpath(path, ctx.source_root)] = path
+        if is_subpath(path, ctx.coped_root):
+            coped_rels[os.path.relpath(path, ctx.coped_root)] = path
+    return src_rels, coped_rels
+
+
+# ========================
+# Sections (generators of text pieces)
+# ========================
+
+def prompt_section():
+    """1. System Prompt (file/prompt.txt)"""
+    prompt_file = os.path.join(SCRIPT_DIR, "file", "prompt.txt")
+    if not os.path.exists(prompt_file):
+        yield "// Warning: prompt.txt not found.\n"
+        yield "You are Penter AI.\n\n"
+        return
+    try:
+        with open(prompt_file, "r", encoding="utf-8") as f:
+            prompt_text = f.read()
+    except Exception as e:
+        yield f"// Error reading prompt.txt: {e}\n\n"
+        return
+    yield prompt_text
+
+
+def task_section(ctx: PromptContext, user_input: str, toggles: dict, header=()):
+    """2. Task Description Header & Project Context (always output); header: 額外的說明行"""
+    yield "# Task Description\n"
+    yield f"Origin Project: {ctx.project_name}\n"
+    if toggles["diff"] or toggles["source"]:
+        yield f"Source Project: {ctx.source_name}\n"
+    if toggles["diff"] or toggles["shadow"]:
+        yield f"Coped Project: {ctx.coped_name}\n"
+    for line in header:
+        yield line + "\n"
+
+    if user_input:
+        yield "\n" + user_input + "\n\n"
+    else:
+        yield "\n(No manual task description provided)\n\n"
+
+
+def map_section(ctx: PromptContext, text: str):
+    """Repository Map: 整個 source context 的目錄樹與最外層定義（repo_map.RepoMap.render 的結果）"""
+    yield f"# Repository Map (Context: {os.path.basename(ctx.source_root)})\n```\n"
+    yield text
+    yield "```\n\n"
+
+
+def files_section(heading, rels, title_prefix, missing, empty_hint, cache=None, workers=DEFAULT_WORKERS, done=None,
+                  bodies=None):
+    """
+    3./4. 一個 context 的選取檔案：同時讀取、依排序輸出；未變動的檔案使用 block cache
+
+    Args:
+        heading: 區段標題行
+        rels: {rel: 絕對路徑}
+        title_prefix: 每個檔案標題的前綴（"(Shadow) "）
+        missing: 檔案不存在時的說明
+        empty_hint: 沒有選取檔案時的提示
+        cache / workers / done / bodies: 見 chat_writer.file_blocks
+    """
+    yield heading
+    sorted_rels = sorted(rels)
+    if not sorted_rels:
+        yield empty_hint
+    yield from file_blocks([(f"{title_prefix}{rel}", rels[rel], missing) for rel in sorted_rels],
+                           cache, workers, done, bodies)
+
+
+def iter_diff_report(source_root: str, coped_root: str, rels, ranges=None, algorithm: str = None):
+    """
+    Source -> Coped 的差異，每個有變動的檔案產生一個文字區塊（區塊之間以 "\\n" 連接）
+
+    Args:
+        source_root / coped_root: context 根目錄
+        rels: 要比較的相對路徑（依序）
+        ranges: 傳入 dict 時填入 {rel: (source 變動行範圍, coped 變動行範圍)}（token_budget 使用）
+        algorithm: 見 line_diff.opcodes；None 表示 line_diff.DEFAULT_ALGORITHM
+
+    Yields:
+        str: "### rel" 與該檔案的 Replace / Delete / Insert 項目
+    """
+    from line_diff import opcodes, DEFAULT_ALGORITHM
+
+    if algorithm is None:
+        algorithm = DEFAULT_ALGORITHM
+    try:
+        for rel in rels:
+            src_file = os.path.join(source_root, rel)
+            dst_file = os.path.join(coped_root, rel)
+
+            src_lines = []
+            dst_lines = []
+            if os.path.exists(src_file):
+                with open(src_file, 'r', encoding='utf-8') as f: src_lines = f.readlines()
+            if os.path.exists(dst_file):
+                with open(dst_file, 'r', encoding='utf-8') as f: dst_lines = f.readlines()
+
+            file_diffs = []
+            src_ranges = []
+            dst_ranges = []
+            for tag, i1, i2, j1, j2 in opcodes(src_lines, dst_lines, algorithm):
+                if tag != "equal":
+                    src_ranges.append((i1 + 1, max(i1 + 1, i2)))
+                    dst_ranges.append((j1 + 1, max(j1 + 1, j2)))
+                if tag == "replace":
+                    file_diffs.append(f"Line {i1+1}-{i2}: Replace with\n{''.join(dst_lines[j1:j2])}")
+                elif tag == "delete":
+                    file_diffs.append(f"Line {i1+1}-{i2}: Delete")
+                elif tag == "insert":
+                    file_diffs.append(f"Line {i1+1}: Insert\n{''.join(dst_lines[j1:j2])}")
+
+            if file_diffs:
+                if ranges is not None:
+                    ranges[rel] = (src_ranges, dst_ranges)
+                yield "\n".join([f"### {rel}"] + file_diffs)
+    except Exception as e:
+        yield f"Error diffing: {e}"
+
+
+def diff_section(ctx: PromptContext, src_rels: dict, coped_rels: dict, blocks=None):
+    """
+    5. Diff Report: rel paths that exist in BOTH selections (blocks: iter_diff_report 已算好的結果)
+
+    每個區塊的內容（原文的行）以 fence_for 的 fence 包住，內容中的 "# ..." / "```" 行不會被當成結構
+    """
+    sorted_common = sorted(set(src_rels) & set(coped_rels))
+    if not sorted_common:
+        if src_rels or coped_rels:
+            yield "# Diff Report\n(No common files selected between Source and Coped context to compare)\n\n"
+        return
+    if blocks is None:
+        blocks = iter_diff_report(ctx.source_root, ctx.coped_root, sorted_common)
+    first = True
+    for block in blocks:
+        if first:
+            yield "# Diff Report (Source -> Shadow)\n"
+            first = False
+        else:
+            yield "\n"
+        title, sep, body = block.partition("\n")
+        if title.startswith("### ") and sep:
+            fence = fence_for(body)
+            if not body.endswith("\n"):
+                body += "\n"
+            yield f"{title}\n{fence}\n{body}{fence}\n"
+        else:
+            yield block
+    if not first:
+        yield "\n\n"
+
+
+def _file_digest(path: str) -> bytes:
+    import hashlib
+
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.digest()
+
+
+def shadow_dedupe(ctx: PromptContext, src_rels: dict, coped_rels: dict, reported=None):
+    """
+    兩邊都有選取的檔案：shadow 與 source 內容相同（content hash）時改為一行參照，
+    不同時只輸出對 source 的差異，不再重複整份檔案
+
+    Args:
+        ctx: PromptContext
+        src_rels / coped_rels: collect_files 的結果
+        reported: Diff Report 中有區塊的 rel（差異只在那裡出現一次）；None 表示不輸出 Diff Report
+
+    Returns:
+        (bodies, identical, changed)：{"(Shadow) rel": 內容或 Note} 與兩種檔案的數量
+    """
+    bodies = {}
+    identical = changed = 0
+    for rel in sorted(set(src_rels) & set(coped_rels)):
+        src, dst = src_rels[rel], coped_rels[rel]
+        try:
+            same = os.path.getsize(src) == os.path.getsize(dst) and (
+                os.path.samefile(src, dst) or _file_digest(src) == _file_digest(dst))
+        except OSError:
+            continue   # missing on one side: rendered as before
+        title = f"(Shadow) {rel}"
+        if same:
+            bodies[title] = Note(f"identical to source `{rel}`")
+            identical += 1
+        elif reported is not None:
+            if rel in reported:
+                bodies[title] = Note(f"changed from source `{rel}`, see Diff Report")
+                changed += 1
+        else:
+            block = next(iter_diff_report(ctx.source_root, ctx.coped_root, [rel]), None)
+            if block is not None and block.startswith("### "):
+                bodies[title] = Verbatim(f"(changes against source `{rel}`)\n" + block.split("\n", 1)[1])
+                changed += 1
+        # Anything else (line endings only, not UTF-8, diff error) keeps the full body
+    return bodies, identical, changed
+
+
+def build_sections(ctx: PromptContext, sections, user_input: str, toggles: dict,
+                   cache=None, workers: int = DEFAULT_WORKERS, done=None, budget=None, model=None,
+                   symbols=None, dedupe=True, limits=None, compact=None,
+                   repo_map=None, map_tokens=None):
+    """
+    chat.txt 的所有區段（依輸出順序）
+
+    Args:
+        ctx: PromptContext
+        sections: SelectionIndex.sections
+        user_input: 任務描述
+        toggles: {"source", "shadow", "diff"} -> bool
+        cache: block_cache.BlockCache 或 None
+        workers: 同時讀取檔案的執行緒數
+        done: 每個檔案區塊輸出後呼叫 done(path)
+        budget: token 上限；None 表示不裁剪
+        model: 目標模型（只用於預算說明）
+        symbols: None 表示不做 slicing；否則 Python 檔案只保留這些名稱與任務描述中提到的定義
+        dedupe: Source 與 Shadow 都輸出時，兩邊都有的 shadow 檔案改為參照或差異（見 shadow_dedupe）
+        limits: (max_file_size, max_line_length)，見 file_sniff.sniff；None 表示預設值
+        compact: compact.Compactor；檔案內容改為壓縮後的版本（取代 cache），None 表示不壓縮
+        repo_map: repo_map.RepoMap；None 表示不輸出 Repository Map（呼叫端負責 save()）
+        map_tokens: Repository Map 的估計 token 上限；None 表示 repo_map.DEFAULT_MAP_TOKENS
+
+    Returns:
+        (chat_sections, paths)：section generator 清單與會輸出的檔案路徑
+    """
+    from file_sniff import sniff, summary, DEFAULT_MAX_SIZE, DEFAULT_MAX_LINE
+
+    if limits is None:
+        limits = (DEFAULT_MAX_SIZE, DEFAULT_MAX_LINE)
+    src_rels, coped_rels = collect_files(ctx, sections)
+    src_heading = f"# Source Files (Context: {os.path.basename(ctx.source_root)})\n"
+    coped_heading = f"# Shadow Files (Context: {os.path.basename(ctx.coped_root)})\n"
+
+    prompt = prompt_section()
+    header = []
+    bodies = {}
+    # Built now (not lazily): its size counts against the token budget
+    map_text = repo_map.render(ctx.source_root, map_tokens) if repo_map is not None else None
+
+    # Binary / huge / generated files: one line each and never read again (see file_sniff.py)
+    skipped = {}
+    for prefix, rels, used in (("", src_rels, toggles["source"]), ("(Shadow) ", coped_rels, toggles["shadow"])):
+        if not used and not toggles["diff"]:
+            continue
+        for rel in sorted(rels):
+            result = sniff(rels[rel], *limits)
+            if result is not None:
+                bodies[prefix + rel] = Note(summary(rels[rel], *result))
+                skipped[prefix + rel] = result[0]
+    src_rels_all, coped_rels_all = src_rels, coped_rels
+    if skipped:
+        src_rels = {rel: path for rel, path in src_rels.items() if rel not in skipped}
+        coped_rels = {rel: path for rel, path in coped_rels.items() if f"(Shadow) {rel}" not in skipped}
+        kinds = sorted(set(skipped.values()))
+        counts = ", ".join(f"{sum(1 for k in skipped.values() if k == kind)} {kind}" for kind in kinds)
+        header.append(f"Skipped Files: {len(skipped)} ({counts})")
+
+    common = set(src_rels) & set(coped_rels)
+    dedupe = dedupe and toggles["source"] and toggles["shadow"] and bool(common)
+    diff_blocks = None
+    ranges = {}
+    if toggles["diff"] and common and (budget or dedupe):
+        # Computed once: the budget and the dedup both need to know which files changed
+        diff_blocks = list(iter_diff_report(ctx.source_root, ctx.coped_root, sorted(common), ranges))
+    if dedupe:
+        dedupe_bodies, identical, changed = shadow_dedupe(ctx, src_rels, coped_rels,
+                                                          set(ranges) if diff_blocks is not None else None)
+        bodies.update(dedupe_bodies)
+        if identical or changed:
+            header.append(f"Shadow Files: {identical} identical to source (referenced), "
+                          f"{changed} changed (shown as changes only)")
+    if symbols is not None:
+        from symbol_slice import slice_files, task_symbols, task_words
+
+        files = []
+        if toggles["source"]:
+            files.extend((rel, src_rels[rel]) for rel in sorted(src_rels))
+        if toggles["shadow"]:
+            files.extend((f"(Shadow) {rel}", coped_rels[rel]) for rel in sorted(coped_rels)
+                         if f"(Shadow) {rel}" not in bodies)
+        sliced_bodies, sliced, matched = slice_files(files, set(symbols) | task_symbols(user_input),
+                                                     task_words(user_input))
+        bodies.update(sliced_bodies)
+        if sliced:
+            line = f"Python Slicing: {matched} of {sliced} files cut to matching definitions"
+            if sliced > matched:
+                line += f", {sliced - matched} outlined"
+            if symbols:
+                line += f" (symbols: {', '.join(sorted(symbols))})"
+            header.append(line)
+    if compact is not None:
+        from compact import NOTE as COMPACT_NOTE
+        # Compacted bodies are rendered by the loader threads instead of the block cache
+        cache = compact
+        header.append(COMPACT_NOTE)
+    if budget:
+        from token_budget import (
+            BudgetItem, plan_budget, estimate_tokens, PRIORITY_DIFF, PRIORITY_SHADOW, PRIORITY_SOURCE,
+        )
+
+        # The prompt and the diff report are never trimmed: render them first to know what is left
+        prompt_text = "".join(prompt)
+        prompt = (text for text in (prompt_text,))   # sections are generators (GenerateJob closes them)
+        fixed = [prompt_text, user_input, "".join(task_section(ctx, "", toggles)), src_heading, coped_heading,
+                 "".join(map_section(ctx, map_text)) if map_text is not None else ""]
+        fixed.extend(bodies[title] for title in skipped)
+        fixed_tokens = sum(map(estimate_tokens, fixed)) + sum(map(estimate_tokens, diff_blocks or ()))
+
+        def item_body(title, path):
+            # Sliced / compacted bodies are what gets trimmed, not the whole file
+            body = bodies.get(title)
+            if body is None and compact is not None:
+                body = compact.render(path)
+            return body
+
+        items = []
+        if toggles["source"]:
+            for rel in sorted(src_rels):
+                priority = PRIORITY_DIFF if rel in common else PRIORITY_SOURCE
+                items.append(BudgetItem(rel, src_rels[rel], priority, ranges.get(rel, ((), ()))[0],
+                                        item_body(rel, src_rels[rel])))
+        if toggles["shadow"]:
+            for rel in sorted(coped_rels):
+                priority = PRIORITY_DIFF if rel in common else PRIORITY_SHADOW
+                title = f"(Shadow) {rel}"
+                items.append(BudgetItem(title, coped_rels[rel], priority, ranges.get(rel, ((), ()))[1],
+                                        item_body(title, coped_rels[rel])))
+        budget_plan = plan_budget(items, budget, fixed_tokens + sum(map(estimate_tokens, header)), user_input, model)
+        header.extend(budget_plan.summary_lines())
+        bodies.update(budget_plan.bodies)
+
+    chat_sections = [prompt, task_section(ctx, user_input, toggles, header)]
+    if map_text is not None:
+        chat_sections.append(map_section(ctx, map_text))
+    paths = []
+    if toggles["source"]:
+        chat_sections.append(files_section(
+            src_heading, src_rels_all, "",
+            "File not found in Source Context",
+            "(No files selected in Source Context. Hint: Ensure you selected files from the **Source Project** tree in Console.)\n\n",
+            cache, workers, done, bodies))
+        paths.extend(src_rels_all.values())
+    if toggles["shadow"]:
+        chat_sections.append(files_section(
+            coped_heading, coped_rels_all, "(Shadow) ",
+            "File not found in Coped Context",
+            "(No files selected in Coped Context. Hint: Ensure you selected files from the **Coped Project** tree in Console.)\n\n",
+            cache, workers, done, bodies))
+        paths.extend(coped_rels_all.values())
+    if toggles["diff"]:
+        chat_sections.append(diff_section(ctx, src_rels, coped_rels, diff_blocks))
+    return chat_sections, paths
+
+
+def project_toggles(proj: dict) -> dict:
+    """專案儲存的 toggles（缺少的項目預設為開啟）"""
+    toggles = dict(DEFAULT_TOGGLES)
+    toggles.update(proj.get("toggles") or {})
+    return toggles
+
+
+def generate(project_name: str, data: dict, user_input: str = "", toggles=None,
+             chat_path=None, workers=None, cache=True, model=None, budget=None,
+             slice_python=None, symbols=None, dedupe=None, compact=None, repo_map=None) -> int:
+    """
+    在目前的執行緒產生 chat.txt（命令列使用；視窗使用 chat_job.GenerateJob）
+
+    Args:
+        project_name: 專案名稱
+        data: load_data() 的結果
+        user_input: 任務描述
+        toggles: None 表示使用專案儲存的 toggles
+        chat_path: 輸出路徑；None 表示 <project>/chat.txt
+        workers: 同時讀取檔案的執行緒數；None 表示專案設定（load_workers）或預設值
+        cache: 是否使用 block cache
+        model / budget: 目標模型與 token 上限；None 表示專案設定（target_model / token_budget）
+        slice_python / symbols: 是否做 Python slicing 與指定的名稱；None 表示專案設定（slice_python / slice_symbols）
+        dedupe: shadow 檔案改為參照 / 差異；None 表示專案設定（dedupe_shadow，預設開啟）
+        compact: 是否壓縮檔案內容；None 表示專案設定（compact）。也可以傳入 compact.Compactor，
+            產生後由它的 report() 取得各檔案節省的 token 數
+        repo_map: 是否輸出 Repository Map；None 表示專案設定（repo_map，上限為 repo_map_tokens）
+
+    Returns:
+        寫入的字元數
+    """
+    from selection_index import get_selection_index
+    from token_budget import budget_for
+    from file_sniff import project_limits
+
+    proj = data["projects"][project_name]
+    ctx = resolve_contexts(project_name, data)
+    if toggles is None:
+        toggles = project_toggles(proj)
+    if workers is None:
+        workers = proj.get("load_workers") or DEFAULT_WORKERS
+    if model is None:
+        model = proj.get("target_model")
+    if budget is None:
+        budget = proj.get("token_budget")
+    if slice_python is None:
+        slice_python = bool(proj.get("slice_python"))
+    if symbols is None:
+        symbols = proj.get("slice_symbols") or []
+    if dedupe is None:
+        dedupe = proj.get("dedupe_shadow", True)
+    if compact is None:
+        compact = bool(proj.get("compact"))
+    if compact is True:
+        from compact import Compactor
+        compact = Compactor()
+    if repo_map is None:
+        repo_map = bool(proj.get("repo_map"))
+    if repo_map:
+        from repo_map import get_repo_map
+        repo_map = get_repo_map(project_name)
+    block_cache = None
+    if cache:
+        from block_cache import get_block_cache
+        block_cache = get_block_cache(project_name)
+
+    sections = get_selection_index(project_name).sections
+    chat_sections, _ = build_sections(ctx, sections, user_input, toggles, block_cache, workers,
+                                      budget=budget_for(model, budget), model=model,
+                                      symbols=symbols if slice_python else None, dedupe=dedupe,
+                                      limits=project_limits(proj), compact=compact or None,
+                                      repo_map=repo_map or None,
+                                      map_tokens=proj.get("repo_map_tokens"))
+    if repo_map:
+        repo_map.save()
+    try:
+        with ChatWriter(chat_path or ctx.chat_path) as writer:
+            for section in chat_sections:
+                writer.write_all(section)
+    finally:
+        if block_cache is not None:
+            block_cache.save()
+    return writer.chars
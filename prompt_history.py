@@ -0,0 +1,295 @@
+"""
+Prompt History for AI Coder Helper (no Qt)
+
+Every chat.txt is snapshotted into file/<project>/.coder-history/ right
+after it is generated (cli.cmd_generate, the Enter window):
+
+    objects/ab/cdef...      one zlib-compressed block per content hash
+                            (blake2b): the prompt, the task description and
+                            every "## rel" file / "### rel" diff block
+    manifests/<id>.json     one per generation: time, size, first task line
+                            and the hashes of its blocks, in order
+
+A file that did not change between generations is the same block, so
+hundreds of versions of a large selection cost one copy of each distinct
+block plus a small manifest each.  A past prompt is rebuilt by writing its
+blocks in order (read_entry / restore), in O(size).
+
+Only the newest "history_limit" (per-project field, default HISTORY_LIMIT,
+0: no history) generations are kept; blocks no manifest refers to are
+removed when older manifests are.
+"""
+
+import os
+import json
+import time
+import zlib
+import threading
+
+# Script directory (coder-main)
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Folder under file/<project>/ (never listed as a coped project; coped project names
+# cannot start with ".", so it cannot clash with one)
+HISTORY_DIR_NAME = ".coder-history"
+
+OBJECTS_DIR = "objects"
+MANIFESTS_DIR = "manifests"
+
+# Default of the per-project "history_limit" field
+HISTORY_LIMIT = 200
+
+# Characters of the task description kept in a manifest
+TASK_PREVIEW = 80
+
+FENCE = "```"
+
+
+def _digest(data: bytes) -> str:
+    import hashlib
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def iter_blocks(path: str):
+    """
+    依區塊切開 chat.txt：每個 "# " / "## " / "### " 標題（不在 ``` 之內）開始一個新區塊
+
+    Yields:
+        str: 區塊文字（依序串接即為原檔）
+    """
+    block = []
+    in_fence = False
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        for line in f:
+            if line.rstrip("\r\n") == FENCE:
+                in_fence = not in_fence
+            elif not in_fence and line.startswith(("# ", "## ", "### ")) and block:
+                yield "".join(block)
+                block = []
+            block.append(line)
+    if block:
+        yield "".join(block)
+
+
+class PromptHistory:
+    """
+    Content-addressed snapshots of one project's chat.txt.
+
+    Args:
+        history_dir: file/<project>/.coder-history
+    """
+
+    def __init__(self, history_dir: str):
+        self.history_dir = history_dir
+        self.objects_dir = os.path.join(history_dir, OBJECTS_DIR)
+        self.manifests_dir = os.path.join(history_dir, MANIFESTS_DIR)
+        self.lock = threading.Lock()
+
+    # ========================
+    # Objects
+    # ========================
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.objects_dir, digest[:2], digest[2:])
+
+    def _store(self, text: str) -> str:
+        data = text.encode("utf-8")
+        digest = _digest(data)
+        path = self._object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path + ".tmp", "wb") as f:
+                f.write(zlib.compress(data))
+            os.replace(path + ".tmp", path)
+        return digest
+
+    def _load(self, digest: str) -> str:
+        with open(self._object_path(digest), "rb") as f:
+            return zlib.decompress(f.read()).decode("utf-8")
+
+    # ========================
+    # Manifests
+    # ========================
+
+    def record(self, chat_path: str, task: str = "", limit: int = HISTORY_LIMIT, **meta):
+        """
+        將 chat.txt 存入歷史（與最新一筆內容相同時不新增）
+
+        Args:
+            chat_path: 剛產生的 chat.txt
+            task: 任務描述（只保留第一行的開頭）
+            limit: 最多保留幾筆（0 表示不保存）
+            meta: 其他寫入 manifest 的欄位（例如 model）
+
+        Returns:
+            entry id；limit 為 0 或無法寫入時回傳 None（不影響已產生的 chat.txt）
+        """
+        if not limit:
+            return None
+        with self.lock:
+            try:
+                return self._record(chat_path, task, limit, meta)
+            except OSError:
+                return None
+
+    def _record(self, chat_path, task, limit, meta):
+        blocks = []
+        chars = 0
+        for block in iter_blocks(chat_path):
+            blocks.append(self._store(block))
+            chars += len(block)
+        latest = self._entries()
+        if latest and self._read_manifest(latest[-1]).get("blocks") == blocks:
+            return latest[-1]
+        now = time.time()
+        # "<time to the millisecond>-<hash>": sorts by time, and after the latest entry
+        stamp = int(now * 1000)
+        while True:
+            prefix = time.strftime("%Y%m%d-%H%M%S", time.localtime(stamp // 1000)) + f".{stamp % 1000:03d}"
+            if not latest or prefix > latest[-1][:len(prefix)]:
+                break
+            stamp += 1
+        entry_id = prefix + "-" + _digest("".join(blocks).encode())[:8]
+        first_line = task.strip().split("\n", 1)[0] if task else ""
+        manifest = {"time": now, "chars": chars, "task": first_line[:TASK_PREVIEW], "blocks": blocks}
+        manifest.update(meta)
+        os.makedirs(self.manifests_dir, exist_ok=True)
+        path = os.path.join(self.manifests_dir, entry_id + ".json")
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(path + ".tmp", path)
+        self._prune(limit)
+        return entry_id
+
+    def _entries(self):
+        """entry id 清單（由舊到新）"""
+        try:
+            names = os.listdir(self.manifests_dir)
+        except OSError:
+            return []
+        return sorted(name[:-5] for name in names if name.endswith(".json"))
+
+    def _read_manifest(self, entry_id: str) -> dict:
+        try:
+            with open(os.path.join(self.manifests_dir, entry_id + ".json"), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def count(self) -> int:
+        """歷史筆數（不讀取 manifest）"""
+        return len(self._entries())
+
+    def entries(self):
+        """
+        歷史清單（由新到舊）
+
+        Returns:
+            [dict]：id、time、chars、task、blocks（區塊數）與其他 manifest 欄位
+        """
+        out = []
+        for entry_id in reversed(self._entries()):
+            manifest = self._read_manifest(entry_id)
+            manifest["blocks"] = len(manifest.get("blocks", ()))
+            manifest["id"] = entry_id
+            out.append(manifest)
+        return out
+
+    def resolve(self, ref: str):
+        """
+        "1"（最新）、"2"（前一筆）… 或 entry id（可只寫開頭）對應的 entry id；找不到時回傳 None
+        """
+        ids = self._entries()
+        if ref.isdigit() and 0 < int(ref) <= len(ids) and len(ref) < 8:
+            return ids[-int(ref)]
+        matches = [entry_id for entry_id in ids if entry_id.startswith(ref)]
+        return matches[-1] if matches else None
+
+    def read_entry(self, entry_id: str):
+        """
+        依序產生一筆歷史的區塊文字
+
+        Raises:
+            KeyError: 沒有這筆歷史
+            OSError: 區塊檔案遺失或損毀
+        """
+        manifest = self._read_manifest(entry_id)
+        if "blocks" not in manifest:
+            raise KeyError(entry_id)
+        for digest in manifest["blocks"]:
+            yield self._load(digest)
+
+    def restore(self, entry_id: str, out_path: str) -> int:
+        """
+        將一筆歷史寫回檔案（先寫入暫存檔，完成後才取代 out_path）
+
+        Returns:
+            寫入的字元數
+        """
+        chars = 0
+        try:
+            with open(out_path + ".tmp", "w", encoding="utf-8", newline="") as f:
+                for text in self.read_entry(entry_id):
+                    f.write(text)
+                    chars += len(text)
+            os.replace(out_path + ".tmp", out_path)
+        finally:
+            if os.path.exists(out_path + ".tmp"):
+                os.remove(out_path + ".tmp")
+        return chars
+
+    def _prune(self, limit: int) -> None:
+        """刪除超過 limit 的舊 manifest 與不再被參照的區塊（呼叫時須持有 lock）"""
+        ids = self._entries()
+        if len(ids) <= limit:
+            return
+        for entry_id in ids[:len(ids) - limit]:
+            try:
+                os.remove(os.path.join(self.manifests_dir, entry_id + ".json"))
+            except OSError:
+                pass
+        used = set()
+        for entry_id in ids[len(ids) - limit:]:
+            used.update(self._read_manifest(entry_id).get("blocks", ()))
+        try:
+            prefixes = os.listdir(self.objects_dir)
+        except OSError:
+            return
+        for prefix in prefixes:
+            folder = os.path.join(self.objects_dir, prefix)
+            try:
+                names = os.listdir(folder)
+            except OSError:
+                continue
+            for name in names:
+                if prefix + name not in used:
+                    try:
+                        os.remove(os.path.join(folder, name))
+                    except OSError:
+                        pass
+
+
+# ========================
+# Shared registry
+# ========================
+
+_histories = {}
+_histories_lock = threading.Lock()
+
+
+def get_history(project_name: str) -> PromptHistory:
+    """
+    取得專案共用的 PromptHistory（file/<project>/.coder-history/）
+
+    Args:
+        project_name: 專案名稱
+
+    Returns:
+        PromptHistory
+    """
+    with _histories_lock:
+        history = _histories.get(project_name)
+        if history is None:
+            history = _histories[project_name] = PromptHistory(
+                os.path.join(SCRIPT_DIR, "file", project_name, HISTORY_DIR_NAME))
+        return history
@@ -0,0 +1,384 @@
+"""
+Repository Map for AI Coder Helper (no Qt)
+
+A compact overview of the whole source context, written to chat.txt before
+the selected files so the model knows what exists beyond the selection:
+
+    tree            every directory and file, from the root's shared fs_index
+                    (.gitignore / .coderignore applied)
+    signatures      top-level def / class of each source file with its line span
+                    ("def load(path) -> dict  12-40"): Python through ast, other
+                    languages through a line lexer (brace matched spans)
+
+The map is kept under a token cap (per-project "repo_map_tokens"): when the
+full map is too large it falls back to names without arguments, then to the
+file tree, then to directories with file counts, shallower and shallower.
+
+Outlines are cached per content hash in file/<project>/.coder-cache/repo_map.json;
+path -> (size, mtime_ns, hash) decides whether a file has to be read at all,
+so refreshing the map after editing one file re-parses only that file.  The
+tree itself is listed again only when the index generation changed.
+"""
+
+import os
+import re
+import ast
+import json
+import hashlib
+import threading
+
+from block_cache import SCRIPT_DIR, CACHE_DIR_NAME
+from chat_writer import CHAT_NAME
+from fs_index import get_index
+from token_budget import estimate_tokens
+
+MAP_NAME = "repo_map.json"
+
+# Default of the per-project "repo_map_tokens" field
+DEFAULT_MAP_TOKENS = 3000
+
+# Files walked at most (the rest is counted, not listed)
+MAX_FILES = 50000
+
+# Source files larger than this are listed without signatures
+OUTLINE_LIMIT = 1 << 20
+
+# Longest signature kept (characters)
+SIGNATURE_WIDTH = 100
+
+PYTHON = (".py", ".pyw", ".pyi")
+BRACE_LANGUAGES = (".js", ".jsx", ".mjs", ".ts", ".tsx", ".go", ".rs", ".java", ".kt", ".cs", ".swift",
+                   ".scala", ".dart", ".php", ".c", ".h", ".cc", ".cpp", ".hpp")
+
+# chat.txt, chat.partNN.txt and chat.txt.tmp written into the project itself are not part of it
+_CHAT_OUTPUT_RE = re.compile(re.escape(os.path.splitext(CHAT_NAME)[0]) + r"(?:\.part\d+)?\.txt(?:\.tmp)?")
+
+# Top-level definitions of the brace languages (at column 0)
+_DEFINITION_RE = re.compile(
+    r"(?:export\s+(?:default\s+)?)?(?:declare\s+)?(?:(?:public|private|protected|internal|abstract|final|"
+    r"sealed|static|data|open|pub(?:\([^)]*\))?|async|unsafe|inline)\s+)*"
+    r"(?:function\*?|class|interface|enum|type|struct|trait|impl|union|record|object|fn|func|mod)\b"
+    r"|(?:export\s+)?(?:const|let|var)\s+[\w$]+\s*=\s*(?:async\s*)?(?:\([^)]*\)|[\w$]+)\s*=>"
+    r"|[A-Za-z_][\w\s\*&:<>,]*?\b(?!(?:if|for|while|switch|return|else)\b)\w+\s*\([^;]*$"
+)
+
+
+# ========================
+# Outlines
+# ========================
+
+def _python_outline(text: str):
+    tree = ast.parse(text.lstrip("\ufeff"))
+    outline = []
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef):
+            bases = ", ".join(ast.unparse(base) for base in node.bases)
+            signature = f"class {node.name}({bases})" if bases else f"class {node.name}"
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            prefix = "async def" if isinstance(node, ast.AsyncFunctionDef) else "def"
+            signature = f"{prefix} {node.name}({ast.unparse(node.args)})"
+            if node.returns is not None:
+                signature += f" -> {ast.unparse(node.returns)}"
+        else:
+            continue
+        start = min([node.lineno] + [d.lineno for d in node.decorator_list])
+        outline.append((node.name, signature, start, node.end_lineno))
+    return outline
+
+
+def _brace_outline(text: str):
+    lines = text.splitlines()
+    outline = []
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        if not line or line[0].isspace() or line.startswith(("//", "/*", "*", "#", "@", "}")) \
+                or not _DEFINITION_RE.match(line):
+            i += 1
+            continue
+        # The span ends where the braces opened on (or after) the header close again
+        depth = 0
+        opened = False
+        end = i
+        for j in range(i, min(len(lines), i + 100000)):
+            depth += lines[j].count("{") - lines[j].count("}")
+            opened = opened or "{" in lines[j]
+            end = j
+            if (opened and depth <= 0) or (not opened and lines[j].rstrip().endswith(";")):
+                break
+            if not opened and j > i + 5:
+                end = i   # a declaration without a body
+                break
+        signature = line.strip().rstrip("{").rstrip()
+        name = re.findall(r"[A-Za-z_$][\w$]*", signature.split("(")[0])
+        outline.append((name[-1] if name else signature, signature, i + 1, end + 1))
+        i = end + 1
+    return outline
+
+
+def outline_text(text: str, path: str):
+    """
+    檔案最外層的定義
+
+    Args:
+        text: 檔案內容
+        path: 檔案路徑（由副檔名決定語言）
+
+    Returns:
+        [(name, signature, start, end)]；不是支援的語言或無法解析時回傳 []
+    """
+    lower = path.lower()
+    try:
+        if lower.endswith(PYTHON):
+            outline = _python_outline(text)
+        elif lower.endswith(BRACE_LANGUAGES):
+            outline = _brace_outline(text)
+        else:
+            return []
+    except (SyntaxError, ValueError, RecursionError):
+        return []
+    return [(name, signature if len(signature) <= SIGNATURE_WIDTH else signature[:SIGNATURE_WIDTH - 3] + "...",
+             start, end) for name, signature, start, end in outline]
+
+
+def _is_source(name: str) -> bool:
+    return name.lower().endswith(PYTHON + BRACE_LANGUAGES)
+
+
+# ========================
+# Map
+# ========================
+
+class RepoMap:
+    """
+    Directory tree and outlines of one project's context root.
+
+    Args:
+        cache_path: repo_map.json 路徑（file/<project>/.coder-cache/repo_map.json）
+
+    Attributes:
+        parsed: 上一次 build 重新解析的檔案數
+    """
+
+    def __init__(self, cache_path: str):
+        self.cache_path = cache_path
+        self.lock = threading.Lock()
+        self.parsed = 0
+        self._files = {}      # abs path -> (size, mtime_ns, digest)
+        self._outlines = {}   # digest -> [(name, signature, start, end)]
+        self._tree = None     # (index, generation, dirs, listing, total) of the last build
+        self._dirty = False
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        self._files = {path: tuple(value) for path, value in data.get("files", {}).items()}
+        self._outlines = {digest: [tuple(item) for item in outline]
+                          for digest, outline in data.get("outlines", {}).items()}
+
+    def _outline(self, path: str, size: int, mtime_ns: int):
+        known = self._files.get(path)
+        if known is not None and known[:2] == (size, mtime_ns) and known[2] in self._outlines:
+            return self._outlines[known[2]]
+        if size > OUTLINE_LIMIT:
+            return []
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return []
+        digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+        outline = self._outlines.get(digest)
+        if outline is None:
+            try:
+                text = data.decode("utf-8")
+            except UnicodeDecodeError:
+                text = ""
+            outline = self._outlines[digest] = outline_text(text, path)
+            self.parsed += 1
+        self._files[path] = (size, mtime_ns, digest)
+        self._dirty = True
+        return outline
+
+    def build(self, root: str):
+        """
+        依 root 的共用檔案索引（fs_index，已套用 ignore 規則）列出目錄樹並取得各原始碼檔案的 outline
+
+        索引的 generation 沒有變動時沿用上一次的目錄樹；各原始碼檔案的 (size, mtime_ns) 與快取相同時不重新解析
+        （檔案內容改變不一定會改變索引，因此仍逐一 stat 原始碼檔案）。
+
+        Returns:
+            (dirs, files, total)：dirs 為 [(rel_dir, depth)]，files 為 {rel_dir: [(name, outline)]}，
+            total 為走訪到的檔案數（超過 MAX_FILES 的部分不列出）
+        """
+        index = get_index(root).ensure()
+        with self.lock:
+            self.parsed = 0
+            tree = self._tree
+        if tree is None or tree[0] is not index or tree[1] != index.generation:
+            tree = (index, index.generation) + self._list(index)
+        _, _, dirs, listing, total = tree
+
+        files = {}
+        seen = set()
+        with self.lock:
+            self._tree = tree
+            for rel_dir, names in listing.items():
+                listed = files[rel_dir] = []
+                for name in names:
+                    outline = []
+                    if _is_source(name):
+                        path = os.path.join(index.root, *rel_dir.split("/"), name)
+                        try:
+                            st = os.stat(path, follow_symlinks=False)
+                        except OSError:
+                            continue
+                        outline = self._outline(path, st.st_size, st.st_mtime_ns)
+                        seen.add(path)
+                    listed.append((name, outline))
+            # Files deleted (or newly ignored) under root are forgotten
+            prefix = os.path.join(index.root, "")
+            for path in [p for p in self._files if p.startswith(prefix) and p not in seen]:
+                del self._files[path]
+                self._dirty = True
+        return dirs, files, total
+
+    @staticmethod
+    def _list(index):
+        """(dirs, {rel_dir: [file name]}, total)，在索引的 lock 內複製（樹狀視窗可能正在 refresh）"""
+        dirs = []
+        listing = {}
+        total = 0
+        with index.lock:
+
+            def walk(rel, depth):
+                nonlocal total
+                rel_dir = rel.replace(os.sep, "/")
+                dirs.append((rel_dir, depth))
+                if not index.is_dir(rel):
+                    return
+                listed = listing[rel_dir] = []
+                subdirs = []
+                for entry in index.listdir(rel):
+                    if entry.is_dir:
+                        subdirs.append(os.path.join(rel, entry.name) if rel else entry.name)
+                        continue
+                    if _CHAT_OUTPUT_RE.fullmatch(entry.name):
+                        continue
+                    total += 1
+                    if total <= MAX_FILES:
+                        listed.append(entry.name)
+                for child in subdirs:
+                    walk(child, depth + 1)
+
+            walk("", 0)
+        return dirs, listing, total
+
+    def render(self, root: str, max_tokens: int = None) -> str:
+        """
+        Repository Map 的內容（不含標題），保持在 max_tokens 以內
+
+        Args:
+            root: context 根目錄
+            max_tokens: 估計 token 上限（0 表示不限制；None 表示 DEFAULT_MAP_TOKENS）
+
+        Returns:
+            說明行 + 以縮排表示的目錄樹
+        """
+        if max_tokens is None:
+            max_tokens = DEFAULT_MAP_TOKENS
+        dirs, files, total = self.build(root)
+        counts = {}
+        for rel_dir, _ in dirs:
+            # Files of the whole subtree, for the directories-only levels
+            n = len(files.get(rel_dir, ()))
+            parts = rel_dir.split("/") if rel_dir else []
+            for k in range(len(parts) + 1):
+                key = "/".join(parts[:k])
+                counts[key] = counts.get(key, 0) + n
+        max_depth = max((depth for _, depth in dirs), default=0)
+        note = f"{total:,} files, {len(dirs) - 1:,} directories" + (
+            f" ({MAX_FILES:,} listed)" if total > MAX_FILES else "")
+
+        levels = [("signatures", None), ("names", None), ("files", None)]
+        levels += [("dirs", depth) for depth in range(max_depth, 0, -1)]
+        text = ""
+        for level, depth in levels:
+            text = self._render(dirs, files, counts, level, depth, note)
+            if not max_tokens or estimate_tokens(text) <= max_tokens:
+                break
+        return text
+
+    @staticmethod
+    def _render(dirs, files, counts, level, depth_limit, note):
+        legend = {"signatures": "top-level definitions with line spans",
+                  "names": "top-level definitions (names) with line spans",
+                  "files": "files only",
+                  "dirs": "directories only, with file counts"}[level]
+        out = [f"({note}; {legend})\n"]
+        for rel_dir, depth in dirs:
+            indent = "  " * depth
+            if rel_dir:
+                if depth_limit is not None and depth > depth_limit:
+                    continue
+                name = rel_dir.rsplit("/", 1)[-1]
+                out.append(f"{'  ' * (depth - 1)}{name}/" + (f" ({counts[rel_dir]} files)\n" if level == "dirs" else "\n"))
+            elif level == "dirs":
+                out.append(f"./ ({len(files.get('', ()))} files here)\n")
+            if level == "dirs":
+                continue
+            for name, outline in files.get(rel_dir, ()):
+                if level == "names" and outline:
+                    spans = ", ".join(f"{item[0]} {item[2]}-{item[3]}" for item in outline)
+                    out.append(f"{indent}{name}: {spans}\n")
+                    continue
+                out.append(f"{indent}{name}\n")
+                if level == "signatures":
+                    out.extend(f"{indent}  {signature}  {start}-{end}\n" for _, signature, start, end in outline)
+        return "".join(out)
+
+    def save(self) -> None:
+        """寫入 repo_map.json（沒有變動時不寫入；只保留仍有檔案參照的 outline）"""
+        with self.lock:
+            if not self._dirty:
+                return
+            used = {value[2] for value in self._files.values()}
+            self._outlines = {digest: outline for digest, outline in self._outlines.items() if digest in used}
+            try:
+                os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+                with open(self.cache_path + ".tmp", "w", encoding="utf-8") as f:
+                    json.dump({"files": self._files, "outlines": self._outlines}, f)
+                os.replace(self.cache_path + ".tmp", self.cache_path)
+            except OSError:
+                return
+            self._dirty = False
+
+
+# ========================
+# Shared registry
+# ========================
+
+_maps = {}
+_maps_lock = threading.Lock()
+
+
+def get_repo_map(project_name: str) -> RepoMap:
+    """
+    取得專案共用的 RepoMap（第一次使用時從 file/<project>/.coder-cache/repo_map.json 載入）
+
+    Args:
+        project_name: 專案名稱
+
+    Returns:
+        RepoMap
+    """
+    with _maps_lock:
+        repo_map = _maps.get(project_name)
+        if repo_map is None:
+            repo_map = _maps[project_name] = RepoMap(
+                os.path.join(SCRIPT_DIR, "file", project_name, CACHE_DIR_NAME, MAP_NAME))
+        return repo_map
@@ -0,0 +1,446 @@
+"""
+Selection Rules for AI Coder Helper
+
+Compact, directory-granular representation of a context's selection.
+Instead of one entry per selected file, a context stores a short list of
+rules relative to its root:
+
+    "./"          whole context
+    "src/"        a directory (and everything below it)
+    "src/main.py" a single file
+    "src/*.py"    glob on names directly inside src/
+    "src/**/*.py" glob on names anywhere below src/
+    "!src/gen/"   exclude (any of the above prefixed with "!")
+
+Rules are kept in a prefix trie keyed by path component, so a membership
+query is O(path depth); expansion to concrete files is lazy (a generator
+over os.scandir) and only happens when the prompt is rendered.  Entries
+ignored by the context's .gitignore / .coderignore (ignore.py) are pruned
+during expansion, even when a rule names them.
+
+Plain relative file paths (the old selected_files format) are valid rules.
+"""
+
+import os
+from fnmatch import fnmatchcase
+
+from ignore import get_ignore
+
+ROOT_RULE = "./"
+EXCLUDE_PREFIX = "!"
+GLOB_CHARS = "*?["
+
+
+def _split(rel: str) -> list:
+    rel = rel.replace("\\", "/")
+    while rel.startswith("./"):
+        rel = rel[2:]
+    return [c for c in rel.split("/") if c and c != "."]
+
+
+def _is_glob(name: str) -> bool:
+    return any(ch in name for ch in GLOB_CHARS)
+
+
+def dir_rule(rel: str) -> str:
+    """將目錄相對路徑轉為 rule（結尾加 /，根目錄為 "./"）"""
+    comps = _split(rel)
+    return "/".join(comps) + "/" if comps else ROOT_RULE
+
+
+def file_rule(rel: str) -> str:
+    """將檔案相對路徑轉為 rule（統一使用 / 分隔）"""
+    return "/".join(_split(rel))
+
+
+class _Node:
+    __slots__ = ("children", "rule", "globs")
+
+    def __init__(self):
+        self.children = {}
+        self.rule = None      # True (include) / False (exclude) / None
+        self.globs = []       # [(pattern, include, recursive)]
+
+
+class SelectionRules:
+    """
+    Selection rules of one context, stored as a prefix trie.
+
+    Precedence: the rule that matches the deepest path component wins;
+    on a tie an exact path rule beats a glob and exclude beats include.
+    """
+
+    def __init__(self, rules=()):
+        self._root = _Node()
+        self._rules = []
+        self._absolute = {}   # normcase(abs) -> include
+        for r in rules:
+            self.add(r)
+
+    # ========================
+    # Building
+    # ========================
+
+    def add(self, rule: str) -> None:
+        """
+        新增一條 rule
+
+        Args:
+            rule: rule 字串（見 module docstring）
+        """
+        if not rule:
+            return
+        self._rules.append(rule)
+        include = True
+        body = rule
+        if body.startswith(EXCLUDE_PREFIX):
+            include = False
+            body = body[len(EXCLUDE_PREFIX):]
+
+        if os.path.isabs(body):
+            self._absolute[os.path.normcase(os.path.normpath(body))] = include
+            return
+
+        comps = _split(body)
+        glob = None
+        recursive = False
+        if comps and _is_glob(comps[-1]):
+            glob = comps.pop()
+            if comps and comps[-1] == "**":
+                comps.pop()
+                recursive = True
+
+        node = self._root
+        for c in comps:
+            node = node.children.setdefault(c, _Node())
+        if glob is None:
+            node.rule = include
+        else:
+            node.globs.append((glob, include, recursive))
+
+    def rules(self) -> list:
+        """回傳 rule 字串清單（可直接存入 project store）"""
+        return list(self._rules)
+
+    def __bool__(self):
+        return bool(self._rules)
+
+    def __len__(self):
+        return len(self._rules)
+
+    # ========================
+    # Queries
+    # ========================
+
+    def is_selected(self, rel: str) -> bool:
+        """
+        判斷相對路徑（檔案或目錄）是否被選取，O(path depth)
+
+        Args:
+            rel: 相對於 context 根目錄的路徑（絕對路徑則比對 absolute rules）
+
+        Returns:
+            True if selected
+        """
+        if os.path.isabs(rel):
+            return self._absolute.get(os.path.normcase(os.path.normpath(rel)), False)
+
+        comps = _split(rel)
+        best = None           # (depth, exact, exclude) of the winning rule
+        selected = False
+        rec_globs = []        # recursive globs from ancestors: (pattern, include, start)
+        node = self._root
+        for d in range(len(comps) + 1):
+            if node is not None:
+                if node.rule is not None:
+                    score = (d, 1, not node.rule)
+                    if best is None or score > best:
+                        best, selected = score, node.rule
+                for pat, inc, rec in node.globs:
+                    if rec:
+                        rec_globs.append((pat, inc, d))
+                    elif d < len(comps) and fnmatchcase(comps[d], pat):
+                        score = (d + 1, 0, not inc)
+                        if best is None or score > best:
+                            best, selected = score, inc
+                node = node.children.get(comps[d]) if d < len(comps) else None
+
+        for pat, inc, start in rec_globs:
+            for j in range(len(comps) - 1, start - 1, -1):
+                if fnmatchcase(comps[j], pat):
+                    score = (j + 1, 0, not inc)
+                    if best is None or score > best:
+                        best, selected = score, inc
+                    break
+        return selected
+
+    def may_contain(self, rel_dir: str) -> bool:
+        """
+        目錄底下是否可能有被選取的項目（用於 expand / 目錄剪枝）
+
+        Args:
+            rel_dir: 目錄相對路徑
+
+        Returns:
+            False 表示整個子樹都不會被選取
+        """
+        if self.is_selected(rel_dir):
+            return True
+        node = self._root
+        for c in _split(rel_dir):
+            if any(inc and rec for _, inc, rec in node.globs):
+                return True
+            node = node.children.get(c)
+            if node is None:
+                return False
+        return _has_include(node)
+
+    def covers(self, rel_dir: str) -> bool:
+        """
+        目錄是否整個被選取（已選取且子樹中沒有任何排除 rule）
+
+        Args:
+            rel_dir: 目錄相對路徑
+
+        Returns:
+            True 表示底下所有檔案都被選取，不必逐一判斷
+        """
+        if not self.is_selected(rel_dir):
+            return False
+        node = self._root
+        for c in _split(rel_dir):
+            if any(not inc and rec for _, inc, rec in node.globs):
+                return False
+            node = node.children.get(c)
+            if node is None:
+                return True
+        return not _has_exclude(node)
+
+    # ========================
+    # Lazy expansion
+    # ========================
+
+    def expand(self, base: str, ignore=None):
+        """
+        展開為實際存在的檔案（generator，呼叫時才掃描磁碟）
+
+        Args:
+            base: context 根目錄絕對路徑
+            ignore: ignore.IgnoreMatcher（預設為 get_ignore(base)）
+
+        Yields:
+            相對路徑（os.sep 分隔）；absolute rules 以絕對路徑回傳
+        """
+        for abs_path, include in self._absolute.items():
+            if include and os.path.isfile(abs_path):
+                yield abs_path
+        if not self._rules:
+            return
+        if ignore is None:
+            ignore = get_ignore(base)
+        yield from self._expand_dir(base, [], self._root, ignore.ignored)
+
+    def _expand_dir(self, base, comps, node, ignored):
+        dir_abs = os.path.join(base, *comps) if comps else base
+        rel_dir = "/".join(comps)
+        dir_selected = self.is_selected(rel_dir)
+
+        if node is not None and not dir_selected and not node.globs and not _has_rec_include(self, comps):
+            # Only explicit paths below: visit them directly instead of listing the dir
+            for name in sorted(node.children):
+                child = node.children[name]
+                child_abs = os.path.join(dir_abs, name)
+                child_comps = comps + [name]
+                child_rel = "/".join(child_comps)
+                if os.path.isdir(child_abs):
+                    if not ignored(child_rel, True) and self.may_contain(child_rel):
+                        yield from self._expand_dir(base, child_comps, child, ignored)
+                elif os.path.isfile(child_abs) and self.is_selected(child_rel) and not ignored(child_rel, False):
+                    yield os.sep.join(child_comps)
+            return
+
+        try:
+            entries = sorted(os.scandir(dir_abs), key=lambda e: e.name)
+        except OSError:
+            return
+        for entry in entries:
+            child_comps = comps + [entry.name]
+            child_rel = "/".join(child_comps)
+            child_node = node.children.get(entry.name) if node is not None else None
+            if entry.is_dir(follow_symlinks=False):
+                if not ignored(child_rel, True) and self.may_contain(child_rel):
+                    yield from self._expand_dir(base, child_comps, child_node, ignored)
+            elif self.is_selected(child_rel) and not ignored(child_rel, False):
+                yield os.sep.join(child_comps)
+
+
+def _has_include(node) -> bool:
+    stack = [node]
+    while stack:
+        n = stack.pop()
+        if n.rule is True or any(inc for _, inc, _ in n.globs):
+            return True
+        stack.extend(n.children.values())
+    return False
+
+
+def _has_exclude(node) -> bool:
+    stack = [node]
+    while stack:
+        n = stack.pop()
+        if n.rule is False or any(not inc for _, inc, _ in n.globs):
+            return True
+        stack.extend(n.children.values())
+    return False
+
+
+def _has_rec_include(rules: SelectionRules, comps) -> bool:
+    node = rules._root
+    for c in [None] + list(comps):
+        if c is not None:
+            node = node.children.get(c)
+            if node is None:
+                return False
+        if any(inc and rec for _, inc, rec in node.globs):
+            return True
+    return False
+
+
+# ========================
+# Section helpers
+# ========================
+
+def load_section_rules(project_name: str, project_path: str, proj: dict, file_dir: str) -> list:
+    """
+    建立 origin 與所有 coped 的 (根目錄, SelectionRules) 清單
+
+    Args:
+        project_name: 專案名稱
+        project_path: Origin 專案絕對路徑
+        proj: data["projects"][project_name]
+        file_dir: file/{project_name} 的絕對路徑
+
+    Returns:
+        [(root, SelectionRules)]，根目錄較長者在前（巢狀時優先比對 coped）
+    """
+    sections = [(os.path.normpath(project_path),
+                 SelectionRules(proj.get("origin", {}).get("selected_files", [])))]
+    for coped_name, coped_data in proj.get("coped", {}).items():
+        sections.append((os.path.normpath(os.path.join(file_dir, coped_name)),
+                         SelectionRules(coped_data.get("selected_files", []))))
+    sections.sort(key=lambda s: len(s[0]), reverse=True)
+    return sections
+
+
+def section_is_selected(sections: list, full_path: str) -> bool:
+    """判斷絕對路徑在所屬 section 中是否被選取"""
+    full_path = os.path.normpath(full_path)
+    for root, rules in sections:
+        try:
+            rel = os.path.relpath(full_path, root)
+        except ValueError:
+            continue
+        if not rel.startswith(".."):
+            return rules.is_selected(rel if rel != "." else "")
+    return False
+
+
+def rebase_rules(rules, sub_rel: str) -> list:
+    """
+    將 rules 改為以子目錄為根（用於從子目錄建立 coped 專案）
+
+    Args:
+        rules: 原 context 的 rule 清單
+        sub_rel: 子目錄相對於原 context 根目錄的路徑（"." 表示根目錄本身）
+
+    Returns:
+        以子目錄為根的 rule 清單
+    """
+    prefix = _split(sub_rel)
+    if not prefix:
+        return [r for r in rules if not os.path.isabs(r.lstrip(EXCLUDE_PREFIX))]
+
+    out = [ROOT_RULE] if SelectionRules(rules).is_selected("/".join(prefix)) else []
+    for rule in rules:
+        neg = rule.startswith(EXCLUDE_PREFIX)
+        body = rule[len(EXCLUDE_PREFIX):] if neg else rule
+        if os.path.isabs(body):
+            continue
+        comps = _split(body)
+        if len(comps) > len(prefix) and comps[:len(prefix)] == prefix:
+            rest = "/".join(comps[len(prefix):]) + ("/" if body.endswith("/") else "")
+        elif len(comps) >= 2 and comps[-2] == "**" and prefix[:len(comps) - 2] == comps[:-2]:
+            rest = "**/" + comps[-1]
+        else:
+            continue
+        out.append((EXCLUDE_PREFIX if neg else "") + rest)
+    return out
+
+
+# ========================
+# Aggregated counts (tri-state display without expanding)
+# ========================
+
+def count_selected(index, rules: SelectionRules) -> dict:
+    """
+    以檔案索引計算每個目錄底下的 (檔案總數, 已選取數)（被 ignore 的項目不在索引中）
+
+    Args:
+        index: fs_index.FsIndex（已 refresh）
+        rules: 該 context 的 SelectionRules
+
+    Returns:
+        {rel_dir: (total, selected)}，rel_dir 以 os.sep 分隔，根目錄為 ""
+    """
+    counts = {}
+    NONE, SOME, ALL = 0, 1, 2
+
+    def visit(rel, mode):
+        if mode == SOME and rules.covers(rel):
+            mode = ALL
+        total = selected = 0
+        for e in index.listdir(rel):
+            if e.is_dir:
+                child = os.path.join(rel, e.name) if rel else e.name
+                child_mode = mode
+                if mode == SOME and not rules.may_contain(child):
+                    child_mode = NONE
+                t, s = visit(child, child_mode)
+                total += t
+                selected += s
+            else:
+                total += 1
+                if mode == ALL or (mode == SOME and rules.is_selected(os.path.join(rel, e.name) if rel else e.name)):
+                    selected += 1
+        counts[rel] = (total, selected)
+        return total, selected
+
+    visit("", SOME if rules else NONE)
+    return counts
+
+
+def compact_selection(index, counts: dict, rules: SelectionRules, rel: str = "") -> list:
+    """
+    將 rel 子樹目前的選取狀態轉為最精簡的 rule 清單（全選的目錄只輸出一條 dir rule）
+
+    Args:
+        index: fs_index.FsIndex
+        counts: count_selected() 的結果
+        rules: 該 context 的 SelectionRules
+        rel: 起始目錄相對路徑
+
+    Returns:
+        rule 清單
+    """
+    out = []
+    for e in index.listdir(rel):
+        child = os.path.join(rel, e.name) if rel else e.name
+        if e.is_dir:
+            total, selected = counts.get(child, (0, 0))
+            if (total and selected == total) or (not total and rules.is_selected(child)):
+                out.append(dir_rule(child))
+            elif selected:
+                out.extend(compact_selection(index, counts, rules, child))
+        elif rules.is_selected(child):
+            out.append(file_rule(child))
+    return out
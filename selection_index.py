@@ -0,0 +1,157 @@
+"""
+Selection Index for AI Coder Helper
+
+One SelectionIndex per project, shared by the tree windows and prompt
+generation.  It is built once per project state version (see
+ProjectStore.version) and dropped as soon as the store reports a change,
+so callers never resolve origin/coped selected_files themselves.
+
+Answers:
+    - which section (origin / coped root) a path belongs to
+    - whether a path is selected
+    - per-directory (total, selected) counts of a section
+"""
+
+import os
+import threading
+
+from project_store import get_store
+from selection import SelectionRules, load_section_rules, count_selected
+
+# Script directory (coder-main)
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class SelectionIndex:
+    """
+    Selection state of one project (origin + all coped contexts).
+
+    Args:
+        project_name: 專案名稱
+        proj: data["projects"][project_name]
+        version: ProjectStore.version(project_name) at build time
+    """
+
+    def __init__(self, project_name: str, proj: dict, version: int = 0):
+        self.project_name = project_name
+        self.project_path = os.path.normpath(proj["path"])
+        self.file_dir = os.path.join(SCRIPT_DIR, "file", project_name)
+        self.version = version
+        # [(root, SelectionRules)], longest root first
+        self.sections = load_section_rules(project_name, proj["path"], proj, self.file_dir)
+        self._by_root = {os.path.normcase(root): (root, rules) for root, rules in self.sections}
+        self._contexts = {"origin": self.project_path}
+        for coped_name in proj.get("coped", {}):
+            self._contexts[coped_name] = os.path.normpath(os.path.join(self.file_dir, coped_name))
+        self._counts = {}   # normcase(root) -> (index generation, counts)
+        self._lock = threading.Lock()
+
+    # ========================
+    # Sections
+    # ========================
+
+    def section_of(self, full_path: str):
+        """
+        取得路徑所屬的 section
+
+        Args:
+            full_path: 絕對路徑
+
+        Returns:
+            (root, rel, SelectionRules)；不屬於任何 section 則為 (None, None, None)
+        """
+        path = os.path.normpath(full_path)
+        norm = os.path.normcase(path)
+        for root, rules in self.sections:
+            key = os.path.normcase(root).rstrip(os.sep)
+            if norm == key:
+                return root, "", rules
+            if norm.startswith(key + os.sep):
+                return root, path[len(key) + 1:], rules
+        return None, None, None
+
+    def rules_for_root(self, root: str) -> SelectionRules:
+        """取得某 section 根目錄的 rules（未登記的根目錄回傳空 rules）"""
+        entry = self._by_root.get(os.path.normcase(os.path.normpath(root)))
+        return entry[1] if entry is not None else SelectionRules()
+
+    def rules_for_context(self, context: str):
+        """以 context 名稱（"origin" 或 coped 名稱）取得 rules；不存在則回傳 None"""
+        root = self._contexts.get(context)
+        return self.rules_for_root(root) if root is not None else None
+
+    # ========================
+    # Queries
+    # ========================
+
+    def is_selected(self, full_path: str) -> bool:
+        """判斷絕對路徑在所屬 section 中是否被選取"""
+        root, rel, rules = self.section_of(full_path)
+        return rules.is_selected(rel) if rules is not None else False
+
+    def counts(self, root: str, index) -> dict:
+        """
+        取得 section 的每目錄 (檔案總數, 已選取數)，依檔案索引的 generation 快取
+
+        Args:
+            root: section 根目錄
+            index: 該根目錄的 fs_index.FsIndex（已 refresh）
+
+        Returns:
+            {rel_dir: (total, selected)}
+        """
+        key = os.path.normcase(os.path.normpath(root))
+        with self._lock:
+            cached = self._counts.get(key)
+            if cached is not None and cached[0] == index.generation:
+                return cached[1]
+        counts = count_selected(index, self.rules_for_root(root))
+        with self._lock:
+            self._counts[key] = (index.generation, counts)
+        return counts
+
+
+# ========================
+# Shared registry
+# ========================
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+_subscribed = False
+
+
+def _invalidate(project) -> None:
+    with _indexes_lock:
+        if project is None:
+            _indexes.clear()
+        else:
+            _indexes.pop(project, None)
+
+
+def get_selection_index(project_name: str) -> SelectionIndex:
+    """
+    取得專案共用的 SelectionIndex（store 有變動時自動失效，下次呼叫才重建）
+
+    Args:
+        project_name: 專案名稱
+
+    Returns:
+        SelectionIndex
+    """
+    global _subscribed
+    store = get_store()
+    with _indexes_lock:
+        if not _subscribed:
+            store.subscribe(_invalidate)
+            _subscribed = True
+        index = _indexes.get(project_name)
+        if index is not None and index.version == store.version(project_name):
+            return index
+
+    version = store.version(project_name)
+    proj = store.load_data(project=project_name)["projects"][project_name]
+    index = SelectionIndex(project_name, proj, version)
+    with _indexes_lock:
+        if store.version(project_name) == version:
+            _indexes[project_name] = index
+    return index
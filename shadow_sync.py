@@ -0,0 +1,69 @@
+"""
+Shadow Sync for AI Coder Helper (no Qt)
+
+Copies files of the shadow layer (file/shadow/) back to the origin project,
+keeping their relative paths.  Used by the Sync window (checked files) and
+by "python cli.py sync".
+"""
+
+import os
+import shutil
+
+# Script directory (coder-main)
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SHADOW_ROOT = os.path.join(SCRIPT_DIR, "file", "shadow")
+
+
+def shadow_files(shadow_root: str = SHADOW_ROOT, rels=None):
+    """
+    列出 shadow 中的檔案
+
+    Args:
+        shadow_root: shadow 根目錄
+        rels: 只列出這些相對路徑（檔案或目錄）之下的檔案；None 表示全部
+
+    Returns:
+        排序後的相對路徑清單
+    """
+    out = []
+    starts = [""] if rels is None else [os.path.normpath(r) for r in rels]
+    for start in starts:
+        top = os.path.join(shadow_root, start) if start else shadow_root
+        if os.path.isfile(top):
+            out.append(start)
+            continue
+        for root, dirs, files in os.walk(top):
+            dirs.sort()
+            for name in files:
+                out.append(os.path.relpath(os.path.join(root, name), shadow_root))
+    return sorted(set(out))
+
+
+def sync_to_origin(project_path: str, rels, shadow_root: str = SHADOW_ROOT, dry_run: bool = False):
+    """
+    將 shadow 中的檔案複製回 origin 專案（保留修改時間）
+
+    Args:
+        project_path: origin 專案根目錄
+        rels: 要同步的檔案相對路徑
+        shadow_root: shadow 根目錄
+        dry_run: True 時只回傳會複製的檔案
+
+    Returns:
+        [(shadow_path, dest)]：已（或將會）複製的檔案
+    """
+    copied = []
+    for rel in rels:
+        rel = os.path.normpath(rel)
+        if os.path.isabs(rel) or rel.startswith(".."):
+            continue   # never write outside the project
+        shadow_path = os.path.join(shadow_root, rel)
+        if not os.path.isfile(shadow_path):
+            continue
+        dest = os.path.join(project_path, rel)
+        if not dry_run:
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            shutil.copy2(shadow_path, dest)
+        copied.append((shadow_path, dest))
+    return copied
@@ -0,0 +1,246 @@
+"""
+Python Symbol Slicing for AI Coder Helper (no Qt)
+
+With slicing on, a selected Python file is not sent whole: only the
+definitions the task is about are kept.
+
+    symbols        given by the user (Enter window / cli.py -s) and the names
+                   of the task text that look like code: snake_case,
+                   CamelCase, Class.method, name() or `name`
+    task words     the other words of the task text ("fix foo and Bar") only
+                   count where a def / class of the file has exactly that name,
+                   so ordinary words do not pick unrelated definitions
+    kept           module-level imports, each matching def / class (with its
+                   decorators and the comment lines right above it) and the
+                   header lines of the classes around it
+    no match       an outline: imports and the header line(s) of every
+                   def / class, so the model still sees what the file has
+
+Omitted lines are collapsed into one "~ (lines a-b omitted)" line and the
+kept lines keep their original numbers (chat_writer.numbered_subset), so
+Penter ADD / REMOVE line references still point at the real file.
+
+Outlines come from ast and are cached per content hash (blake2b), so an
+unchanged file is parsed once per process.  Files that do not parse, or
+have no def / class at all, are sent whole.
+"""
+
+import re
+import ast
+import hashlib
+from collections import OrderedDict
+
+from chat_writer import split_lines, numbered_subset
+
+# Outlines kept in memory (per content hash)
+OUTLINE_CACHE_SIZE = 1024
+
+PYTHON_SUFFIXES = (".py", ".pyw", ".pyi")
+
+# Identifiers and dotted names (Class.method) of the task text
+_SYMBOL_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*(?:\.[A-Za-z_][A-Za-z0-9_]*)*")
+
+# `inline code` of the task text (Markdown)
+_CODE_SPAN_RE = re.compile(r"`([^`\n]+)`")
+
+_outlines = OrderedDict()
+
+
+class Definition:
+    """
+    One def / class of an outline (line numbers are 1-based and inclusive).
+
+    Attributes:
+        name / qualname: 名稱與含外層的名稱（"Class.method"）
+        start: 第一行（含 decorator 與上方緊鄰的註解）
+        header_end: 標頭的最後一行（def / class 敘述，可能跨多行）
+        end: 最後一行
+        parent: 外層的 Definition 或 None
+    """
+
+    __slots__ = ("name", "qualname", "start", "header_end", "end", "parent")
+
+    def __init__(self, name, qualname, start, header_end, end, parent):
+        self.name = name
+        self.qualname = qualname
+        self.start = start
+        self.header_end = header_end
+        self.end = end
+        self.parent = parent
+
+
+class Outline:
+    """
+    ast 解析結果：imports 為 [(start, end)]，definitions 為 [Definition]（依出現順序）
+    """
+
+    __slots__ = ("imports", "definitions")
+
+    def __init__(self, imports, definitions):
+        self.imports = imports
+        self.definitions = definitions
+
+
+def is_python(path: str) -> bool:
+    return path.lower().endswith(PYTHON_SUFFIXES)
+
+
+def _code_like(name: str) -> bool:
+    """snake_case、CamelCase 或 "a.b"：不會是一般英文單字"""
+    if "." in name or "_" in name:
+        return True
+    return any(c.islower() for c in name) and any(c.isupper() for c in name[1:])
+
+
+def task_symbols(text: str):
+    """
+    任務描述中看起來是程式名稱的部分（一律保留符合的定義；其他單字見 task_words）
+
+    Returns:
+        set：snake_case、CamelCase、"Class.method"、後面接 "(" 的名稱與 `...` 之內的名稱
+    """
+    text = text or ""
+    symbols = set()
+    for match in _SYMBOL_RE.finditer(text):
+        name = match.group()
+        if _code_like(name) or text.startswith("(", match.end()):
+            symbols.add(name)
+    for span in _CODE_SPAN_RE.findall(text):
+        symbols.update(_SYMBOL_RE.findall(span))
+    return symbols
+
+
+def task_words(text: str):
+    """
+    任務描述中的其他單字（不是 task_symbols 的部分），只在檔案中有同名的 def / class 時才算（見 slice_python）
+
+    Returns:
+        set：識別字形式的單字
+    """
+    text = text or ""
+    return set(_SYMBOL_RE.findall(text)) - task_symbols(text)
+
+
+def _build_outline(text: str, lines) -> Outline:
+    tree = ast.parse(text.lstrip("\ufeff"))
+    imports = [(node.lineno, node.end_lineno) for node in tree.body
+               if isinstance(node, (ast.Import, ast.ImportFrom))]
+    definitions = []
+
+    def visit(body, parent):
+        for node in body:
+            if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                continue
+            start = min([node.lineno] + [d.lineno for d in node.decorator_list])
+            # Comment lines right above belong to the definition
+            while start > 1 and lines[start - 2].lstrip().startswith("#"):
+                start -= 1
+            header_end = max(node.lineno, node.body[0].lineno - 1)
+            qualname = f"{parent.qualname}.{node.name}" if parent else node.name
+            definition = Definition(node.name, qualname, start, header_end, node.end_lineno, parent)
+            definitions.append(definition)
+            visit(node.body, definition)
+
+    visit(tree.body, None)
+    return Outline(imports, definitions)
+
+
+def python_outline(text: str, lines=None):
+    """
+    檔案的 Outline（以內容 hash 快取）
+
+    Args:
+        text: 檔案內容
+        lines: split_lines(text)（已算好時傳入）
+
+    Returns:
+        Outline；無法解析時回傳 None
+    """
+    key = hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+    if key in _outlines:
+        _outlines.move_to_end(key)
+        return _outlines[key]
+    try:
+        outline = _build_outline(text, lines if lines is not None else split_lines(text))
+    except (SyntaxError, ValueError, RecursionError):
+        outline = None
+    _outlines[key] = outline
+    while len(_outlines) > OUTLINE_CACHE_SIZE:
+        _outlines.popitem(last=False)
+    return outline
+
+
+def _matches(definition: Definition, symbols) -> bool:
+    if definition.name in symbols or definition.qualname in symbols:
+        return True
+    return any("." in s and definition.qualname.endswith("." + s) for s in symbols)
+
+
+def slice_python(text: str, symbols, words=frozenset()):
+    """
+    只保留與 symbols 相關的部分
+
+    Args:
+        text: 檔案內容
+        symbols: 要保留的名稱集合（"name" 或 "Class.method"）
+        words: 任務描述的單字（task_words）；只有與此檔案的 def / class 名稱完全相同的才加入 symbols
+
+    Returns:
+        (body, matched)：body 為加上原始行號的內容，matched 為符合的 qualname 清單；
+        無法解析或沒有任何定義時回傳 None
+    """
+    lines = split_lines(text)
+    outline = python_outline(text, lines)
+    if outline is None or not outline.definitions:
+        return None
+    if words:
+        symbols = set(symbols) | (words & {definition.name for definition in outline.definitions})
+    keep = set()
+    for start, end in outline.imports:
+        keep.update(range(start, end + 1))
+    matched = []
+    for definition in outline.definitions:
+        if not _matches(definition, symbols):
+            continue
+        matched.append(definition.qualname)
+        keep.update(range(definition.start, definition.end + 1))
+        parent = definition.parent
+        while parent is not None:
+            keep.update(range(parent.start, parent.header_end + 1))
+            parent = parent.parent
+    if not matched:
+        for definition in outline.definitions:
+            keep.update(range(definition.start, definition.header_end + 1))
+    return numbered_subset(lines, keep), matched
+
+
+def slice_files(files, symbols, words=frozenset()):
+    """
+    對 files 中的 Python 檔案做 slice_python
+
+    Args:
+        files: [(title, path)]
+        symbols: 要保留的名稱集合
+        words: 任務描述的單字，與各檔案的定義名稱取交集（見 slice_python）
+
+    Returns:
+        (bodies, sliced, matched)：{title: 內容}（交給 chat_writer.file_blocks）、
+        處理的檔案數、其中有符合定義的檔案數
+    """
+    bodies = {}
+    matched_files = 0
+    for title, path in files:
+        if not is_python(path):
+            continue
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                text = f.read()
+        except (OSError, UnicodeDecodeError):
+            continue
+        result = slice_python(text, symbols, words)
+        if result is None:
+            continue
+        bodies[title], matched = result
+        if matched:
+            matched_files += 1
+    return bodies, len(bodies), matched_files
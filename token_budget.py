@@ -0,0 +1,357 @@
+"""
+Token Budget for AI Coder Helper (no Qt)
+
+Keeps chat.txt inside the context window of the target model.  The size of
+every selected file is estimated with a fast local tokenizer approximation
+(estimate_tokens, no model vocabulary needed); when the prompt is over the
+budget the files are degraded one level at a time, always in the same order:
+
+    FULL        the whole numbered file
+    REGIONS     changed lines (diff) and lines mentioning the task, +-REGION_CONTEXT
+    SIGNATURES  def / class / function ... lines only
+    PATH        "## title" and a one-line note
+
+Files are ranked by priority (PRIORITY_DIFF: selected in both contexts,
+PRIORITY_SHADOW, PRIORITY_SOURCE); the lowest priority and the largest
+files are degraded first.  Kept lines always show their original line
+numbers, so answers in the Penter format still point at the right lines.
+A file that is already sliced or compacted (BudgetItem.body) is degraded
+from that body, never from the whole file again.
+"""
+
+import os
+import re
+from collections import OrderedDict
+
+from chat_writer import Note, split_lines, numbered_subset, parse_numbered, numbered_entries_subset
+
+# Context windows (tokens) of the models offered in the Enter window
+MODEL_WINDOWS = {
+    "gpt-4o": 128000,
+    "gpt-4o-mini": 128000,
+    "gpt-4.1": 1000000,
+    "gpt-4": 8192,
+    "gpt-3.5-turbo": 16385,
+    "o3-mini": 200000,
+    "claude-3.5-sonnet": 200000,
+    "claude-3-haiku": 200000,
+    "gemini-1.5-pro": 2000000,
+    "gemini-1.5-flash": 1000000,
+    "deepseek-chat": 64000,
+}
+
+# Tokens left free for the answer when the budget comes from a model window (at most a quarter of it)
+RESPONSE_RESERVE = 8192
+
+# Tokens kept free for the budget summary in the Task Description
+SUMMARY_RESERVE = 400
+
+# Lines kept above and below every relevant line (REGIONS level)
+REGION_CONTEXT = 5
+
+# Trimmed files listed one by one in the summary
+SUMMARY_LIMIT = 30
+
+# Estimates kept in memory (per path, size and mtime)
+ESTIMATE_CACHE_SIZE = 4096
+
+# Degradation levels
+FULL, REGIONS, SIGNATURES, PATH = range(4)
+LEVEL_NAMES = {FULL: "full", REGIONS: "regions", SIGNATURES: "signatures", PATH: "path only"}
+
+# Priorities (lower is kept longer)
+PRIORITY_DIFF, PRIORITY_SHADOW, PRIORITY_SOURCE = range(3)
+
+# Roughly one BPE token each: short words, up to 3 digits, runs of spaces, newlines, punctuation
+_TOKEN_RE = re.compile(r"[A-Za-z]{1,6}|\d{1,3}| {2,}|\n|[^\sA-Za-z\d]")
+
+# Tokens added per line by the "   N | " prefix, and per block by "## title" and the fences
+LINE_TOKENS = 3
+BLOCK_TOKENS = 8
+
+_SIGNATURE_RE = re.compile(
+    r"^\s*(?:@\w|(?:async\s+)?def\s|class\s|(?:export\s+)?(?:default\s+)?(?:async\s+)?function\b|"
+    r"(?:export\s+)?(?:abstract\s+)?(?:interface|enum|struct|trait|impl|type)\s+\w|"
+    r"(?:pub(?:\(\w+\))?\s+)?fn\s|func\s|(?:public|private|protected|static)\s[^=;]*\()")
+
+_WORD_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]{2,}")
+
+_STOP_WORDS = frozenset(
+    "the and for with from that this these those into when then than else what which where "
+    "should would could will can not are was were has have had but all any each file files "
+    "code add use make fix new please also only just like more some line lines function class".split())
+
+
+def estimate_tokens(text: str) -> int:
+    """估計文字的 token 數（與常見 BPE tokenizer 的誤差通常在 15% 以內）"""
+    return len(_TOKEN_RE.findall(text))
+
+
+def budget_for(model=None, budget=None):
+    """
+    實際使用的 token 上限
+
+    Args:
+        model: MODEL_WINDOWS 中的模型名稱
+        budget: 指定的上限（優先於 model；0 表示不限制）
+
+    Returns:
+        token 數；沒有限制時回傳 None
+    """
+    if budget is not None:
+        return int(budget) or None
+    if model in MODEL_WINDOWS:
+        window = MODEL_WINDOWS[model]
+        return window - min(RESPONSE_RESERVE, window // 4)
+    return None
+
+
+def task_keywords(text: str):
+    """任務描述中的識別字（小寫，去除常用字），用來找出相關的程式行"""
+    return sorted({w.lower() for w in _WORD_RE.findall(text or "")} - _STOP_WORDS)
+
+
+# ========================
+# File estimates
+# ========================
+
+_estimates = OrderedDict()
+
+
+def _read_text(path: str):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+    except (OSError, UnicodeDecodeError):
+        return None
+
+
+def file_estimate(path: str):
+    """
+    完整檔案區塊的 (行數, token 數)；以 (path, size, mtime) 快取
+
+    Returns:
+        (lines, tokens)；不存在或無法以 UTF-8 讀取時回傳 None
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    key = (path, st.st_size, st.st_mtime_ns)
+    hit = _estimates.get(key)
+    if hit is not None:
+        _estimates.move_to_end(key)
+        return hit
+    text = _read_text(path)
+    if text is None:
+        return None
+    lines = text.count("\n") + (0 if text.endswith("\n") or not text else 1)
+    result = (lines, estimate_tokens(text) + lines * LINE_TOKENS + BLOCK_TOKENS)
+    _estimates[key] = result
+    while len(_estimates) > ESTIMATE_CACHE_SIZE:
+        _estimates.popitem(last=False)
+    return result
+
+
+# ========================
+# Planning
+# ========================
+
+class BudgetItem:
+    """
+    One file block taking part in the budget.
+
+    Attributes:
+        title: 區塊標題（chat_writer.file_blocks 的 title）
+        path: 檔案路徑
+        priority: PRIORITY_*
+        ranges: 已知相關的行範圍 [(start, end)]（1 起算、含 end），例如 diff 變動的行
+        body: 取代完整檔案的內容（例如 symbol_slice 或 compact 的結果），FULL 等級輸出這份內容，
+            其他等級也由這份內容裁剪
+    """
+
+    def __init__(self, title, path, priority, ranges=None, body=None):
+        self.title = title
+        self.path = path
+        self.priority = priority
+        self.ranges = ranges or []
+        self.body = body
+        self.level = FULL
+        self.lines = 0
+        self.tokens = 0
+
+
+class BudgetPlan:
+    """
+    Result of plan_budget.
+
+    Attributes:
+        budget / model: 上限與目標模型
+        total: 估計的總 token 數（含固定區段）
+        bodies: {title: 裁剪後的內容或 Note}，交給 file_blocks(bodies=...)
+        items: 參與計算的 BudgetItem（依輸出順序）
+    """
+
+    def __init__(self, budget, model, total, bodies, items):
+        self.budget = budget
+        self.model = model
+        self.total = total
+        self.bodies = bodies
+        self.items = items
+
+    def summary_lines(self):
+        """Task Description 中的說明行"""
+        label = f" ({self.model})" if self.model else ""
+        over = " (still over budget)" if self.total > self.budget else ""
+        yield f"Token Budget: ~{self.total:,} / {self.budget:,} tokens{label}{over}"
+        trimmed = [item for item in self.items if item.level != FULL]
+        if not trimmed:
+            return
+        counts = [sum(1 for item in trimmed if item.level == level) for level in (REGIONS, SIGNATURES, PATH)]
+        parts = [f"{n} to {LEVEL_NAMES[level]}" for n, level in zip(counts, (REGIONS, SIGNATURES, PATH)) if n]
+        yield f"Trimmed {len(trimmed)} of {len(self.items)} files: {', '.join(parts)}"
+        for item in trimmed[:SUMMARY_LIMIT]:
+            yield f"  - {item.title}: {LEVEL_NAMES[item.level]}"
+        if len(trimmed) > SUMMARY_LIMIT:
+            yield f"  ... and {len(trimmed) - SUMMARY_LIMIT} more"
+
+
+def _expand(ranges, context: int, n: int):
+    keep = set()
+    for start, end in ranges:
+        keep.update(range(max(1, start - context), min(n, end + context) + 1))
+    return keep
+
+
+def _degraded(item: BudgetItem, level: int, keyword_re):
+    """(body, tokens)；此等級不適用時回傳 None"""
+    if level == PATH:
+        note = Note(f"omitted: {item.lines} lines, ~{item.tokens:,} tokens")
+        return note, estimate_tokens(note) + BLOCK_TOKENS
+    if item.body is not None:
+        return _degraded_body(item, level, keyword_re)
+    text = _read_text(item.path)
+    if text is None:
+        return None
+    lines = split_lines(text)
+    if level == REGIONS:
+        ranges = list(item.ranges)
+        if keyword_re is not None:
+            ranges.extend((i, i) for i, line in enumerate(lines, 1) if keyword_re.search(line))
+        keep = _expand(ranges, REGION_CONTEXT, len(lines))
+    else:
+        keep = {i for i, line in enumerate(lines, 1) if _SIGNATURE_RE.match(line)}
+    if not keep or len(keep) >= len(lines):
+        return None
+    body = numbered_subset(lines, keep)
+    return body, estimate_tokens(body) + BLOCK_TOKENS
+
+
+def _degraded_body(item: BudgetItem, level: int, keyword_re):
+    """_degraded 的 item.body 版本：由已 slicing / 壓縮的內容再裁剪，不重新讀取原檔"""
+    entries = parse_numbered(item.body)
+    numbered = [(i, code) for i, code in entries if i is not None]
+    if level == REGIONS:
+        ranges = list(item.ranges)
+        if keyword_re is not None:
+            ranges.extend((i, i) for i, code in numbered if keyword_re.search(code))
+        keep = _expand(ranges, REGION_CONTEXT, max(item.lines, numbered[-1][0] if numbered else 0))
+    else:
+        keep = {i for i, code in numbered if _SIGNATURE_RE.match(code)}
+    kept = sum(1 for i, _ in numbered if i in keep)
+    if not kept or kept >= len(numbered):
+        return None
+    body = numbered_entries_subset(entries, keep, item.lines)
+    return body, estimate_tokens(body) + BLOCK_TOKENS
+
+
+def plan_budget(items, budget: int, fixed_tokens: int = 0, user_input: str = "", model=None) -> BudgetPlan:
+    """
+    決定每個檔案區塊的輸出等級，使估計的總 token 數不超過 budget
+
+    依 REGIONS、SIGNATURES、PATH 的順序逐級裁剪；每一級先處理優先順序最低、
+    token 最多的檔案（同分時依標題），總數一旦低於 budget 就停止。之後再由優先順序
+    最高的檔案開始，把剩餘的額度還給裁剪過頭的檔案。相同的輸入永遠得到相同的結果。
+
+    Args:
+        items: [BudgetItem]，依輸出順序
+        budget: token 上限
+        fixed_tokens: 不會裁剪的部分（prompt、任務描述、diff report）
+        user_input: 任務描述（REGIONS 使用其中的識別字）
+        model: 顯示在說明中的模型名稱
+
+    Returns:
+        BudgetPlan
+    """
+    items = list(items)
+    total = fixed_tokens + SUMMARY_RESERVE
+    bodies = {}
+    for item in items:
+        if isinstance(item.body, Note):
+            # Already a one-line note (e.g. identical shadow copy): fixed, never read
+            item.tokens = estimate_tokens(item.body) + BLOCK_TOKENS
+            item.level = None
+            bodies[item.title] = item.body
+            total += item.tokens
+            continue
+        estimate = file_estimate(item.path)
+        if estimate is None:
+            item.tokens = BLOCK_TOKENS   # missing / unreadable: rendered as a one-line note
+            item.level = None
+        else:
+            item.lines, item.tokens = estimate
+            if item.body is not None:
+                item.tokens = estimate_tokens(item.body) + BLOCK_TOKENS
+                bodies[item.title] = item.body
+        total += item.tokens
+
+    keywords = task_keywords(user_input)
+    keyword_re = re.compile(r"\b(?:" + "|".join(map(re.escape, keywords)) + r")\b", re.I) if keywords else None
+    order = sorted((item for item in items if item.level is not None),
+                   key=lambda item: (-item.priority, -item.tokens, item.title))
+    current = {item.title: item.tokens for item in order}
+    options = {}   # (title, level) -> (body, tokens) or None
+
+    def option(item, level):
+        key = (item.title, level)
+        if key not in options:
+            options[key] = _degraded(item, level, keyword_re)
+        return options[key]
+
+    for level in (REGIONS, SIGNATURES, PATH):
+        for item in order:
+            if total <= budget:
+                break
+            if item.level >= level:
+                continue
+            result = option(item, level)
+            if result is None or result[1] >= current[item.title]:
+                continue
+            body, tokens = result
+            total -= current[item.title] - tokens
+            current[item.title] = tokens
+            item.level = level
+            bodies[item.title] = body
+
+    # Give back what the last steps left unused, highest priority first
+    for item in reversed(order):
+        for level in range(FULL, item.level):
+            result = (None, item.tokens) if level == FULL else option(item, level)
+            if result is None or total - current[item.title] + result[1] > budget:
+                continue
+            body, tokens = result
+            total -= current[item.title] - tokens
+            current[item.title] = tokens
+            item.level = level
+            if level != FULL:
+                bodies[item.title] = body
+            elif item.body is not None:
+                bodies[item.title] = item.body
+            else:
+                del bodies[item.title]
+            break
+
+    for item in items:
+        if item.level is None:
+            item.level = FULL
+    return BudgetPlan(budget, model, total - SUMMARY_RESERVE, bodies, items)
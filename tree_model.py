@@ -0,0 +1,968 @@
+"""
+Project Tree Model for AI Coder Helper
+
+QAbstractItemModel over a compact, array-backed node table, used by all
+tree windows (Console, ProjectChoose, ShadowManager, Sync) instead of one
+QTreeWidgetItem per path.
+
+Per node the table keeps: parent id, row, name offset/length into a UTF-8
+string pool, flags, check state, checked/partial child counters and the
+contiguous range of its children (parallel `array` columns, ~33 bytes +
+name per node).  Full paths are not stored; they are rebuilt from the
+parent chain when asked for.
+
+Tri-state propagation is O(depth): toggling a node updates the counters of
+its ancestors, and its loaded descendants are only marked (F_PUSH) and
+receive the new state when they are next read.
+
+Children of a directory are loaded on demand through canFetchMore /
+fetchMore from the shared directory index (fs_index, which already drops
+entries ignored by .gitignore / .coderignore).  Roots added with
+scan=True are refreshed by a ScanJob on the global QThreadPool; scanned
+directories arrive in batches through queued signals and expanded
+directories fill in as soon as their listing is known.  When the index
+was already filled (e.g. from the on-disk snapshot) the tree is usable
+immediately and the refresh only patches the rows of directories that
+changed (reconcile).  After its scan a root is watched (fs_watch) and
+filesystem changes are applied the same way, row by row.
+"""
+
+import os
+import time
+from array import array
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from PyQt6.QtCore import Qt, QAbstractItemModel, QModelIndex, QObject, QRunnable, QThreadPool, pyqtSignal
+from PyQt6.QtGui import QBrush, QColor, QFont
+from PyQt6.QtWidgets import QLabel
+
+from fs_index import get_index
+from fs_watch import watch, unwatch
+from selection import count_selected
+
+# Node flags
+F_DIR = 1
+F_LOADED = 2
+F_CHECKABLE = 4
+F_HIGHLIGHT = 8
+F_PUSH = 16       # children still have to inherit this node's check state
+
+# Check states as stored in the table
+UNCHECKED, PARTIAL, CHECKED = 0, 1, 2
+QT_STATE = (Qt.CheckState.Unchecked, Qt.CheckState.PartiallyChecked, Qt.CheckState.Checked)
+FROM_QT = {Qt.CheckState.Unchecked: UNCHECKED, Qt.CheckState.PartiallyChecked: PARTIAL, Qt.CheckState.Checked: CHECKED}
+
+ROOT = 0
+
+# Minimum seconds between two progress signals of a scan
+PROGRESS_INTERVAL = 0.1
+
+
+class NodeTable:
+    """
+    Parallel-array node storage.
+
+    Children of a node are normally one contiguous id range
+    (child_start .. child_start + child_count); nodes whose children were
+    edited after loading keep an explicit id list in `moved` instead.
+    """
+
+    def __init__(self):
+        self.parent = array("i")
+        self.row = array("i")
+        self.name_off = array("I")
+        self.name_len = array("H")
+        self.flags = array("B")
+        self.check = array("B")
+        self.n_checked = array("i")   # checked children
+        self.n_partial = array("i")   # partially checked children
+        self.child_start = array("i")
+        self.child_count = array("i")
+        self.pool = bytearray()
+        self.moved = {}
+        self._append(-1, 0, "", F_DIR | F_LOADED, UNCHECKED)   # invisible root
+
+    def __len__(self):
+        return len(self.parent)
+
+    def _append(self, parent, row, name, flags, check):
+        raw = name.encode("utf-8", "surrogateescape")
+        node = len(self.parent)
+        self.parent.append(parent)
+        self.row.append(row)
+        self.name_off.append(len(self.pool))
+        self.name_len.append(len(raw))
+        self.pool += raw
+        self.flags.append(flags)
+        self.check.append(check)
+        self.n_checked.append(0)
+        self.n_partial.append(0)
+        self.child_start.append(0)
+        self.child_count.append(0)
+        return node
+
+    def add_children(self, parent: int, entries) -> list:
+        """
+        在 parent 底下新增子節點
+
+        Args:
+            parent: 父節點 id
+            entries: [(name, flags, check)]
+
+        Returns:
+            新節點 id 清單
+        """
+        first_row = self.count(parent)
+        new = [self._append(parent, first_row + i, name, flags, check)
+               for i, (name, flags, check) in enumerate(entries)]
+        if not new:
+            return new
+        if first_row == 0 and parent not in self.moved:
+            self.child_start[parent] = new[0]
+            self.child_count[parent] = len(new)
+        else:
+            kids = self._moved_list(parent)
+            kids.extend(new)
+            self.child_count[parent] = len(kids)
+        return new
+
+    def insert_children(self, parent: int, row: int, entries) -> list:
+        """
+        在 parent 的第 row 列之前插入子節點
+
+        Args:
+            parent: 父節點 id
+            row: 插入位置
+            entries: [(name, flags, check)]
+
+        Returns:
+            新節點 id 清單
+        """
+        new = [self._append(parent, 0, name, flags, check) for name, flags, check in entries]
+        kids = self._moved_list(parent)
+        kids[row:row] = new
+        self.child_count[parent] = len(kids)
+        self._renumber(parent, row)
+        return new
+
+    def remove_children(self, parent: int, first: int, last: int) -> list:
+        """
+        移除 parent 的第 first..last 列（節點資料保留但與樹分離）
+
+        Returns:
+            被移除的節點 id 清單
+        """
+        kids = self._moved_list(parent)
+        gone = kids[first:last + 1]
+        del kids[first:last + 1]
+        for node in gone:
+            self.parent[node] = -1
+        self.child_count[parent] = len(kids)
+        self._renumber(parent, first)
+        return gone
+
+    def _moved_list(self, parent: int) -> list:
+        kids = self.moved.get(parent)
+        if kids is None:
+            start = self.child_start[parent]
+            kids = self.moved[parent] = list(range(start, start + self.child_count[parent]))
+        return kids
+
+    def _renumber(self, parent: int, first: int) -> None:
+        kids = self.moved[parent]
+        for row in range(first, len(kids)):
+            self.row[kids[row]] = row
+
+    def name(self, node: int) -> str:
+        off = self.name_off[node]
+        return self.pool[off:off + self.name_len[node]].decode("utf-8", "surrogateescape")
+
+    def count(self, node: int) -> int:
+        return self.child_count[node]
+
+    def child(self, node: int, row: int) -> int:
+        moved = self.moved.get(node)
+        return moved[row] if moved is not None else self.child_start[node] + row
+
+    def children(self, node: int):
+        moved = self.moved.get(node)
+        if moved is not None:
+            return list(moved)
+        start = self.child_start[node]
+        return range(start, start + self.child_count[node])
+
+    def nbytes(self) -> int:
+        cols = (self.parent, self.row, self.name_off, self.name_len, self.flags,
+                self.check, self.n_checked, self.n_partial, self.child_start, self.child_count)
+        return sum(c.itemsize * len(c) for c in cols) + len(self.pool)
+
+
+class ScanSignals(QObject):
+    batch = pyqtSignal(int, list)          # root node, scanned rel dirs
+    progress = pyqtSignal(int, int, float) # root node, files seen, elapsed seconds
+    ready = pyqtSignal(int, object)        # root node, counts from the existing (warm) index
+    done = pyqtSignal(int, object, object) # root node, counts (None if not requested / cancelled), changed rel dirs
+
+
+class ScanJob(QRunnable):
+    """
+    Refresh one root's FsIndex on a worker thread.
+
+    Signals are emitted from the worker and delivered to the model on the
+    GUI thread (queued connections).  A warm index (already holding a
+    listing) emits ready() before refreshing, and done() then carries the
+    set of directories that changed.
+    """
+
+    def __init__(self, node, index, counts_fn=None):
+        super().__init__()
+        self.setAutoDelete(False)   # kept alive by the model until done
+        self.node = node
+        self.index = index
+        self.counts_fn = counts_fn
+        self.signals = ScanSignals()
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        start = time.perf_counter()
+        last = [0.0]
+
+        def on_batch(rels, files):
+            if self.cancelled:
+                return
+            self.signals.batch.emit(self.node, list(rels))
+            elapsed = time.perf_counter() - start
+            if elapsed - last[0] >= PROGRESS_INTERVAL:
+                last[0] = elapsed
+                self.signals.progress.emit(self.node, files, elapsed)
+
+        counts = None
+        changed = None
+        warm = bool(self.index.dirs)
+        try:
+            if warm:
+                if self.counts_fn is not None:
+                    counts = self.counts_fn(self.index)
+                if not self.cancelled:
+                    self.signals.ready.emit(self.node, counts)
+            changed = self.index.refresh(progress=on_batch, cancelled=lambda: self.cancelled)
+            if self.counts_fn is not None and not self.cancelled and (changed or not warm):
+                counts = self.counts_fn(self.index)
+        finally:
+            if not self.cancelled:
+                self.signals.progress.emit(self.node, self.index.file_count(), time.perf_counter() - start)
+                self.signals.done.emit(self.node, counts, changed if warm else None)
+
+
+class ProjectTreeModel(QAbstractItemModel):
+    """
+    Lazy tree of one or more context roots.
+
+    Args:
+        header: header text
+        checkable: whether file/directory nodes get a checkbox
+        propagate: tri-state propagation (Console) vs independent checkboxes (Sync)
+        highlight_fn: optional full_path -> bool, highlighted nodes are bold green
+        watch: keep scanned roots in sync with the disk (fs_watch)
+
+    Signals:
+        scan_progress(files, files_per_second): while any root is scanning
+        scan_finished(): all scans of the model are done
+    """
+
+    scan_progress = pyqtSignal(int, float)
+    scan_finished = pyqtSignal()
+
+    def __init__(self, header, checkable=False, propagate=False, highlight_fn=None, watch=True, parent=None):
+        super().__init__(parent)
+        self.header = header
+        self.checkable = checkable
+        self.propagate = propagate
+        self.highlight_fn = highlight_fn
+        self._highlight_brush = QBrush(QColor("#00CD00"))  # Medium Spring Green / Bright Green
+        self._highlight_font = QFont()
+        self._highlight_font.setBold(True)
+        self.watch = watch
+        self._jobs = {}   # root node -> running ScanJob
+        self._watchers = {}   # root node -> (FsWatcher, connected slot)
+        self._reset_table()
+
+    def _reset_table(self):
+        self.table = NodeTable()
+        self.roots = {}   # node -> (path, index, rules, counts)
+        self._counts_fns = {}     # root node -> counts_fn (roots with rules)
+        self.tags = {}    # node -> "ORIGIN_ROOT" / "NONE_ROOT" ...
+        self._pending = 0 # nodes flagged F_PUSH
+        self._waiting = set()     # expanded nodes whose directory is not scanned yet
+        self._scan_files = {}     # root node -> (files seen, elapsed)
+        self._deferred_checkable = set()  # roots that get their checkbox once counts exist
+        self._ready = set()       # scanning roots whose (warm) listing and counts are usable already
+
+    def clear(self):
+        self.shutdown()
+        self.beginResetModel()
+        self._reset_table()
+        self.endResetModel()
+
+    # ========================
+    # Building
+    # ========================
+
+    def add_root(self, label, path=None, tag=None, checkable=None, parent_node=ROOT,
+                 index=None, rules=None, counts=None, scan=False, counts_fn=None, row=None) -> int:
+        """
+        新增一個根節點（Origin / Coped / Shadow root 或純標籤節點）
+
+        Args:
+            label: 顯示文字
+            path: 根目錄絕對路徑（None 表示沒有內容的標籤節點）
+            tag: 代替路徑回傳的識別字串（如 "ORIGIN_ROOT"）
+            checkable: 是否顯示 checkbox（預設依 model 設定）
+            parent_node: 父節點（預設為頂層）
+            index/rules/counts: 目錄索引與 selection 資訊（用於初始勾選狀態）
+            scan: 在背景 refresh 索引（有 rules 時掃描完成才計算 counts 並顯示 checkbox）
+            counts_fn: counts_fn(index) -> counts，預設為 count_selected
+            row: 插入位置（預設加在最後）
+
+        Returns:
+            node id
+        """
+        flags = 0
+        if checkable if checkable is not None else self.checkable:
+            flags |= F_CHECKABLE
+        if path is not None:
+            flags |= F_DIR
+            if index is None:
+                index = get_index(path)
+                if not scan:
+                    index.ensure()
+        else:
+            flags |= F_LOADED
+            scan = False
+
+        check = UNCHECKED
+        if path is not None and rules is not None:
+            if scan:
+                # Check state is unknown until the counts exist
+                flags &= ~F_CHECKABLE
+            else:
+                check = self._initial_check(rules, counts, "", True)
+
+        node = len(self.table)
+        if path is not None:
+            self.roots[node] = (os.path.normpath(path), index, rules, counts)
+        if tag is not None:
+            self.tags[node] = tag
+        if rules is not None:
+            if counts_fn is None:
+                counts_fn = lambda idx: count_selected(idx, rules)
+            self._counts_fns[node] = counts_fn
+        if row is None:
+            row = self.table.count(parent_node)
+        self.beginInsertRows(self.index_for(parent_node), row, row)
+        self.table.insert_children(parent_node, row, [(label, flags, check)])
+        self.endInsertRows()
+        if scan:
+            self._start_scan(node, index, counts_fn if rules is not None else None,
+                             bool(checkable if checkable is not None else self.checkable))
+        elif path is not None:
+            self._watch(node)
+        return node
+
+    def remove_root(self, node: int) -> None:
+        """移除一個根節點（例如 coped 專案被刪除），其他節點不受影響"""
+        job = self._jobs.pop(node, None)
+        if job is not None:
+            job.cancel()
+            job.signals.batch.disconnect()
+            job.signals.progress.disconnect()
+            job.signals.ready.disconnect()
+            job.signals.done.disconnect()
+            self._scan_files.pop(node, None)
+        self._ready.discard(node)
+        parent = self.table.parent[node]
+        row = self.table.row[node]
+        self.beginRemoveRows(self.index_for(parent), row, row)
+        self.table.remove_children(parent, row, row)
+        self._detach(node)
+        for n in [node, *self.iter_loaded(node)]:
+            self._unwatch(n)
+            self.roots.pop(n, None)
+            self.tags.pop(n, None)
+            self._counts_fns.pop(n, None)
+            self._deferred_checkable.discard(n)
+        self.endRemoveRows()
+        if job is not None and not self._jobs:
+            self._scan_files.clear()
+            self.scan_finished.emit()
+
+    @staticmethod
+    def _initial_check(rules, counts, rel, is_dir):
+        """Check state from aggregated selection counts (no need to load descendants)"""
+        if is_dir and counts is not None:
+            total, selected = counts.get(rel, (0, 0))
+            if total:
+                if selected == total:
+                    return CHECKED
+                return PARTIAL if selected else UNCHECKED
+        return CHECKED if rules is not None and rules.is_selected(rel) else UNCHECKED
+
+    def load_children(self, node: int) -> None:
+        flags = self.table.flags[node]
+        if not (flags & F_DIR) or flags & F_LOADED:
+            return
+        self._resolve(node)
+        root, rel = self.node_rel(node)
+        path, index, rules, counts = self.roots[root]
+        if root in self._jobs and root not in self._ready and (rules is not None or rel not in index.dirs):
+            # Listing (or counts) not available yet: filled in by _on_scan_batch / _on_scan_done
+            self._waiting.add(node)
+            return
+        self._waiting.discard(node)
+        parent_state = self.table.check[node]
+        entries = [self._child_entry(root, rel, e, parent_state) for e in index.listdir(rel)]
+
+        self.table.flags[node] = flags | F_LOADED
+        if entries:
+            self.beginInsertRows(self.index_for(node), 0, len(entries) - 1)
+            self.table.add_children(node, entries)
+            self.table.n_checked[node] = sum(1 for e in entries if e[2] == CHECKED)
+            self.table.n_partial[node] = sum(1 for e in entries if e[2] == PARTIAL)
+            self.endInsertRows()
+
+    def _child_entry(self, root, rel, e, parent_state):
+        """(name, flags, check) of a new child row for directory entry e of rel"""
+        path, index, rules, counts = self.roots[root]
+        child_rel = os.path.join(rel, e.name) if rel else e.name
+        f = (F_CHECKABLE if self.checkable else 0) | (F_DIR if e.is_dir else F_LOADED)
+        if self.highlight_fn is not None and self.highlight_fn(os.path.join(path, child_rel)):
+            f |= F_HIGHLIGHT
+        # A fully (un)checked parent decides for its children; otherwise use the counts
+        if parent_state == PARTIAL:
+            check = self._initial_check(rules, counts, child_rel, e.is_dir)
+        else:
+            check = parent_state
+        return e.name, f, check
+
+    # ========================
+    # Reconcile (patch loaded rows after a refresh)
+    # ========================
+
+    def reconcile(self, root: int, changed) -> None:
+        """
+        只更新已載入節點中內容有變動的目錄（新增/移除列），不重建整棵樹
+
+        Args:
+            root: root node
+            changed: FsIndex.refresh() 回傳的變動目錄相對路徑集合
+        """
+        for rel in sorted(changed, key=len):   # parents before children
+            node = self._find_loaded(root, rel)
+            if node is not None:
+                self._sync_children(node, root, rel)
+
+    def notify_changed(self, path: str) -> None:
+        """
+        程式自己新增/刪除檔案後呼叫：立即重新列出 path 所在目錄（與祖先目錄）並更新樹
+
+        Args:
+            path: 被新增/刪除/修改的檔案或目錄絕對路徑
+        """
+        path = os.path.normcase(os.path.normpath(path))
+        for root, (base, index, _, _) in list(self.roots.items()):
+            base_key = os.path.normcase(base)
+            if not path.startswith(base_key + os.sep) or root in self._jobs:
+                continue
+            rel = os.path.dirname(os.path.normpath(path)[len(base) + 1:])
+            rels = [""]
+            parts = rel.split(os.sep) if rel else []
+            for i in range(len(parts)):
+                rels.append(os.path.join(*parts[:i + 1]))
+            entry = self._watchers.get(root)
+            if entry is not None:
+                entry[0].touch(rels)
+            else:
+                self._on_fs_changed(root, index.refresh_dirs(rels))
+
+    def _find_loaded(self, root, rel):
+        t = self.table
+        node = root
+        for name in (rel.split(os.sep) if rel else ()):
+            if not t.flags[node] & F_LOADED:
+                return None
+            for child in t.children(node):
+                if t.name(child) == name:
+                    node = child
+                    break
+            else:
+                return None
+        return node if t.flags[node] & F_LOADED else None
+
+    def _sync_children(self, node, root, rel):
+        t = self.table
+        index = self.roots[root][1]
+        if rel and not index.is_dir(rel):
+            return   # the directory itself is gone: removed while syncing its parent
+        self._resolve(node)
+        if t.flags[node] & F_PUSH:
+            self._push(node)
+        parent_index = self.index_for(node)
+        listing = {e.name: e for e in index.listdir(rel)}
+
+        # Rows whose entry disappeared (or changed between file and directory)
+        kids = list(t.children(node))
+        for row in range(len(kids) - 1, -1, -1):
+            e = listing.get(t.name(kids[row]))
+            if e is None or bool(e.is_dir) != bool(t.flags[kids[row]] & F_DIR):
+                self.beginRemoveRows(parent_index, row, row)
+                for gone in t.remove_children(node, row, row):
+                    self._detach(gone)
+                self.endRemoveRows()
+
+        # New entries, inserted at their sorted position
+        names = [t.name(k) for k in t.children(node)]
+        present = set(names)
+        state = t.check[node]
+        for name, e in listing.items():
+            if name in present:
+                continue
+            row = bisect_left(names, name)
+            self.beginInsertRows(parent_index, row, row)
+            t.insert_children(node, row, [self._child_entry(root, rel, e, state)])
+            self.endInsertRows()
+            names.insert(row, name)
+
+        t.n_checked[node] = sum(1 for k in t.children(node) if t.check[k] == CHECKED)
+        t.n_partial[node] = sum(1 for k in t.children(node) if t.check[k] == PARTIAL)
+        self._bubble(node)
+
+    def _detach(self, node):
+        """Forget pending pushes / waits of a removed subtree"""
+        for n in [node, *self.iter_loaded(node)]:
+            if self.table.flags[n] & F_PUSH:
+                self.table.flags[n] &= ~F_PUSH
+                self._pending -= 1
+            self._waiting.discard(n)
+
+    def _bubble(self, node):
+        """Recompute tri-states from node upwards after its children changed"""
+        t = self.table
+        if not self.propagate:
+            return
+        while node > ROOT and self.is_checkable(node) and t.count(node):
+            old = t.check[node]
+            new = self._state_from_counts(node)
+            if new == old:
+                return
+            t.check[node] = new
+            self._emit_check(node, node)
+            parent = t.parent[node]
+            if parent <= ROOT:
+                return
+            self._count(parent, old, -1)
+            self._count(parent, new, 1)
+            node = parent
+
+    # ========================
+    # Watching
+    # ========================
+
+    def _watch(self, root):
+        if not self.watch or root in self._watchers:
+            return
+        watcher = watch(self.roots[root][1])
+        slot = lambda changed, root=root: self._on_fs_changed(root, changed)
+        watcher.changed.connect(slot)
+        self._watchers[root] = (watcher, slot)
+
+    def _unwatch(self, root):
+        entry = self._watchers.pop(root, None)
+        if entry is not None:
+            watcher, slot = entry
+            watcher.changed.disconnect(slot)
+            unwatch(watcher)
+
+    def stop_watching(self) -> None:
+        for root in list(self._watchers):
+            self._unwatch(root)
+
+    def shutdown(self) -> None:
+        """停止背景掃描與檔案監看（視窗關閉或重建樹時呼叫）"""
+        self.cancel_scans()
+        self.stop_watching()
+
+    def _on_fs_changed(self, root, changed):
+        if root not in self.roots or root in self._jobs or not changed:
+            return
+        counts_fn = self._counts_fns.get(root)
+        if counts_fn is not None:
+            path, index, rules, _ = self.roots[root]
+            self.roots[root] = (path, index, rules, counts_fn(index))
+        self.reconcile(root, changed)
+
+    # ========================
+    # Background scanning
+    # ========================
+
+    def _start_scan(self, node, index, counts_fn, checkable):
+        job = ScanJob(node, index, counts_fn)
+        if checkable:
+            self._deferred_checkable.add(node)
+        job.signals.batch.connect(self._on_scan_batch)
+        job.signals.progress.connect(self._on_scan_progress)
+        job.signals.ready.connect(self._on_scan_ready)
+        job.signals.done.connect(self._on_scan_done)
+        self._jobs[node] = job
+        self.scan_progress.emit(0, 0.0)
+        QThreadPool.globalInstance().start(job)
+
+    def is_scanning(self) -> bool:
+        return bool(self._jobs)
+
+    def cancel_scans(self) -> None:
+        """取消所有背景掃描（視窗關閉或重建樹時呼叫）"""
+        for job in self._jobs.values():
+            job.cancel()
+            job.signals.batch.disconnect()
+            job.signals.progress.disconnect()
+            job.signals.ready.disconnect()
+            job.signals.done.disconnect()
+        had_jobs = bool(self._jobs)
+        self._jobs.clear()
+        self._ready.clear()
+        if had_jobs:
+            self.scan_finished.emit()
+
+    def _waiting_under(self, root):
+        for node in list(self._waiting):
+            r, rel = self.node_rel(node)
+            if r == root:
+                yield node, rel
+
+    def _on_scan_batch(self, root, rels):
+        if root not in self._jobs or root in self._ready or self.roots[root][2] is not None:
+            return
+        scanned = set(rels)
+        for node, rel in self._waiting_under(root):
+            if rel in scanned:
+                self.load_children(node)
+
+    def _on_scan_progress(self, root, files, elapsed):
+        if root not in self._jobs:
+            return
+        self._scan_files[root] = (files, elapsed)
+        total = sum(f for f, _ in self._scan_files.values())
+        seconds = max(e for _, e in self._scan_files.values())
+        self.scan_progress.emit(total, total / seconds if seconds > 0 else 0.0)
+
+    def _apply_counts(self, root, counts):
+        path, index, rules, _ = self.roots[root]
+        if rules is None:
+            return
+        self.roots[root] = (path, index, rules, counts)
+        if root in self._deferred_checkable:
+            self.table.flags[root] |= F_CHECKABLE
+        self.table.check[root] = self._initial_check(rules, counts, "", True)
+        self._emit_check(root, root)
+
+    def _on_scan_ready(self, root, counts):
+        # Warm index: show the known listing now, the refresh patches it afterwards
+        if root not in self._jobs:
+            return
+        self._ready.add(root)
+        self._apply_counts(root, counts)
+        for node, _ in self._waiting_under(root):
+            self.load_children(node)
+
+    def _on_scan_done(self, root, counts, changed):
+        job = self._jobs.pop(root, None)
+        if job is None:
+            return
+        if root in self._ready:
+            self._ready.discard(root)
+            path, index, rules, _ = self.roots[root]
+            if rules is not None:
+                # Loaded rows keep their (possibly user-edited) states; counts serve rows loaded later
+                self.roots[root] = (path, index, rules, counts)
+            self.reconcile(root, changed or ())
+        else:
+            self._apply_counts(root, counts)
+        for node, _ in self._waiting_under(root):
+            self.load_children(node)
+        self._watch(root)
+        if not self._jobs:
+            self._scan_files.clear()
+            self.scan_finished.emit()
+
+    # ========================
+    # Node helpers
+    # ========================
+
+    # QModelIndex.internalId() carries the node id, no per-node Python object is needed
+
+    def node_of(self, index: QModelIndex) -> int:
+        return index.internalId() if index.isValid() else ROOT
+
+    def index_for(self, node: int) -> QModelIndex:
+        if node == ROOT:
+            return QModelIndex()
+        return self.createIndex(self.table.row[node], 0, node)
+
+    def node_name(self, node: int) -> str:
+        return self.table.name(node)
+
+    def node_rel(self, node: int):
+        """回傳 (所屬 root node, 相對路徑)；不在任何 root 之下則為 (None, None)"""
+        parts = []
+        while node not in self.roots:
+            if node <= ROOT:
+                return None, None
+            parts.append(self.table.name(node))
+            node = self.table.parent[node]
+        return node, os.path.join(*reversed(parts)) if parts else ""
+
+    def node_path(self, node: int):
+        """節點的絕對路徑（或 root 的 tag，例如 "ORIGIN_ROOT"）"""
+        if node in self.tags:
+            return self.tags[node]
+        root, rel = self.node_rel(node)
+        if root is None:
+            return None
+        base = self.roots[root][0]
+        return os.path.join(base, rel) if rel else base
+
+    def is_dir(self, node: int) -> bool:
+        return bool(self.table.flags[node] & F_DIR)
+
+    def is_loaded(self, node: int) -> bool:
+        return bool(self.table.flags[node] & F_LOADED)
+
+    def is_checkable(self, node: int) -> bool:
+        return bool(self.table.flags[node] & F_CHECKABLE)
+
+    def children(self, node: int = ROOT):
+        return self.table.children(node)
+
+    def check_state(self, node: int):
+        self._resolve(node)
+        return QT_STATE[self.table.check[node]]
+
+    def iter_loaded(self, node: int = ROOT):
+        """走訪所有已載入的節點（不觸發載入）"""
+        stack = list(reversed(self.table.children(node)))
+        while stack:
+            n = stack.pop()
+            yield n
+            stack.extend(reversed(self.table.children(n)))
+
+    # ========================
+    # Check propagation
+    # ========================
+
+    def set_check(self, node: int, state) -> None:
+        """
+        設定勾選狀態；propagate 模式下以計數器更新祖先 (O(depth))，子孫延後套用
+
+        Args:
+            node: node id
+            state: Qt.CheckState
+        """
+        t = self.table
+        value = FROM_QT[state]
+        self._resolve(node)
+        old = t.check[node]
+        t.check[node] = value
+        if not self.propagate:
+            if old != value:
+                self._emit_check(node, node)
+            return
+
+        changed = [node]
+        if t.count(node):
+            self._mark(node, value)
+            changed = None    # whole loaded subtree changes: one viewport repaint below
+
+        # Walk up while the parent's aggregated state changes
+        parent = t.parent[node]
+        while parent > ROOT and self.is_checkable(parent) and old != value:
+            self._count(parent, old, -1)
+            self._count(parent, value, 1)
+            p_old = t.check[parent]
+            p_new = self._state_from_counts(parent)
+            if p_new == p_old:
+                break
+            t.check[parent] = p_new
+            if changed is not None:
+                changed.append(parent)
+            old, value, parent = p_old, p_new, t.parent[parent]
+
+        if changed is None:
+            self._emit_all()
+        else:
+            for n in changed:
+                self._emit_check(n, n)
+
+    @contextmanager
+    def batch(self):
+        """批次修改勾選狀態：期間不發送訊號，結束時只重繪一次"""
+        blocked = self.blockSignals(True)
+        try:
+            yield self
+        finally:
+            self.blockSignals(blocked)
+            if not blocked:
+                self._emit_all()
+
+    def _mark(self, node, value):
+        """node 的所有子節點狀態改為 value（計數器立即更新，子節點延後到讀取時才寫入）"""
+        t = self.table
+        t.n_checked[node] = t.count(node) if value == CHECKED else 0
+        t.n_partial[node] = 0
+        if not t.flags[node] & F_PUSH:
+            t.flags[node] |= F_PUSH
+            self._pending += 1
+
+    def _push(self, node):
+        t = self.table
+        value = t.check[node]
+        t.flags[node] &= ~F_PUSH
+        self._pending -= 1
+        for child in t.children(node):
+            t.check[child] = value
+            if t.count(child):
+                self._mark(child, value)
+
+    def _resolve(self, node):
+        """套用 node 所有祖先尚未下推的狀態（讀取 node 前呼叫）"""
+        if not self._pending:
+            return
+        chain = []
+        parent = self.table.parent[node]
+        while parent > ROOT:
+            chain.append(parent)
+            parent = self.table.parent[parent]
+        for ancestor in reversed(chain):
+            if self.table.flags[ancestor] & F_PUSH:
+                self._push(ancestor)
+
+    def _count(self, node, value, delta):
+        if value == CHECKED:
+            self.table.n_checked[node] += delta
+        elif value == PARTIAL:
+            self.table.n_partial[node] += delta
+
+    def _state_from_counts(self, node):
+        """Tri-state of a parent from its checked/partial child counters"""
+        t = self.table
+        if t.n_checked[node] == t.count(node):
+            return CHECKED
+        if t.n_checked[node] == 0 and t.n_partial[node] == 0:
+            return UNCHECKED
+        return PARTIAL
+
+    def _emit_check(self, first, last):
+        self.dataChanged.emit(self.index_for(first), self.index_for(last), [Qt.ItemDataRole.CheckStateRole])
+
+    def _emit_all(self):
+        # A multi-row range makes the view repaint its whole viewport (covers visible descendants)
+        rows = self.table.count(ROOT)
+        if rows:
+            self.dataChanged.emit(self.index_for(self.table.child(ROOT, 0)),
+                                  self.index_for(self.table.child(ROOT, rows - 1)),
+                                  [Qt.ItemDataRole.CheckStateRole])
+
+    # ========================
+    # QAbstractItemModel
+    # ========================
+
+    def index(self, row, column, parent=QModelIndex()):
+        node = self.node_of(parent)
+        if column != 0 or row < 0 or row >= self.table.count(node):
+            return QModelIndex()
+        return self.createIndex(row, column, self.table.child(node, row))
+
+    def parent(self, index=QModelIndex()):
+        if not index.isValid():
+            return QModelIndex()
+        return self.index_for(self.table.parent[self.node_of(index)])
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.column() > 0:
+            return 0
+        return self.table.count(self.node_of(parent))
+
+    def columnCount(self, parent=QModelIndex()):
+        return 1
+
+    def hasChildren(self, parent=QModelIndex()):
+        node = self.node_of(parent)
+        if not self.is_loaded(node):
+            return True
+        return self.table.count(node) > 0
+
+    def canFetchMore(self, parent):
+        node = self.node_of(parent)
+        return self.is_dir(node) and not self.is_loaded(node)
+
+    def fetchMore(self, parent):
+        self.load_children(self.node_of(parent))
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        node = self.node_of(index)
+        if role == Qt.ItemDataRole.DisplayRole:
+            return self.table.name(node)
+        if role == Qt.ItemDataRole.CheckStateRole:
+            return self.check_state(node) if self.is_checkable(node) else None
+        if role == Qt.ItemDataRole.UserRole:
+            return self.node_path(node)
+        if self.table.flags[node] & F_HIGHLIGHT:
+            if role == Qt.ItemDataRole.ForegroundRole:
+                return self._highlight_brush
+            if role == Qt.ItemDataRole.FontRole:
+                return self._highlight_font
+        return None
+
+    def setData(self, index, value, role=Qt.ItemDataRole.EditRole):
+        if role != Qt.ItemDataRole.CheckStateRole or not index.isValid():
+            return False
+        node = self.node_of(index)
+        if not self.is_checkable(node):
+            return False
+        self.set_check(node, Qt.CheckState(value))
+        return True
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.ItemFlag.NoItemFlags
+        f = Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsSelectable
+        if self.is_checkable(self.node_of(index)):
+            f |= Qt.ItemFlag.ItemIsUserCheckable
+        return f
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return self.header
+        return None
+
+
+class ScanProgressLabel(QLabel):
+    """Shows "Scanning... N files (X files/s)" while the model scans, hidden otherwise"""
+
+    def __init__(self, model, parent=None):
+        super().__init__(parent)
+        self.hide()
+        model.scan_progress.connect(self.on_progress)
+        model.scan_finished.connect(self.hide)
+
+    def on_progress(self, files, rate):
+        if files:
+            self.setText(f"Scanning... {files:,} files ({rate:,.0f} files/s)")
+        else:
+            self.setText("Scanning...")
+        self.show()